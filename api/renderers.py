@@ -0,0 +1,71 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # The fast JSON encoder is optional.
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack output is optional.
+    msgpack = None
+
+
+# Types which neither orjson nor msgpack know (e.g. decimals and lazy strings) are converted as the standard JSON
+# renderer would convert them.
+default = JSONEncoder().default
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    Renders compact JSON with orjson when it is installed, falling back to the standard JSON renderer otherwise and for
+    indented output (e.g. in the browsable API). The output holds the same values as the standard renderer's, and is
+    byte for byte the same for serialized data except for floats: orjson writes some very small or large ones in another
+    form (e.g. 0.00001 rather than 1e-05, or 1.5e-7 rather than 1.5e-07), and NaN and infinite ones as null.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not self.compact or self.ensure_ascii \
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return bytes()
+
+        ret = orjson.dumps(data, default=default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+        # As in the standard renderer, keep the output a strict subset of JavaScript.
+        return ret.replace("\u2028".encode("utf-8"), b"\\u2028").replace("\u2029".encode("utf-8"), b"\\u2029")
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Renders data as MessagePack. Holds the same values as the JSON output, so times are ISO 8601 strings.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+
+        return msgpack.packb(data, default=default, use_bin_type=True)
@@ -1,3 +1,58 @@
+import json
+import math
+
+from collections import OrderedDict
+from decimal import Decimal
+from unittest import skipUnless
+
 from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONRenderer, MessagePackRenderer, msgpack, orjson
+from climate_data.models import Sensor
+
+
+class RendererTestCase(TestCase):
+    # Serialized data, as passed to renderers: times are already strings, but decimals are not.
+    data = [
+        OrderedDict([("id", 1), ("read_time", "2017-02-26T21:30:00Z"), ("value", 2861), ("avg", 2870.25),
+                     ("decimal_value", Decimal("28.61")), ("invalid", False), ("station_sensor_link", None),
+                     ("comment", "Caf\u00e9 \u2028\u2029"), ("values", [1, None, -40])]),
+        OrderedDict([("id", 2), ("read_time", "2017-02-26T21:45:00.123000Z"), ("value", None), ("avg", 0.1),
+                     ("decimal_value", None), ("invalid", True), ("station_sensor_link", 3), ("comment", ""),
+                     ("values", [])]),
+    ]
+
+    def test_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+        # Indented output is always left to the standard renderer.
+        self.assertEqual(FastJSONRenderer().render(self.data, "application/json; indent=4"),
+                         JSONRenderer().render(self.data, "application/json; indent=4"))
+
+    @skipUnless(orjson, "orjson is not installed")
+    def test_json_renderer_floats(self):
+        # Floats may be written differently from the standard renderer, but are read back as the same numbers.
+        for value in (1e-05, 1.5e-07, 1e+16, 1e+22, -2.5e-10):
+            with self.subTest(value=value):
+                self.assertEqual(json.loads(FastJSONRenderer().render([value]).decode("utf-8")), [value])
+
+        self.assertEqual(FastJSONRenderer().render([math.nan, math.inf]), b"[null,null]")
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_messagepack_renderer(self):
+        # The same values as the JSON output.
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(self.data), raw=False),
+                         json.loads(JSONRenderer().render(self.data).decode("utf-8")))
+        self.assertEqual(MessagePackRenderer().render(None), b"")
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_messagepack_response(self):
+        Sensor.objects.create(name="Temperature", data_id="temp", decimals=2)
 
-# Create your tests here.
+        response = self.client.get("/api/climate/sensors/?format=msgpack")
+        self.assertEqual((response.status_code, response["Content-Type"]), (200, "application/msgpack"))
+        self.assertEqual(msgpack.unpackb(response.content, raw=False),
+                         json.loads(self.client.get("/api/climate/sensors/", HTTP_ACCEPT="application/json")
+                                    .content.decode("utf-8")))
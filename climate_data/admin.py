@@ -14,24 +14,114 @@
 
 
 from django.contrib import admin
+from django.contrib.admin.actions import delete_selected
+from django.core.cache import cache
+from django.db import transaction
+from climate_data.changelists import EstimatedCountPaginator, TimeRangeChangeList
+from climate_data.conditional import mark_messages_removed, mark_readings_updated, mark_readings_written
+from climate_data.gaps import update_gaps
+from climate_data.latest import refresh_latest_readings
 from climate_data.models import *
+from climate_data.rollups import update_readings, update_rollups
 
 
 def invalidate_reading(modeladmin, request, queryset):
-    queryset.update(invalid=True)
+    update_readings(queryset, invalid=True)
 
 invalidate_reading.short_description = "Mark selected readings as 'invalid'"
 
 
 def qc_process_reading(modeladmin, request, queryset):
-    queryset.update(qc_processed=True)
+    update_readings(queryset, qc_processed=True)
 
 qc_process_reading.short_description = "Mark selected readings as 'QC processed'"
 
 
+def delete_readings(modeladmin, request, queryset):
+    """
+    Deletes readings as the built-in delete action does, then brings the rollups, latest readings and gaps covering
+    them in line, which deleting the queryset directly would leave stale.
+    """
+
+    with transaction.atomic():
+        rows = list(queryset.values_list("station_sensor_link", "read_time", "station")) \
+            if request.POST.get("post") else []
+        response = delete_selected(modeladmin, request, queryset)
+
+        if response is None and rows:
+            keys = [row[:2] for row in rows]
+            update_rollups(keys)
+            refresh_latest_readings(keys)
+            update_gaps(keys)
+            mark_readings_written(row[2] for row in rows)
+
+    return response
+
+delete_readings.short_description = delete_selected.short_description
+
+
+def delete_messages(modeladmin, request, queryset):
+    """
+    Deletes messages as the built-in delete action does, then marks them as removed from their stations' message lists.
+    """
+
+    with transaction.atomic():
+        stations = set(queryset.values_list("station", flat=True)) if request.POST.get("post") else set()
+        response = delete_selected(modeladmin, request, queryset)
+
+        if response is None and stations:
+            mark_messages_removed(stations)
+
+    return response
+
+delete_messages.short_description = delete_selected.short_description
+
+
+class GoesIdListFilter(admin.SimpleListFilter):
+    """
+    Filters messages by GOES ID. The IDs to choose from are found with a scan of the whole message table, so they are
+    cached for a while rather than looked up on every page load.
+    """
+
+    title = "GOES ID"
+    parameter_name = "goes_id"
+
+    cache_key = "climate_data.admin.message_goes_ids"
+    cache_timeout = 600  # Seconds
+
+    def lookups(self, request, model_admin):
+        goes_ids = cache.get(self.cache_key)
+        if goes_ids is None:
+            goes_ids = list(Message.objects.order_by("goes_id").values_list("goes_id", flat=True).distinct())
+            cache.set(self.cache_key, goes_ids, self.cache_timeout)
+
+        return [(goes_id, goes_id) for goes_id in goes_ids]
+
+    def queryset(self, request, queryset):
+        if self.value() is not None:
+            return queryset.filter(goes_id=self.value())
+
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    An admin for tables with too many rows to count or scan on every page load. Page counts are estimated by the
+    database, the unfiltered total is not shown, and the date hierarchy (see climate_data.changelists) is filtered
+    and listed with time range queries.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return TimeRangeChangeList
+
+
 @admin.register(DataType)
 class DataTypeAdmin(admin.ModelAdmin):
-    list_display = ("name", "short_name", "unit", "bounds_str")
+    list_display = ("name", "short_name", "unit", "bounds_str", "spike_threshold", "rate_of_change_threshold",
+                    "flatline_duration", "network_threshold")
     ordering = ["name"]
 
 
@@ -50,16 +140,68 @@ class StationSensorLinkAdmin(admin.ModelAdmin):
     list_display = ("station", "sensor", "data_type", "read_frequency", "station_order")
     list_editable = ("sensor", "data_type")
     list_filter = ("station", "data_type")
+    list_select_related = ("station", "sensor", "data_type")
     ordering = ["station", "station_order"]
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+        # Every row of the change list shows the same choices, so they are looked up once rather than once per row.
+        formfield.choices = list(formfield.choices)
+        return formfield
+
 
 @admin.register(Reading)
-class ReadingAdmin(admin.ModelAdmin):
+class ReadingAdmin(LargeTableAdmin):
     list_display = ("read_time", "station", "data_type", "decimal_value_str", "data_source", "qc_processed", "invalid")
     list_filter = ("station", "station_sensor_link__data_type", "qc_processed")
-    ordering = ["-read_time", "station", "sensor"]
+    date_hierarchy = "read_time"
+
+    # The newest readings by read time are listed first, so backfilled or imported old readings do not come before
+    # them; IDs break ties between readings taken at the same time. Filtering by station reads them in order from the
+    # (station, read time) index, and choosing a period in the date hierarchy limits the sort to that period's rows.
+    ordering = ["-read_time", "-id"]
     actions = [invalidate_reading, qc_process_reading]
 
+    # Data types and decimal values are looked up through each reading's link and sensor.
+    list_select_related = ("station", "sensor", "station_sensor_link__data_type")
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "station_sensor_link":
+            kwargs["queryset"] = StationSensorLink.objects.select_related("station", "sensor")
+
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+
+        # The built-in delete action is replaced under its own name, which its confirmation page posts back.
+        if "delete_selected" in actions:
+            actions["delete_selected"] = (delete_readings, "delete_selected", delete_readings.short_description)
+
+        return actions
+
+    def save_model(self, request, obj, form, change):
+        keys = [(obj.station_sensor_link_id, obj.read_time)]
+        stations = [obj.station_id]
+        if change:
+            keys.append((form.initial.get("station_sensor_link"), form.initial.get("read_time")))
+            stations.append(form.initial.get("station"))
+
+        super().save_model(request, obj, form, change)
+        update_rollups(keys)
+        refresh_latest_readings(keys)
+        update_gaps(keys)
+        mark_readings_written(stations)
+
+    def delete_model(self, request, obj):
+        key = (obj.station_sensor_link_id, obj.read_time)
+        super().delete_model(request, obj)
+        update_rollups([key])
+        refresh_latest_readings([key])
+        update_gaps([key])
+        mark_readings_written([obj.station_id])
+
 
 @admin.register(Annotation)
 class AnnotationAdmin(admin.ModelAdmin):
@@ -67,10 +209,37 @@ class AnnotationAdmin(admin.ModelAdmin):
     list_filter = ("station",)
     ordering = ["station"]
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        mark_readings_updated([form.initial.get("station"), obj.station_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        mark_readings_updated([obj.station_id])
+
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(LargeTableAdmin):
     list_display = ("arrival_time", "station", "goes_id", "data_quality", "data_source", "recorded_message_length")
-    list_filter = ("station", "goes_id", "data_quality")
+    list_filter = ("station", GoesIdListFilter, "data_quality")
+    list_select_related = ("station",)
+    date_hierarchy = "arrival_time"
     ordering = ["-arrival_time"]
-    pass
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+
+        # As for readings, the built-in delete action is replaced under its own name.
+        if "delete_selected" in actions:
+            actions["delete_selected"] = (delete_messages, "delete_selected", delete_messages.short_description)
+
+        return actions
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and form.initial.get("station") != obj.station_id:
+            mark_messages_removed([form.initial.get("station")])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        mark_messages_removed([obj.station_id])
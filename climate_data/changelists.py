@@ -0,0 +1,204 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import calendar
+import datetime
+import json
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connection, models
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+# Partitioned tables have no statistics of their own, so their partitions' estimates are added up.
+TABLE_ESTIMATE_SQL = """
+    SELECT coalesce(
+        (SELECT sum(greatest(c.reltuples, 0)) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+         WHERE i.inhparent = %(table)s::regclass),
+        (SELECT greatest(reltuples, 0) FROM pg_class WHERE oid = %(table)s::regclass)
+    )::bigint
+"""
+
+DATE_PARTS = ("year", "month", "day")
+
+
+def estimate_count(queryset):
+    """
+    Returns the database's estimate of the number of rows in a queryset, from the table's statistics if it is not
+    filtered, or from the query planner otherwise. Neither looks at the rows themselves.
+    """
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(TABLE_ESTIMATE_SQL, {"table": queryset.model._meta.db_table})
+            return cursor.fetchone()[0]
+
+        sql, params = queryset.order_by().values("pk").query.sql_with_params()
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator which uses the database's estimate of the number of rows in a large queryset (see estimate_count)
+    rather than counting them. Querysets estimated to be small are counted exactly, since the estimate may be off.
+    """
+
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate < self.exact_count_limit:
+            return super().count
+
+        return estimate
+
+
+def period_range(year, month=None, day=None):
+    """
+    Returns the start and (exclusive) end of a year, month or day in the current time zone.
+    """
+
+    if day is not None:
+        start = datetime.date(year, month, day)
+        end = start + datetime.timedelta(days=1)
+    elif month is not None:
+        start = datetime.date(year, month, 1)
+        end = datetime.date(year + month // 12, month % 12 + 1, 1)
+    else:
+        start = datetime.date(year, 1, 1)
+        end = datetime.date(year + 1, 1, 1) if year < datetime.MAXYEAR else datetime.date.max
+
+    return tuple(timezone.make_aware(datetime.datetime.combine(d, datetime.time())) for d in (start, end))
+
+
+def has_btree_index(model, field_name):
+    """
+    Returns whether a model has a b-tree index which starts with the given field.
+    """
+
+    field = model._meta.get_field(field_name)
+    return field.db_index or field.unique or any(type(index) is models.Index and index.fields[0] == field_name
+                                                 for index in model._meta.indexes)
+
+
+def has_rows(queryset, field_name, start=None, end=None):
+    """
+    Returns whether a queryset has any rows with a time in the given range, with a query which can stop at the first
+    row found. Where the time has a b-tree index, the rows are looked for in time order, so that the index is used
+    even when the planner expects a table scan to find a row sooner.
+    """
+
+    if start is not None:
+        queryset = queryset.filter(**{field_name + "__gte": start})
+
+    if end is not None:
+        queryset = queryset.filter(**{field_name + "__lt": end})
+
+    if has_btree_index(queryset.model, field_name):
+        return bool(queryset.order_by(field_name).values_list("pk", flat=True)[:1])
+
+    return queryset.exists()
+
+
+def furthest_year(predicate, year, step, limit):
+    """
+    Returns the furthest year from a given one, in the direction of step (1 or -1) and no further than limit, for
+    which predicate is true, given that it is true from the given year up to some year and false after it. The
+    distance is doubled until the predicate is false, and the last stretch is bisected.
+    """
+
+    inside, distance = 0, 1
+    while distance <= abs(limit - year) and predicate(year + step * distance):
+        inside, distance = distance, distance * 2
+
+    outside = min(distance, abs(limit - year) + 1)
+    while outside - inside > 1:
+        middle = (inside + outside) // 2
+        if predicate(year + step * middle):
+            inside = middle
+        else:
+            outside = middle
+
+    return year + step * inside
+
+
+def years_with_rows(queryset, field_name):
+    """
+    Returns the years which have rows in a queryset. The first and last years are searched for outwards from the year
+    of any one row, and each year between them is checked on its own.
+    """
+
+    seed = queryset.order_by().values_list(field_name, flat=True)[:1]
+    if not seed:
+        return []
+
+    year = timezone.localtime(seed[0]).year
+
+    first = furthest_year(lambda y: has_rows(queryset, field_name, end=period_range(y)[1]), year, -1,
+                          datetime.MINYEAR)
+    last = furthest_year(lambda y: has_rows(queryset, field_name, start=period_range(y)[0]), year, 1,
+                         datetime.MAXYEAR)
+
+    return [y for y in range(first, last + 1)
+            if y in (first, year, last) or has_rows(queryset, field_name, *period_range(y))]
+
+
+def months_with_rows(queryset, field_name, year):
+    return [month for month in range(1, 13) if has_rows(queryset, field_name, *period_range(year, month))]
+
+
+def days_with_rows(queryset, field_name, year, month):
+    return [day for day in range(1, calendar.monthrange(year, month)[1] + 1)
+            if has_rows(queryset, field_name, *period_range(year, month, day))]
+
+
+class TimeRangeChangeList(ChangeList):
+    """
+    A change list which filters by the year, month and day chosen in its date hierarchy as a range of times, which an
+    index can serve, rather than by extracting the parts of each row's time.
+    """
+
+    def get_filters(self, request):
+        filter_specs, has_filters, lookup_params, use_distinct = super().get_filters(request)
+
+        year_param = "{}__year".format(self.date_hierarchy)
+        if self.date_hierarchy and year_param in lookup_params:
+            parts = []
+            for part in DATE_PARTS:
+                value = lookup_params.pop("{}__{}".format(self.date_hierarchy, part), None)
+                if value is None:
+                    break
+
+                parts.append(value)
+
+            try:
+                start, end = period_range(*(int(part) for part in parts))
+            except (TypeError, ValueError, OverflowError) as e:
+                raise IncorrectLookupParameters(e)
+
+            lookup_params[self.date_hierarchy + "__gte"] = start
+            lookup_params[self.date_hierarchy + "__lt"] = end
+
+        return filter_specs, has_filters, lookup_params, use_distinct
@@ -0,0 +1,160 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import dateutil.parser
+import hashlib
+
+from calendar import timegm
+
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from climate_data.models import *
+
+
+def readings_watermark(station=None):
+    """
+    Returns when readings (from a station, or from any station) were last added, changed or removed.
+    """
+
+    stations = Station.objects.all()
+    if station is not None:
+        stations = stations.filter(pk=station)
+
+    return stations.aggregate(watermark=Max("readings_updated"))["watermark"]
+
+
+def mark_readings_updated(stations):
+    """
+    Marks the readings of the given stations as changed, for changes which show up in reading responses without any
+    reading being edited (such as annotations on them being added, changed or removed).
+    """
+
+    Station.objects.filter(pk__in=[s for s in stations if s is not None]).update(readings_updated=timezone.now())
+
+
+def mark_readings_written(stations):
+    """
+    Marks the readings of the given stations as changed after readings were added, edited or removed directly, whether
+    or not they belong to a station-sensor link (see update_rollups for those which do). Readings without a station are
+    only listed among those of every station, so writing one of them (given as a station of None) marks every station.
+    """
+
+    stations = set(stations)
+
+    queryset = Station.objects.all() if None in stations else Station.objects.filter(pk__in=stations)
+    queryset.update(readings_updated=timezone.now())
+
+
+def messages_watermark(station=None):
+    """
+    Returns when messages (from a station, or from any station) were last added, changed or removed.
+    """
+
+    messages = Message.objects.all()
+    stations = Station.objects.all()
+    if station is not None:
+        messages = messages.filter(station=station)
+        stations = stations.filter(pk=station)
+
+    watermarks = [messages.aggregate(watermark=Max("updated"))["watermark"],
+                  stations.aggregate(watermark=Max("messages_removed"))["watermark"]]
+
+    return max((w for w in watermarks if w is not None), default=None)
+
+
+def mark_messages_removed(stations):
+    """
+    Marks messages as removed from the given stations' message lists. Messages without a station are only listed among
+    those of every station, so removing one of them (given as a station of None) marks every station.
+    """
+
+    stations = set(stations)
+
+    queryset = Station.objects.all() if None in stations else Station.objects.filter(pk__in=stations)
+    queryset.update(messages_removed=timezone.now())
+
+
+class ConditionalGetMixin(object):
+    """
+    Answers GET requests conditionally, with an ETag and Last-Modified time derived from a cheap watermark of when the
+    underlying data last changed (see get_watermark), so polls which find nothing new get a 304 response without the
+    main query being run.
+
+    Responses for time windows which ended in the past may be cached by browsers and shared caches for a while, after
+    which they are revalidated; anything else must be revalidated every time.
+    """
+
+    historical_max_age = 3600  # Seconds; readings from the past can still arrive late or be corrected.
+
+    def get_watermark(self):
+        """
+        Returns the time the data behind the response last changed, or None to answer the request unconditionally.
+        """
+
+        raise NotImplementedError
+
+    def get_time_param(self, name):
+        """
+        Returns the (timezone-aware) time given in a query parameter, or None if it is missing or invalid.
+        """
+
+        value = self.request.query_params.get(name, None)
+        if value is None:
+            return None
+
+        try:
+            value = dateutil.parser.parse(value)
+        except (ValueError, OverflowError):
+            return None
+
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+    def get_window_end(self):
+        return self.get_time_param("end")
+
+    def get_etag(self, request, watermark):
+        # Responses differ by query and negotiated format as well as by the data.
+        key = "{} {} {}".format(watermark.isoformat(), request.get_full_path(), request.accepted_media_type)
+        return quote_etag(hashlib.md5(key.encode("utf-8")).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        watermark = self.get_watermark()
+        if watermark is None:
+            return super().get(request, *args, **kwargs)
+
+        etag = self.get_etag(request, watermark)
+        last_modified = timegm(watermark.utctimetuple())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        if response.status_code not in (200, 304):
+            return response
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ("Accept",))
+
+        end = self.get_window_end()
+        if end is not None and end < timezone.now():
+            patch_cache_control(response, public=True, max_age=self.historical_max_age)
+        else:
+            patch_cache_control(response, no_cache=True)
+
+        return response
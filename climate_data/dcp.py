@@ -0,0 +1,134 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import pytz
+import struct
+
+from django.db import transaction
+
+from climate_data.ingest import MESSAGE_NATURAL_KEY, insert_ignoring_conflicts
+from climate_data.models import *
+
+
+# Fixed-width DCP header fields, in order; see http://eddn.usgs.gov/dcpformat.html for details.
+HEADER = struct.Struct("8s11s1s2s2s1s1s3s1s2s5s")
+HEADER_LENGTH = HEADER.size  # 37 characters
+
+
+class DCPFormatError(ValueError):
+    pass
+
+
+def parse_time(text):
+    """
+    Parses a DCP header timestamp of the form YYDDDHHMMSS (year, day of year, hours, minutes, seconds) as UTC.
+    """
+
+    return datetime.datetime(2000 + int(text[0:2]), 1, 1, tzinfo=pytz.utc) + datetime.timedelta(
+        days=int(text[2:5]) - 1,
+        hours=int(text[5:7]),
+        minutes=int(text[7:9]),
+        seconds=int(text[9:11])
+    )
+
+
+def parse_header(header):
+    """
+    Parses the 37-byte header of a DCP message into a dictionary of Message field values.
+    """
+
+    try:
+        (goes_id, arrival_time, failure_code, signal_strength, frequency_offset, modulation_index, data_quality,
+         goes_channel, goes_spacecraft, data_source, recorded_message_length) = \
+            (field.decode("ascii") for field in HEADER.unpack(header))
+
+        return {
+            "goes_id": goes_id,
+            "arrival_time": parse_time(arrival_time),
+            "failure_code": failure_code,
+            "signal_strength": int(signal_strength),
+            "frequency_offset": frequency_offset,
+            "modulation_index": modulation_index,
+            "data_quality": data_quality,
+            "goes_channel": int(goes_channel),
+            "goes_spacecraft": goes_spacecraft,
+            "data_source": data_source,
+            "recorded_message_length": int(recorded_message_length),
+        }
+
+    except (struct.error, UnicodeDecodeError, ValueError):
+        raise DCPFormatError("Invalid DCP header: {!r}".format(header))
+
+
+def iter_messages(stream):
+    """
+    Reads consecutive DCP messages (header followed by message body) from a binary stream, such as an LRGS / DDS dump
+    file. Whitespace between messages is skipped. Yields pairs of parsed header fields and the full message text.
+    """
+
+    while True:
+        header = b""
+
+        # Whitespace is skipped until the header starts, however much of it there is; only the end of the stream ends
+        # the messages.
+        while len(header) < HEADER_LENGTH:
+            chunk = stream.read(HEADER_LENGTH - len(header))
+            if not chunk:
+                if header:
+                    raise DCPFormatError("Truncated DCP header: {!r}".format(header))
+                return
+            header = (header + chunk).lstrip()
+
+        fields = parse_header(header)
+
+        body = stream.read(fields["recorded_message_length"])
+        if len(body) < fields["recorded_message_length"]:
+            raise DCPFormatError("Truncated DCP message from {} at {}".format(fields["goes_id"],
+                                                                              fields["arrival_time"]))
+
+        yield fields, (header + body).decode("ascii", "replace")
+
+
+def import_messages(stream, batch_size=5000):
+    """
+    Bulk-loads the messages in a raw DCP dump as Message rows, committing one batch at a time. Stations are matched on
+    GOES ID. Values are left empty, as the encoding of a message body is specific to the station's logger program.
+    Messages which are already stored are skipped, so a dump can safely be imported more than once.
+
+    Returns the number of messages imported.
+    """
+
+    stations = dict(Station.objects.values_list("goes_id", "id"))
+
+    count = 0
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            return len(insert_ignoring_conflicts(Message, batch, MESSAGE_NATURAL_KEY))
+
+    for fields, message_text in iter_messages(stream):
+        batch.append(Message(values=[], message_text=message_text, station_id=stations.get(fields["goes_id"], None),
+                             **fields))
+
+        if len(batch) >= batch_size:
+            count += flush()
+            batch = []
+
+    if batch:
+        count += flush()
+
+    return count
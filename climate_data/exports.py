@@ -0,0 +1,127 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import csv
+
+from django.http import StreamingHttpResponse
+
+from rest_framework import serializers
+
+from climate_data.functions import DecimalValue
+from climate_data.models import *
+from climate_data.streaming import iterate_rows
+
+
+LONG_LAYOUT = "long"
+WIDE_LAYOUT = "wide"
+
+LAYOUTS = (LONG_LAYOUT, WIDE_LAYOUT)
+
+
+class Echo(object):
+    """
+    A file-like object which returns what is written to it, so csv.writer can be used to produce lines of text.
+    """
+
+    def write(self, value):
+        return value
+
+
+def link_columns(links):
+    """
+    Names a column for each station-sensor link after its data type's short name, or after its sensor's data ID if it
+    has no data type. If a station has more than one link with the same name, the later ones (in station order) are
+    numbered, e.g. air_temp_2.
+    """
+
+    columns = {}
+    seen = {}
+
+    for link in sorted(links, key=lambda l: (l.station_id, l.station_order, l.id)):
+        short_name = link.data_type.short_name if link.data_type is not None else link.sensor.data_id
+        occurrence = seen.get((link.station_id, short_name), 0) + 1
+        seen[(link.station_id, short_name)] = occurrence
+
+        columns[link.id] = short_name if occurrence == 1 else "{}_{}".format(short_name, occurrence)
+
+    return columns
+
+
+def long_rows(rows, links, stations, columns):
+    format_time = serializers.DateTimeField().to_representation
+
+    yield ("read_time", "station", "data_type", "value", "invalid")
+
+    for read_time, station_id, link_id, value, invalid in rows:
+        yield (format_time(read_time), stations.get(station_id, ""), columns.get(link_id, ""), value,
+               "true" if invalid else "false")
+
+
+def wide_rows(rows, links, stations, columns):
+    format_time = serializers.DateTimeField().to_representation
+
+    # Columns are ordered by their first appearance in station order.
+    header = []
+    for link in sorted(links, key=lambda l: (l.station_id, l.station_order, l.id)):
+        if columns[link.id] not in header:
+            header.append(columns[link.id])
+
+    positions = {link_id: header.index(column) for link_id, column in columns.items()}
+
+    yield ["read_time", "station"] + header
+
+    key = None
+    values = None
+
+    # Rows arrive ordered by station and read time, so each output row is built from consecutive readings.
+    for read_time, station_id, link_id, value, invalid in rows:
+        if (station_id, read_time) != key:
+            if key is not None:
+                yield [format_time(key[1]), stations.get(key[0], "")] + values
+
+            key = (station_id, read_time)
+            values = [None] * len(header)
+
+        if link_id in positions and not invalid:
+            values[positions[link_id]] = value
+
+    if key is not None:
+        yield [format_time(key[1]), stations.get(key[0], "")] + values
+
+
+def csv_response(readings, links, layout=LONG_LAYOUT, filename="readings.csv"):
+    """
+    Returns a response streaming readings as CSV, with decimal values scaled by the database. In the long layout each
+    reading is a row; in the wide layout each row holds the valid readings from one station at one time, with a column
+    per data type. Rows are ordered by station and then read time, which the database can stream straight from its
+    (station, read_time) index, so the export starts immediately and uses constant memory however long it is.
+    """
+
+    links = list(links.select_related("data_type", "sensor"))
+    stations = dict(Station.objects.filter(id__in={link.station_id for link in links}).values_list("id", "name"))
+    columns = link_columns(links)
+
+    rows = iterate_rows(readings.filter(station_sensor_link__in=[link.id for link in links])
+                        .annotate(decimal_value=DecimalValue())
+                        .order_by("station", "read_time")
+                        .values_list("read_time", "station_id", "station_sensor_link_id", "decimal_value", "invalid"))
+
+    rows = (wide_rows if layout == WIDE_LAYOUT else long_rows)(rows, links, stations, columns)
+
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
+
+    return response
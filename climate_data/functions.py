@@ -0,0 +1,79 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import pytz
+import re
+
+from django.db.models import DateTimeField, DecimalField, Func
+
+
+BUCKET_UNITS = {
+    "m": datetime.timedelta(minutes=1),
+    "h": datetime.timedelta(hours=1),
+    "d": datetime.timedelta(days=1),
+}
+
+
+def parse_bucket(text):
+    """
+    Parses a bucket size such as 15m, 1h or 1d into a timedelta. Returns None if the text is not a valid bucket size.
+    """
+
+    match = re.match(r"^([1-9][0-9]*)([mhd])$", str(text))
+    if match is None:
+        return None
+
+    return int(match.group(1)) * BUCKET_UNITS[match.group(2)]
+
+
+def floor_time(time, interval):
+    """
+    Rounds a timestamp down to the nearest multiple of an interval (counted from the UNIX epoch).
+    """
+
+    timestamp = time.timestamp()
+    return datetime.datetime.fromtimestamp(timestamp - (timestamp % interval.total_seconds()), tz=pytz.utc)
+
+
+class TimeBucket(Func):
+    """
+    Rounds a timestamp down to the start of its fixed-length bucket, with buckets counted from the UNIX epoch (so
+    daily buckets start at midnight UTC).
+    """
+
+    template = "to_timestamp(floor(extract(epoch FROM %(expressions)s) / %(seconds)d) * %(seconds)d)"
+
+    def __init__(self, expression, interval, **extra):
+        super().__init__(expression, seconds=int(interval.total_seconds()), output_field=DateTimeField(), **extra)
+
+
+class DecimalValue(Func):
+    """
+    Scales a raw integer reading value down by its sensor's number of decimals, giving the decimal value rounded to
+    the sensor's precision (the same value as Reading.decimal_value).
+    """
+
+    template = "round(%(value)s::numeric / power(10::numeric, %(decimals)s), %(decimals)s)"
+
+    def __init__(self, value="value", decimals="sensor__decimals", **extra):
+        super().__init__(value, decimals, output_field=DecimalField(), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        value_sql, value_params = compiler.compile(self.source_expressions[0])
+        decimals_sql, decimals_params = compiler.compile(self.source_expressions[1])
+
+        sql = self.template % {"value": value_sql, "decimals": decimals_sql}
+        return sql, value_params + decimals_params + decimals_params
@@ -0,0 +1,159 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.db import connection, transaction
+
+from climate_data.conditional import mark_readings_updated
+from climate_data.models import *
+from climate_data.rollups import lock_links
+
+
+GAP_COLUMNS = "updated, gap_start, gap_end, missing_count, station_sensor_link_id, sensor_id, station_id"
+
+RANGES = "unnest(%(link_ids)s::integer[], %(starts)s::timestamptz[], %(ends)s::timestamptz[])"
+
+# Widens the ranges of changed read times out to the readings on either side, which bound any gap the changes touched.
+WIDEN_RANGES_SQL = """
+    SELECT c.link_id, coalesce(p.read_time, c.range_start), coalesce(n.read_time, c.range_end)
+    FROM {ranges} AS c (link_id, range_start, range_end)
+    LEFT JOIN LATERAL (
+        SELECT read_time FROM climate_data_reading
+        WHERE station_sensor_link_id = c.link_id AND read_time < c.range_start
+        ORDER BY read_time DESC LIMIT 1
+    ) p ON true
+    LEFT JOIN LATERAL (
+        SELECT read_time FROM climate_data_reading
+        WHERE station_sensor_link_id = c.link_id AND read_time > c.range_end
+        ORDER BY read_time LIMIT 1
+    ) n ON true
+""".format(ranges=RANGES)
+
+DELETE_GAPS_SQL = """
+    DELETE FROM climate_data_readinggap g USING {ranges} AS c (link_id, range_start, range_end)
+    WHERE g.station_sensor_link_id = c.link_id AND g.gap_start < c.range_end AND g.gap_end > c.range_start
+""".format(ranges=RANGES)
+
+# Pairs each reading in a range with the next one, and keeps the pairs at least one and a half read intervals apart
+# (i.e. with at least one reading missing on schedule between them, allowing for readings slightly off schedule).
+INSERT_GAPS_SQL = """
+    INSERT INTO climate_data_readinggap ({columns})
+    SELECT now(), g.read_time, g.next_read_time,
+           round(extract(epoch FROM g.next_read_time - g.read_time) / extract(epoch FROM g.read_interval))::integer - 1,
+           l.id, l.sensor_id, l.station_id
+    FROM {ranges} AS c (link_id, range_start, range_end)
+    JOIN climate_data_stationsensorlink l ON l.id = c.link_id AND l.read_frequency > 0
+    CROSS JOIN LATERAL (
+        SELECT read_time, lead(read_time) OVER (ORDER BY read_time) AS next_read_time,
+               %(message_interval)s / l.read_frequency AS read_interval
+        FROM climate_data_reading
+        WHERE station_sensor_link_id = c.link_id AND read_time >= c.range_start AND read_time <= c.range_end
+    ) g
+    WHERE g.next_read_time >= g.read_time + 1.5 * g.read_interval
+""".format(columns=GAP_COLUMNS, ranges=RANGES)
+
+
+def _refresh_gaps(cursor, ranges):
+    params = {
+        "link_ids": [link_id for link_id, _, _ in ranges],
+        "starts": [start for _, start, _ in ranges],
+        "ends": [end for _, _, end in ranges],
+        "message_interval": MESSAGE_INTERVAL,
+    }
+
+    cursor.execute(DELETE_GAPS_SQL, params)
+    cursor.execute(INSERT_GAPS_SQL, params)
+    return cursor.rowcount
+
+
+def update_gaps(keys):
+    """
+    Recomputes the gaps around readings which were inserted, moved or deleted, given the readings'
+    (station_sensor_link_id, read_time) pairs (before and after a change). For each link, only the readings from the
+    one before its earliest changed time to the one after its latest are looked at, so this is cheap enough to run as
+    part of ingestion.
+    """
+
+    changed = {}
+    for link_id, read_time in keys:
+        if link_id is None:
+            continue
+
+        start, end = changed.get(link_id, (read_time, read_time))
+        changed[link_id] = (min(start, read_time), max(end, read_time))
+
+    if not changed:
+        return
+
+    link_ids = sorted(changed)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        lock_links(cursor, link_ids)  # Gaps are deleted and inserted again just as rollups are.
+        cursor.execute(WIDEN_RANGES_SQL, {
+            "link_ids": link_ids,
+            "starts": [changed[link_id][0] for link_id in link_ids],
+            "ends": [changed[link_id][1] for link_id in link_ids],
+        })
+
+        _refresh_gaps(cursor, cursor.fetchall())
+
+
+def rebuild_gaps(link_ids=None):
+    """
+    Recomputes all gaps of the given links (or of all links) from the stored readings, one link per transaction. Used
+    to fill in gaps for existing data, or after read frequencies are changed. Returns the number of gaps found.
+    """
+
+    if link_ids is None:
+        link_ids = StationSensorLink.objects.values_list("id", flat=True)
+
+    link_ids = sorted(link_ids)
+    found = 0
+
+    for link_id in link_ids:
+        with transaction.atomic(), connection.cursor() as cursor:
+            lock_links(cursor, [link_id])
+            found += _refresh_gaps(cursor, [(link_id, "-infinity", "infinity")])
+
+    # Gaps are served conditionally on the stations' reading watermarks.
+    mark_readings_updated(StationSensorLink.objects.filter(id__in=link_ids).values_list("station", flat=True))
+
+    return found
+
+
+def open_gaps(links, end):
+    """
+    Returns unsaved gaps running from the latest reading of each of the given links (or from when the link was added,
+    if it has never reported) up to the given time, wherever at least one reading is missing on schedule. These are
+    the gaps of links which have stopped reporting; they grow as time passes, so they are not stored.
+    """
+
+    gaps = []
+
+    for link in links:
+        if link.read_frequency == 0:
+            continue
+
+        interval = MESSAGE_INTERVAL / link.read_frequency
+
+        try:
+            start = link.latestreading.read_time
+        except LatestReading.DoesNotExist:
+            start = link.created
+
+        if end - start >= 1.5 * interval:
+            gaps.append(ReadingGap(gap_start=start, gap_end=end, missing_count=(end - start) // interval,
+                                   station_sensor_link=link, sensor_id=link.sensor_id, station_id=link.station_id))
+
+    return gaps
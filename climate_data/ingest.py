@@ -0,0 +1,180 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from collections import defaultdict, deque
+
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from climate_data.functions import floor_time
+from climate_data.gaps import update_gaps
+from climate_data.latest import record_latest_readings
+from climate_data.models import *
+from climate_data.rollups import update_rollups
+
+
+# Natural keys, matching the unique constraints on each model. Re-sent data is recognized and skipped using these.
+MESSAGE_NATURAL_KEY = ("goes_id", "arrival_time", "goes_channel")
+READING_NATURAL_KEY = ("station_sensor_link", "read_time", "data_source")
+
+
+def insert_ignoring_conflicts(model, objs, unique_fields):
+    """
+    Inserts model instances using a single INSERT ... ON CONFLICT DO NOTHING query, so that any instance duplicating an
+    existing row on the given unique fields is skipped instead of raising an integrity error. Sets the primary key of
+    each inserted instance and returns them; instances which were skipped are left without a primary key.
+    """
+
+    if not objs:
+        return []
+
+    qn = connection.ops.quote_name
+    meta = model._meta
+
+    fields = [f for f in meta.concrete_fields if f != meta.pk]
+    key_fields = [meta.get_field(name) for name in unique_fields]
+
+    rows = [tuple(f.get_db_prep_save(f.pre_save(obj, True), connection) for f in fields) for obj in objs]
+
+    sql = "INSERT INTO {} ({}) VALUES %s ON CONFLICT ({}) DO NOTHING RETURNING {}, {}".format(
+        qn(meta.db_table),
+        ", ".join(qn(f.column) for f in fields),
+        ", ".join(qn(f.column) for f in key_fields),
+        qn(meta.pk.column),
+        ", ".join(qn(f.column) for f in key_fields)
+    )
+
+    with connection.cursor() as cursor:
+        execute_values(cursor, sql, rows, page_size=len(rows))
+        returned = cursor.fetchall()
+
+    # Match returned keys back up with instances; identical keys (possible with nulls) are matched in order.
+    pending = defaultdict(deque)
+    for obj in objs:
+        pending[tuple(getattr(obj, f.attname) for f in key_fields)].append(obj)
+
+    inserted = []
+    for row in returned:
+        obj = pending[tuple(row[1:])].popleft()
+        setattr(obj, meta.pk.attname, row[0])
+        inserted.append(obj)
+
+    return inserted
+
+
+def stations_by_goes_id(goes_ids):
+    return {station.goes_id: station for station in Station.objects.filter(goes_id__in=set(goes_ids))}
+
+
+def links_by_station(station_ids):
+    links = {}
+
+    for link in StationSensorLink.objects.filter(station_id__in=set(station_ids)).order_by("station_id",
+                                                                                           "station_order"):
+        links.setdefault(link.station_id, []).append(link)
+
+    return links
+
+
+def build_readings(message, links):
+    """
+    Expands the ordered values of a message into unsaved readings.
+
+    Values are grouped by sensor in station order, with each station-sensor link contributing read_frequency values
+    from oldest to newest. The newest value of each group is assumed to be read at the last multiple of the link's
+    read interval before the message arrived.
+    """
+
+    readings = []
+    offset = 0
+
+    for link in links:
+        if link.read_frequency == 0:
+            continue
+
+        interval = MESSAGE_INTERVAL / link.read_frequency
+        latest_read_time = floor_time(message.arrival_time, interval)
+        values = message.values[offset:offset + link.read_frequency]
+
+        if len(values) < link.read_frequency:
+            break  # The message is truncated; the remaining values cannot be attributed to read times.
+
+        for i, value in enumerate(values):
+            readings.append(Reading(
+                read_time=latest_read_time - interval * (link.read_frequency - 1 - i),
+                data_source=Reading.FROM_GOES,
+                value=value,
+                sensor_id=link.sensor_id,
+                station_id=link.station_id,
+                station_sensor_link=link,
+                message=message
+            ))
+
+        offset += link.read_frequency
+
+    return readings
+
+
+def create_readings(messages):
+    """
+    Decodes the values of saved messages into readings and inserts all of them with a single bulk query. Readings which
+    are already stored are skipped. Should be called inside a transaction alongside the creation of the messages
+    themselves. Returns the readings which were inserted.
+    """
+
+    links = links_by_station(m.station_id for m in messages if m.station_id is not None)
+
+    readings = []
+    for message in messages:
+        readings.extend(build_readings(message, links.get(message.station_id, ())))
+
+    return insert_ignoring_conflicts(Reading, readings, READING_NATURAL_KEY)
+
+
+def ingest_messages(messages):
+    """
+    Stores unsaved messages and the readings decoded from them in a single transaction. Messages without a station are
+    matched to one by GOES ID.
+
+    Messages already stored under the same natural key are not inserted again and no readings are decoded from them;
+    their primary keys are set from the stored rows instead, so re-sending a batch is cheap and never grows the tables.
+    Returns a tuple of the newly stored messages and the readings inserted.
+    """
+
+    stations = stations_by_goes_id(m.goes_id for m in messages if m.station_id is None)
+    for message in messages:
+        if message.station_id is None and message.goes_id in stations:
+            message.station = stations[message.goes_id]
+
+    with transaction.atomic():
+        new_messages = insert_ignoring_conflicts(Message, messages, MESSAGE_NATURAL_KEY)
+        readings = create_readings(new_messages)
+        keys = [(r.station_sensor_link_id, r.read_time) for r in readings]
+        update_rollups(keys)
+        record_latest_readings(readings)
+        update_gaps(keys)
+
+    duplicates = [m for m in messages if m.pk is None]
+    if duplicates:
+        stored = Message.objects.filter(
+            goes_id__in={m.goes_id for m in duplicates},
+            arrival_time__range=(min(m.arrival_time for m in duplicates), max(m.arrival_time for m in duplicates))
+        ).values_list("id", *MESSAGE_NATURAL_KEY)
+
+        stored_ids = {tuple(row[1:]): row[0] for row in stored}
+        for message in duplicates:
+            message.pk = stored_ids.get((message.goes_id, message.arrival_time, message.goes_channel), None)
+
+    return new_messages, readings
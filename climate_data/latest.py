@@ -0,0 +1,107 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from climate_data.models import *
+
+
+# Columns shared by readings and latest readings, in the order they are copied.
+READING_COLUMNS = ("created", "updated", "read_time", "data_source", "value", "qc_processed", "invalid", "sensor_id",
+                   "station_id", "message_id")
+
+LATEST_COLUMNS = "station_sensor_link_id, reading_id, " + ", ".join(READING_COLUMNS)
+
+RECORD_LATEST_SQL = """
+    INSERT INTO climate_data_latestreading AS l ({columns}) VALUES %s
+    ON CONFLICT (station_sensor_link_id) DO UPDATE SET reading_id = EXCLUDED.reading_id, {updates}
+    WHERE (l.read_time, l.reading_id) <= (EXCLUDED.read_time, EXCLUDED.reading_id)
+""".format(columns=LATEST_COLUMNS, updates=", ".join("{0} = EXCLUDED.{0}".format(c) for c in READING_COLUMNS))
+
+REFRESH_LATEST_SQL = """
+    INSERT INTO climate_data_latestreading ({columns})
+    SELECT l.id, r.id, {reading_columns} FROM unnest(%s::integer[]) AS l(id)
+    CROSS JOIN LATERAL (
+        SELECT * FROM climate_data_reading
+        WHERE station_sensor_link_id = l.id
+        ORDER BY read_time DESC, id DESC
+        LIMIT 1
+    ) r
+""".format(columns=LATEST_COLUMNS, reading_columns=", ".join("r." + c for c in READING_COLUMNS))
+
+
+def record_latest_readings(readings):
+    """
+    Updates the latest readings of links with newly inserted readings, wherever they are newer than the stored ones.
+    Only the given readings are looked at, so this takes the same time however many readings are stored.
+    """
+
+    newest = {}
+    for reading in readings:
+        if reading.station_sensor_link_id is None:
+            continue
+
+        current = newest.get(reading.station_sensor_link_id, None)
+        if current is None or (reading.read_time, reading.pk) > (current.read_time, current.pk):
+            newest[reading.station_sensor_link_id] = reading
+
+    if not newest:
+        return
+
+    rows = [(r.station_sensor_link_id, r.pk) + tuple(getattr(r, c) for c in READING_COLUMNS)
+            for _, r in sorted(newest.items())]
+
+    with connection.cursor() as cursor:
+        execute_values(cursor, RECORD_LATEST_SQL, rows, page_size=len(rows))
+
+
+def refresh_latest_readings(keys):
+    """
+    Recomputes the latest readings of links after readings were changed or deleted, given the readings'
+    (station_sensor_link_id, read_time) pairs before and after the change. Links whose latest reading is newer than
+    every changed one are left alone.
+    """
+
+    changed = {}
+    for link_id, read_time in keys:
+        if link_id is not None:
+            changed[link_id] = max(read_time, changed.get(link_id, read_time))
+
+    if not changed:
+        return
+
+    latest = dict(LatestReading.objects.filter(station_sensor_link__in=changed.keys())
+                  .values_list("station_sensor_link", "read_time"))
+    link_ids = sorted(link_id for link_id, read_time in changed.items()
+                      if link_id not in latest or read_time >= latest[link_id])
+
+    if link_ids:
+        rebuild_latest_readings(link_ids)
+
+
+def rebuild_latest_readings(link_ids=None):
+    """
+    Recomputes the latest readings of the given links (or of all links) from the stored readings.
+    """
+
+    if link_ids is None:
+        link_ids = StationSensorLink.objects.values_list("id", flat=True)
+
+    link_ids = sorted(link_ids)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM climate_data_latestreading WHERE station_sensor_link_id = ANY(%s)", [link_ids])
+        cursor.execute(REFRESH_LATEST_SQL, [link_ids])
@@ -0,0 +1,67 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from climate_data.models import *
+from climate_data.serializers import *
+
+
+class Command(BaseCommand):
+    help = "Compares the speed and output size of the available renderers on reading list payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readings", type=int, default=100000, help="Number of readings in each payload.")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of times to render each payload.")
+
+    def handle(self, *args, **options):
+        readings = list(Reading.objects.order_by("-read_time")[:options["readings"]])
+        if not readings:
+            raise CommandError("There are no readings to render; see generate_benchmark_data.")
+
+        payloads = [
+            ("full", ReadingSerializer(readings, many=True).data),
+            ("compact", CompactReadingSerializer(readings, many=True).data),
+        ]
+
+        candidates = [("json", JSONRenderer())]
+
+        if renderers.orjson is not None:
+            candidates.append(("orjson", renderers.FastJSONRenderer()))
+        else:
+            self.stdout.write("orjson is not installed; skipping the fast JSON renderer.")
+
+        if renderers.msgpack is not None:
+            candidates.append(("msgpack", renderers.MessagePackRenderer()))
+        else:
+            self.stdout.write("msgpack is not installed; skipping the MessagePack renderer.")
+
+        self.stdout.write("{:<10}{:<10}{:>12}{:>12}{:>10}".format("payload", "renderer", "bytes", "ms", "speedup"))
+
+        for payload_name, data in payloads:
+            baseline = None
+
+            for name, renderer in candidates:
+                size = len(renderer.render(data))
+                seconds = min(timeit.repeat(lambda: renderer.render(data), number=1, repeat=options["repeat"]))
+                baseline = baseline or seconds
+
+                self.stdout.write("{:<10}{:<10}{:>12}{:>12.1f}{:>9.1f}x".format(payload_name, name, size,
+                                                                               seconds * 1000, baseline / seconds))
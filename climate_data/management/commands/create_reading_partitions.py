@@ -0,0 +1,40 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import pytz
+
+from django.core.management.base import BaseCommand
+
+from climate_data.partitions import create_partitions, month_start, next_month
+
+
+class Command(BaseCommand):
+    help = "Creates monthly reading partitions ahead of time. Should be run regularly (e.g. daily from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, default=3, help="Number of months ahead of the current one to create.")
+
+    def handle(self, *args, **options):
+        end = month_start(datetime.datetime.now(pytz.utc))
+        for i in range(options["months"]):
+            end = next_month(end)
+
+        created = create_partitions(datetime.datetime.now(pytz.utc), end)
+
+        for name in created:
+            self.stdout.write("Created partition {}.".format(name))
+
+        self.stdout.write("{} partitions created.".format(len(created)))
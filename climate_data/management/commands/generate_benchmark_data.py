@@ -0,0 +1,100 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import pytz
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from climate_data.functions import floor_time
+from climate_data.ingest import MESSAGE_INTERVAL
+from climate_data.gaps import rebuild_gaps
+from climate_data.latest import rebuild_latest_readings
+from climate_data.models import *
+from climate_data.rollups import rebuild_rollups
+
+
+# Benchmark stations are given GOES IDs of this prefix and a fixed-width hexadecimal number, filling the 8 characters
+# of a GOES ID. Real GOES IDs are all hexadecimal, so they never clash.
+BENCHMARK_GOES_ID_PREFIX = "BN"
+BENCHMARK_GOES_ID_DIGITS = Station._meta.get_field("goes_id").max_length - len(BENCHMARK_GOES_ID_PREFIX)
+
+
+class Command(BaseCommand):
+    help = "Fills the database with synthetic stations, sensors and readings for benchmarking queries. Never run " \
+           "this against a production database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stations", type=int, default=10, help="Number of stations to create.")
+        parser.add_argument("--sensors", type=int, default=9, help="Number of sensors linked to each station.")
+        parser.add_argument("--days", type=int, default=365, help="Number of days of readings, ending now.")
+        parser.add_argument("--read-frequency", type=int, default=4, help="Readings per sensor per message.")
+        parser.add_argument("--clear", action="store_true", help="Remove previously generated benchmark data first.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["clear"]:
+                stations = Station.objects.filter(goes_id__startswith=BENCHMARK_GOES_ID_PREFIX)
+                Reading.objects.filter(station__in=stations).delete()
+                Sensor.objects.filter(stations__in=stations).delete()
+                stations.delete()
+
+            data_type, _ = DataType.objects.get_or_create(short_name="bench", defaults={"name": "Benchmark"})
+            sensors = [Sensor.objects.create(name="benchmark_sensor_{}".format(i), data_id="bench", decimals=2)
+                       for i in range(options["sensors"])]
+
+            first_station = Station.objects.filter(goes_id__startswith=BENCHMARK_GOES_ID_PREFIX).count()
+            max_stations = 16 ** BENCHMARK_GOES_ID_DIGITS
+            if first_station + options["stations"] > max_stations:
+                raise CommandError("At most {} benchmark stations can be created.".format(max_stations))
+
+            links = []
+            for i in range(first_station, first_station + options["stations"]):
+                station = Station.objects.create(name="Benchmark Station {}".format(i),
+                                                 goes_id="{}{:0{}X}".format(BENCHMARK_GOES_ID_PREFIX, i,
+                                                                            BENCHMARK_GOES_ID_DIGITS))
+                links.extend(StationSensorLink.objects.create(station=station, sensor=sensor, data_type=data_type,
+                                                              station_order=order,
+                                                              read_frequency=options["read_frequency"])
+                             for order, sensor in enumerate(sensors, start=1))
+
+            interval = MESSAGE_INTERVAL / options["read_frequency"]
+            end = floor_time(datetime.datetime.now(pytz.utc), interval)
+            start = end - datetime.timedelta(days=options["days"])
+
+            # Readings are generated in time order, as they would be by ingest, so that the physical layout of the
+            # table matches production.
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO climate_data_reading (created, updated, read_time, data_source, value, qc_processed,
+                                                      invalid, series_flagged, sensor_id, station_id,
+                                                      station_sensor_link_id)
+                    SELECT now(), now(), t, %s, (random() * 4000 - 1000)::integer, false, false, false, l.sensor_id,
+                           l.station_id, l.id
+                    FROM generate_series(%s::timestamptz, %s::timestamptz, %s::interval) t
+                    CROSS JOIN climate_data_stationsensorlink l
+                    WHERE l.id = ANY(%s)
+                    ORDER BY t, l.id
+                """, [Reading.FROM_GOES, start, end, interval, [link.id for link in links]])
+
+                count = cursor.rowcount
+
+        rollups = rebuild_rollups(start, end, [link.id for link in links])
+        rebuild_latest_readings([link.id for link in links])
+        rebuild_gaps([link.id for link in links])
+
+        self.stdout.write("Generated {} readings and {} rollups for {} station-sensor links.".format(count, rollups,
+                                                                                                   len(links)))
@@ -0,0 +1,41 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from climate_data.dcp import DCPFormatError, import_messages
+
+
+class Command(BaseCommand):
+    help = "Imports messages from raw LRGS / DDS DCP dump files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", help="DCP dump files to import, or - for standard input.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Number of messages to insert per query.")
+
+    def handle(self, *args, **options):
+        for path in options["files"]:
+            try:
+                if path == "-":
+                    count = import_messages(sys.stdin.buffer, batch_size=options["batch_size"])
+                else:
+                    with open(path, "rb") as f:
+                        count = import_messages(f, batch_size=options["batch_size"])
+            except (DCPFormatError, OSError) as e:
+                raise CommandError("Could not import {}: {}".format(path, e))
+
+            self.stdout.write("Imported {} messages from {}.".format(count, path))
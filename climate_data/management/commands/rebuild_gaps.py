@@ -0,0 +1,38 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.core.management.base import BaseCommand
+
+from climate_data.gaps import rebuild_gaps
+from climate_data.models import *
+
+
+class Command(BaseCommand):
+    help = "Recomputes the gaps in stored readings, e.g. after a backfill or after changing read frequencies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--station", type=int, action="append", dest="stations",
+                            help="Only rebuild gaps for this station. May be given more than once.")
+
+    def handle(self, *args, **options):
+        link_ids = None
+
+        if options["stations"]:
+            link_ids = list(StationSensorLink.objects.filter(station__in=options["stations"])
+                            .values_list("id", flat=True))
+
+        found = rebuild_gaps(link_ids)
+
+        self.stdout.write("Found {} gaps.".format(found))
@@ -0,0 +1,70 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import dateutil.parser
+import pytz
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from climate_data.models import *
+from climate_data.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes hourly and daily reading rollups from stored readings, e.g. after a backfill."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="Start of the range to rebuild (defaults to the earliest reading).")
+        parser.add_argument("--end", help="End of the range to rebuild (defaults to the latest reading).")
+        parser.add_argument("--station", type=int, action="append", dest="stations",
+                            help="Only rebuild rollups for this station. May be given more than once.")
+        parser.add_argument("--chunk-days", type=int, default=7, help="Number of days to rebuild per transaction.")
+
+    def handle(self, *args, **options):
+        readings = Reading.objects.all()
+        link_ids = None
+
+        if options["stations"]:
+            link_ids = list(StationSensorLink.objects.filter(station__in=options["stations"])
+                            .values_list("id", flat=True))
+            readings = readings.filter(station_sensor_link__in=link_ids)
+
+        start = dateutil.parser.parse(options["start"]) if options["start"] else None
+        end = dateutil.parser.parse(options["end"]) if options["end"] else None
+
+        if start is None or end is None:
+            bounds = readings.aggregate(Min("read_time"), Max("read_time"))
+            start = start or bounds["read_time__min"]
+            end = end or bounds["read_time__max"]
+
+        if start is None or end is None:
+            self.stdout.write("No readings to roll up.")
+            return
+
+        if start.tzinfo is None:
+            start = pytz.utc.localize(start)
+
+        if end.tzinfo is None:
+            end = pytz.utc.localize(end)
+
+        if end < start:
+            raise CommandError("The end of the range must not be before the start.")
+
+        written = rebuild_rollups(start, end + datetime.timedelta(microseconds=1), link_ids,
+                                  chunk=datetime.timedelta(days=max(options["chunk_days"], 1)))
+
+        self.stdout.write("Wrote {} rollups.".format(written))
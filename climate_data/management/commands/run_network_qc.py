@@ -0,0 +1,65 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import dateutil.parser
+import pytz
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from climate_data.models import *
+from climate_data.series_qc import check_network
+
+
+class Command(BaseCommand):
+    help = ("Compares readings of each data type with a network threshold across stations, marking readings which "
+            "disagree sharply with the other stations at the same time as invalid. Run it regularly (e.g. daily from "
+            "cron, after run_qc), or with --start to check older data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="Start of the range to check (defaults to two days before the end).")
+        parser.add_argument("--end", help="End of the range to check (defaults to now).")
+        parser.add_argument("--data-type", action="append", dest="data_types",
+                            help="Only check readings of the data type with this short name. May be given more than "
+                                 "once.")
+        parser.add_argument("--grid-minutes", type=int, default=15,
+                            help="Length of the intervals readings are lined up on across stations.")
+
+    def handle(self, *args, **options):
+        end = dateutil.parser.parse(options["end"]) if options["end"] else timezone.now()
+        if end.tzinfo is None:
+            end = pytz.utc.localize(end)
+
+        start = dateutil.parser.parse(options["start"]) if options["start"] else end - datetime.timedelta(days=2)
+        if start.tzinfo is None:
+            start = pytz.utc.localize(start)
+
+        if end < start:
+            raise CommandError("The end of the range must not be before the start.")
+
+        if options["grid_minutes"] < 1:
+            raise CommandError("The grid must be at least a minute long.")
+
+        data_types = DataType.objects.filter(network_threshold__isnull=False)
+        if options["data_types"]:
+            data_types = data_types.filter(short_name__in=options["data_types"])
+
+        for data_type in data_types:
+            checked, flagged = check_network(data_type, start, end,
+                                             grid=datetime.timedelta(minutes=options["grid_minutes"]))
+
+            self.stdout.write("{}: checked {} readings, {} newly marked invalid.".format(data_type.short_name,
+                                                                                        checked, flagged))
@@ -0,0 +1,35 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.core.management.base import BaseCommand
+
+from climate_data.qc import check_bounds
+
+
+class Command(BaseCommand):
+    help = ("Checks readings which have not been QC processed against their data type's bounds, marking those out of "
+            "bounds as invalid. Run it regularly (e.g. every few minutes from cron) to keep up with incoming data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50000,
+                            help="Number of readings to check per transaction.")
+        parser.add_argument("--max-batches", type=int,
+                            help="Stop after this many batches (defaults to processing every waiting reading).")
+
+    def handle(self, *args, **options):
+        processed, flagged = check_bounds(batch_size=max(options["batch_size"], 1),
+                                          max_batches=options["max_batches"])
+
+        self.stdout.write("Processed {} readings, {} newly marked invalid.".format(processed, flagged))
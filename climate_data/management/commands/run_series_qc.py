@@ -0,0 +1,57 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import dateutil.parser
+import pytz
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from climate_data.series_qc import check_stations
+
+
+class Command(BaseCommand):
+    help = ("Runs the spike, rate of change and flatline checks configured on data types over readings which have "
+            "passed the bounds check, marking those which fail as invalid. Run it regularly (e.g. daily from cron, "
+            "after run_qc), or with --start to check older data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="Start of the range to check (defaults to two days before the end).")
+        parser.add_argument("--end", help="End of the range to check (defaults to now).")
+        parser.add_argument("--station", type=int, action="append", dest="stations",
+                            help="Only check readings from this station. May be given more than once.")
+        parser.add_argument("--processes", type=int,
+                            help="Number of stations to check at once (defaults to the number of CPUs).")
+
+    def handle(self, *args, **options):
+        end = dateutil.parser.parse(options["end"]) if options["end"] else timezone.now()
+        if end.tzinfo is None:
+            end = pytz.utc.localize(end)
+
+        start = dateutil.parser.parse(options["start"]) if options["start"] else end - datetime.timedelta(days=2)
+        if start.tzinfo is None:
+            start = pytz.utc.localize(start)
+
+        if end < start:
+            raise CommandError("The end of the range must not be before the start.")
+
+        if options["processes"] is not None and options["processes"] < 1:
+            raise CommandError("At least one process is needed.")
+
+        checked, flagged = check_stations(start, end, station_ids=options["stations"],
+                                          processes=options["processes"])
+
+        self.stdout.write("Checked {} readings, {} newly marked invalid.".format(checked, flagged))
@@ -19,6 +19,9 @@ def add_station_sensor_link_to_reading(apps, schema_editor):
     queryset = Reading.objects.filter(station_sensor_link=None)
     count = queryset.count()
 
+    if count == 0:
+        return
+
     sys.stdout.write("\n")
 
     sys.stdout.write("\r{}/{} ({}%)".format(offset, count, (offset / count) * 100))
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 12:41
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Duplicates must be removed before the unique constraints can be created. The oldest copy of each row is kept, and
+# readings pointing at a duplicate message are moved to the copy of the message which is kept. Foreign key checks are
+# made immediate so that no trigger events are pending when the tables are altered afterwards.
+REMOVE_DUPLICATES_SQL = """
+SET CONSTRAINTS ALL IMMEDIATE;
+
+UPDATE climate_data_reading r
+SET message_id = d.keep_id
+FROM (
+    SELECT id, min(id) OVER (PARTITION BY goes_id, arrival_time, goes_channel) AS keep_id
+    FROM climate_data_message
+) d
+WHERE r.message_id = d.id AND d.id <> d.keep_id;
+
+DELETE FROM climate_data_reading
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (PARTITION BY station_sensor_link_id, read_time, data_source ORDER BY id) AS n
+        FROM climate_data_reading
+        WHERE station_sensor_link_id IS NOT NULL
+    ) d
+    WHERE n > 1
+);
+
+DELETE FROM climate_data_message
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (PARTITION BY goes_id, arrival_time, goes_channel ORDER BY id) AS n
+        FROM climate_data_message
+    ) d
+    WHERE n > 1
+);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0030_auto_20170707_1727'),
+    ]
+
+    operations = [
+        migrations.RunSQL(REMOVE_DUPLICATES_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AlterUniqueTogether(
+            name='message',
+            unique_together=set([('goes_id', 'arrival_time', 'goes_channel')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reading',
+            unique_together=set([('station_sensor_link', 'read_time', 'data_source')]),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 12:46
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0031_auto_20261018_1241'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reading',
+            name='read_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='reading',
+            name='sensor',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='climate_data.Sensor'),
+        ),
+        migrations.AlterField(
+            model_name='reading',
+            name='station',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='climate_data.Station'),
+        ),
+        migrations.AlterField(
+            model_name='reading',
+            name='station_sensor_link',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='climate_data.StationSensorLink'),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['station', 'read_time'], name='reading_station_read_time'),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['sensor', 'read_time'], name='reading_sensor_read_time'),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['read_time'], name='reading_read_time_brin'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import pytz
+
+from django.db import migrations
+
+from climate_data.partitions import DEFAULT_PARTITION, create_partition, month_start, next_month
+
+
+PARTITION_MONTHS_AHEAD = 3
+
+
+def get_definitions(cursor, table):
+    """
+    Returns SQL re-creating the constraints and indexes of a table (other than the primary key), in the order they
+    should be applied.
+    """
+
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                   "WHERE conrelid = %s::regclass AND contype <> 'p' ORDER BY contype DESC", [table])
+    constraints = cursor.fetchall()
+
+    cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN "
+                   "(SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)", [table, table])
+    indexes = cursor.fetchall()
+
+    return ["ALTER TABLE {} ADD CONSTRAINT {} {}".format(table, name, definition) for name, definition in constraints] \
+        + [definition for definition, in indexes]
+
+
+def rebuild_reading_table(schema_editor, partitioned):
+    """
+    Replaces the reading table with a copy which is (or is not) range-partitioned on read time, keeping its columns,
+    sequence, constraints and indexes. A partitioned table's primary key must include the partition key, so it becomes
+    (id, read_time); ids still come from the same sequence and stay unique.
+    """
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        definitions = get_definitions(cursor, "climate_data_reading")
+
+        cursor.execute("ALTER TABLE climate_data_reading RENAME TO climate_data_reading_old")
+        cursor.execute("CREATE TABLE climate_data_reading (LIKE climate_data_reading_old INCLUDING DEFAULTS) {}".format(
+            "PARTITION BY RANGE (read_time)" if partitioned else ""))
+        cursor.execute("ALTER SEQUENCE climate_data_reading_id_seq OWNED BY climate_data_reading.id")
+
+        if partitioned:
+            cursor.execute("CREATE TABLE {} PARTITION OF climate_data_reading DEFAULT".format(DEFAULT_PARTITION))
+
+            cursor.execute("SELECT min(read_time) FROM climate_data_reading_old")
+            first_read_time = cursor.fetchone()[0]
+
+            now = datetime.datetime.now(pytz.utc)
+            month = month_start(first_read_time or now)
+            last_month = month_start(now)
+            for i in range(PARTITION_MONTHS_AHEAD):
+                last_month = next_month(last_month)
+
+            while month <= last_month:
+                create_partition(cursor, month)
+                month = next_month(month)
+
+        cursor.execute("INSERT INTO climate_data_reading SELECT * FROM climate_data_reading_old")
+        cursor.execute("DROP TABLE climate_data_reading_old")
+
+        cursor.execute("ALTER TABLE climate_data_reading ADD CONSTRAINT climate_data_reading_pkey PRIMARY KEY {}".format(
+            "(id, read_time)" if partitioned else "(id)"))
+        for definition in definitions:
+            cursor.execute(definition)
+
+
+# noinspection PyUnusedLocal
+def partition_reading(apps, schema_editor):
+    rebuild_reading_table(schema_editor, partitioned=True)
+
+
+# noinspection PyUnusedLocal
+def unpartition_reading(apps, schema_editor):
+    rebuild_reading_table(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0032_auto_20261018_1246'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_reading, unpartition_reading),
+    ]
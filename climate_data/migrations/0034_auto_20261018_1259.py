@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 12:59
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0033_partition_reading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('resolution', models.CharField(choices=[('h', 'Hourly'), ('d', 'Daily')], max_length=1)),
+                ('bucket_start', models.DateTimeField()),
+                ('reading_count', models.IntegerField()),
+                ('value_sum', models.BigIntegerField()),
+                ('value_min', models.IntegerField()),
+                ('value_max', models.IntegerField()),
+                ('value_last', models.IntegerField()),
+                ('last_read_time', models.DateTimeField()),
+                ('sensor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='climate_data.Sensor')),
+                ('station', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='climate_data.Station')),
+                ('station_sensor_link', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='climate_data.StationSensorLink')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='readingrollup',
+            index=models.Index(fields=['station', 'resolution', 'bucket_start'], name='rollup_station_bucket_start'),
+        ),
+        migrations.AddIndex(
+            model_name='readingrollup',
+            index=models.Index(fields=['sensor', 'resolution', 'bucket_start'], name='rollup_sensor_bucket_start'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='readingrollup',
+            unique_together=set([('station_sensor_link', 'resolution', 'bucket_start')]),
+        ),
+    ]
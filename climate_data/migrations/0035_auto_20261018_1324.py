@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 13:24
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0034_auto_20261018_1259'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='station',
+            name='readings_updated',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['updated'], name='message_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['station', 'updated'], name='message_station_updated'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 13:29
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Copies the newest reading of every station-sensor link into the new table.
+POPULATE_LATEST_READINGS_SQL = """
+    INSERT INTO climate_data_latestreading (station_sensor_link_id, reading_id, created, updated, read_time, data_source,
+                                            value, qc_processed, invalid, sensor_id, station_id, message_id)
+    SELECT l.id, r.id, r.created, r.updated, r.read_time, r.data_source, r.value, r.qc_processed, r.invalid,
+           r.sensor_id, r.station_id, r.message_id
+    FROM climate_data_stationsensorlink l
+    CROSS JOIN LATERAL (
+        SELECT * FROM climate_data_reading
+        WHERE station_sensor_link_id = l.id
+        ORDER BY read_time DESC, id DESC
+        LIMIT 1
+    ) r
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0035_auto_20261018_1324'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestReading',
+            fields=[
+                ('station_sensor_link', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='climate_data.StationSensorLink')),
+                ('reading_id', models.IntegerField()),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('read_time', models.DateTimeField()),
+                ('data_source', models.CharField(choices=[('G', 'GOES satellite message'), ('L', 'Station data log')], max_length=1)),
+                ('value', models.IntegerField(null=True)),
+                ('qc_processed', models.BooleanField()),
+                ('invalid', models.BooleanField()),
+                ('message', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='climate_data.Message')),
+                ('sensor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='climate_data.Sensor')),
+                ('station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='climate_data.Station')),
+            ],
+        ),
+        migrations.RunSQL(POPULATE_LATEST_READINGS_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Readings waiting for QC are found through a partial index, which only holds the unprocessed readings and so stays
+# small however many readings are stored. Django cannot declare partial indexes, so it is created here.
+CREATE_INDEX_SQL = "CREATE INDEX reading_qc_pending ON climate_data_reading (read_time) WHERE NOT qc_processed"
+
+DROP_INDEX_SQL = "DROP INDEX reading_qc_pending"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0037_auto_20261018_1342'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INDEX_SQL, reverse_sql=DROP_INDEX_SQL),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 13:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0038_reading_qc_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datatype',
+            name='flatline_duration',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datatype',
+            name='rate_of_change_threshold',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datatype',
+            name='spike_threshold',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
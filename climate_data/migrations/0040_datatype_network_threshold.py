@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 13:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0039_datatype_series_qc_thresholds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datatype',
+            name='network_threshold',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
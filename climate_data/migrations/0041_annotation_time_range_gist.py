@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Annotations are looked up by overlap with a time range, usually along with a station and sensor, which have their own
+# indexes. Django cannot declare GiST indexes, so it is created here.
+CREATE_INDEX_SQL = "CREATE INDEX annotation_time_range ON climate_data_annotation USING gist (time_range)"
+
+DROP_INDEX_SQL = "DROP INDEX annotation_time_range"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0040_datatype_network_threshold'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INDEX_SQL, reverse_sql=DROP_INDEX_SQL),
+    ]
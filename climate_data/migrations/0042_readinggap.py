@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 13:59
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0041_annotation_time_range_gist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingGap',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('gap_start', models.DateTimeField()),
+                ('gap_end', models.DateTimeField()),
+                ('missing_count', models.IntegerField()),
+                ('sensor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='climate_data.Sensor')),
+                ('station', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='climate_data.Station')),
+                ('station_sensor_link', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='climate_data.StationSensorLink')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='readinggap',
+            index=models.Index(fields=['station', 'gap_end'], name='gap_station_gap_end'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='readinggap',
+            unique_together=set([('station_sensor_link', 'gap_start')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 14:08
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0042_readinggap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reading',
+            name='series_flagged',
+            field=models.BooleanField(default=False),
+        ),
+    ]
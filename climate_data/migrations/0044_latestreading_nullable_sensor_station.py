@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0043_reading_series_flagged'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='latestreading',
+            name='sensor',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='climate_data.Sensor'),
+        ),
+        migrations.AlterField(
+            model_name='latestreading',
+            name='station',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='climate_data.Station'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.23 on 2026-10-18 14:17
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_data', '0044_latestreading_nullable_sensor_station'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='station',
+            name='messages_removed',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -13,8 +13,12 @@
 # limitations under the License.
 
 
+import datetime
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.postgres.fields import ArrayField, DateTimeRangeField, FloatRangeField
+from django.contrib.postgres.indexes import BrinIndex
 from psycopg2.extras import NumericRange
 
 
@@ -113,6 +117,17 @@ class DataType(models.Model):
     unit = models.CharField(max_length=40, choices=UNIT_CHOICES, null=True)
     bounds = FloatRangeField(default="[{},{})".format(-(2**31), (2**31 - 1)))
 
+    # Thresholds for the time series QC checks (see climate_data.series_qc), in the data type's unit; a check is skipped
+    # for data types without a threshold for it. The spike threshold is the largest plausible jump of a single reading
+    # away from both of its neighbours, the rate of change threshold the largest plausible change between consecutive
+    # readings per hour, and the flatline duration the shortest time over which an unchanging value means the sensor
+    # is stuck. The network threshold is how many (scaled) median absolute deviations a reading may be from the median
+    # of every station's reading at the same time.
+    spike_threshold = models.FloatField(null=True, blank=True)
+    rate_of_change_threshold = models.FloatField(null=True, blank=True)
+    flatline_duration = models.DurationField(null=True, blank=True)
+    network_threshold = models.FloatField(null=True, blank=True)
+
     def __repr__(self):
         return "<DataType {} ({})>".format(self.name, self.short_name)
 
@@ -155,6 +170,14 @@ class Station(models.Model):
     name = models.CharField(max_length=100)
     goes_id = models.CharField(max_length=8)
 
+    # When readings from the station were last added, changed or removed. Kept up to date along with rollups, and used
+    # to answer conditional requests for the station's data without querying readings.
+    readings_updated = models.DateTimeField(default=timezone.now, editable=False)
+
+    # When messages were last removed from the station's message lists, by being deleted or moved to another station,
+    # which the latest update time of its remaining messages cannot show.
+    messages_removed = models.DateTimeField(default=timezone.now, editable=False)
+
     # Foreign keys
     sensors = models.ManyToManyField(Sensor, through="StationSensorLink", related_name="stations")
 
@@ -165,6 +188,9 @@ class Station(models.Model):
         return self.name
 
 
+MESSAGE_INTERVAL = datetime.timedelta(hours=1)  # Stations transmit one self-timed message per hour.
+
+
 class StationSensorLink(models.Model):
     """
     A model representing many-to-many links between stations and common sensor classes.
@@ -234,7 +260,7 @@ class Reading(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
-    read_time = models.DateTimeField(db_index=True)
+    read_time = models.DateTimeField()  # Indexed below.
     data_source = models.CharField(max_length=1, choices=DATA_SOURCE_CHOICES, default=FROM_GOES)
 
     value = models.IntegerField(null=True)
@@ -242,10 +268,15 @@ class Reading(models.Model):
     qc_processed = models.BooleanField(default=False, verbose_name="QC Processed")
     invalid = models.BooleanField(default=False)
 
+    # Set along with invalid by the time series and network checks (see climate_data.series_qc), which keep such
+    # readings in the series they check so that rerunning them over the same time flags nothing new.
+    series_flagged = models.BooleanField(default=False)
+
     # Foreign keys
-    sensor = models.ForeignKey("Sensor", on_delete=models.SET_NULL, null=True)  # We can get data type from sensor.
-    station = models.ForeignKey("Station", on_delete=models.SET_NULL, null=True)
-    station_sensor_link = models.ForeignKey("StationSensorLink", on_delete=models.SET_NULL, null=True)
+    # We can get data type from sensor. Station, sensor and link lookups are covered by the composite indexes below.
+    sensor = models.ForeignKey("Sensor", on_delete=models.SET_NULL, null=True, db_index=False)
+    station = models.ForeignKey("Station", on_delete=models.SET_NULL, null=True, db_index=False)
+    station_sensor_link = models.ForeignKey("StationSensorLink", on_delete=models.SET_NULL, null=True, db_index=False)
     message = models.ForeignKey("Message", on_delete=models.SET_NULL, null=True)
 
     def __repr__(self):
@@ -254,6 +285,152 @@ class Reading(models.Model):
     def __str__(self):
         return "Reading '{}' at {} from station {}".format(self.value, self.read_time, self.station)
 
+    class Meta:
+        unique_together = ("station_sensor_link", "read_time", "data_source")
+
+        # Almost all reading queries filter by station, sensor or link and then by a read time range (the unique
+        # constraint above serves links). Time-only ranges use a BRIN index, which is a fraction of the size of a b-tree
+        # since readings are appended in read time order. Readings waiting for QC are found through a partial index
+        # on read time, created in migration 0038 since Django cannot declare partial indexes.
+        indexes = [
+            models.Index(fields=["station", "read_time"], name="reading_station_read_time"),
+            models.Index(fields=["sensor", "read_time"], name="reading_sensor_read_time"),
+            BrinIndex(fields=["read_time"], name="reading_read_time_brin"),
+        ]
+
+
+class ReadingRollup(models.Model):
+    """
+    A model representing a summary of the valid readings from a station-sensor link over an hour or a day. Rollups are
+    kept up to date as readings are ingested or changed, so long ranges can be summarized without touching every reading.
+    """
+
+    HOURLY = "h"
+    DAILY = "d"
+
+    RESOLUTION_CHOICES = (
+        (HOURLY, "Hourly"),
+        (DAILY, "Daily"),
+    )
+
+    updated = models.DateTimeField(auto_now=True)
+
+    resolution = models.CharField(max_length=1, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+
+    reading_count = models.IntegerField()
+    value_sum = models.BigIntegerField()
+    value_min = models.IntegerField()
+    value_max = models.IntegerField()
+    value_last = models.IntegerField()  # The value of the latest reading in the bucket.
+    last_read_time = models.DateTimeField()
+
+    # Foreign keys
+    station_sensor_link = models.ForeignKey("StationSensorLink", on_delete=models.CASCADE, db_index=False)
+    sensor = models.ForeignKey("Sensor", on_delete=models.CASCADE, db_index=False)
+    station = models.ForeignKey("Station", on_delete=models.CASCADE, db_index=False)
+
+    def value_average(self):
+        return self.value_sum / self.reading_count
+
+    def __repr__(self):
+        return "<ReadingRollup | Link: {}, Resolution: {}, Start: {}>".format(self.station_sensor_link_id,
+                                                                             self.resolution, self.bucket_start)
+
+    def __str__(self):
+        return "{} rollup of link {} from {}".format(self.get_resolution_display(), self.station_sensor_link_id,
+                                                     self.bucket_start)
+
+    class Meta:
+        unique_together = ("station_sensor_link", "resolution", "bucket_start")
+        indexes = [
+            models.Index(fields=["station", "resolution", "bucket_start"], name="rollup_station_bucket_start"),
+            models.Index(fields=["sensor", "resolution", "bucket_start"], name="rollup_sensor_bucket_start"),
+        ]
+
+
+class ReadingGap(models.Model):
+    """
+    A model representing a stretch of time in which readings from a station-sensor link are missing: two consecutive
+    readings further apart than the link's read interval. Gaps are kept up to date as readings are ingested, changed or
+    deleted, so missing data can be listed without searching the readings.
+    """
+
+    updated = models.DateTimeField(auto_now=True)
+
+    # The read times of the readings on either side of the gap; no readings exist in between.
+    gap_start = models.DateTimeField()
+    gap_end = models.DateTimeField()
+
+    missing_count = models.IntegerField()  # How many readings would have been taken in the gap, on schedule.
+
+    # Foreign keys
+    station_sensor_link = models.ForeignKey("StationSensorLink", on_delete=models.CASCADE, db_index=False)
+    sensor = models.ForeignKey("Sensor", on_delete=models.CASCADE, db_index=False)
+    station = models.ForeignKey("Station", on_delete=models.CASCADE, db_index=False)
+
+    def __repr__(self):
+        return "<ReadingGap | Link: {}, Start: {}, End: {}>".format(self.station_sensor_link_id, self.gap_start,
+                                                                   self.gap_end)
+
+    def __str__(self):
+        return "Gap in link {} from {} to {}".format(self.station_sensor_link_id, self.gap_start, self.gap_end)
+
+    class Meta:
+        unique_together = ("station_sensor_link", "gap_start")
+        indexes = [
+            models.Index(fields=["station", "gap_end"], name="gap_station_gap_end"),
+        ]
+
+
+class LatestReading(models.Model):
+    """
+    A model holding a copy of the latest reading from each station-sensor link, kept up to date as readings are
+    ingested or changed, so that current values can be looked up without searching the readings.
+    """
+
+    station_sensor_link = models.OneToOneField("StationSensorLink", on_delete=models.CASCADE, primary_key=True)
+
+    reading_id = models.IntegerField()
+
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+
+    read_time = models.DateTimeField()
+    data_source = models.CharField(max_length=1, choices=Reading.DATA_SOURCE_CHOICES)
+
+    value = models.IntegerField(null=True)
+
+    qc_processed = models.BooleanField()
+    invalid = models.BooleanField()
+
+    # Foreign keys, copied from the reading (which may have no sensor or station of its own).
+    sensor = models.ForeignKey("Sensor", on_delete=models.SET_NULL, null=True, db_index=False)
+    station = models.ForeignKey("Station", on_delete=models.SET_NULL, null=True)
+    message = models.ForeignKey("Message", on_delete=models.SET_NULL, null=True, db_index=False)
+
+    def as_reading(self, annotations=()):
+        """
+        Returns an unsaved reading with the same fields as the one copied, for use with reading serializers. The named
+        annotations of this latest reading are set on it as well.
+        """
+
+        reading = Reading(id=self.reading_id, created=self.created, updated=self.updated, read_time=self.read_time,
+                          data_source=self.data_source, value=self.value, qc_processed=self.qc_processed,
+                          invalid=self.invalid, sensor_id=self.sensor_id, station_id=self.station_id,
+                          station_sensor_link_id=self.station_sensor_link_id, message_id=self.message_id)
+
+        for name in annotations:
+            setattr(reading, name, getattr(self, name))
+
+        return reading
+
+    def __repr__(self):
+        return "<LatestReading | Link: {}, Time: {}>".format(self.station_sensor_link_id, self.read_time)
+
+    def __str__(self):
+        return "Latest reading of link {} at {}".format(self.station_sensor_link_id, self.read_time)
+
 
 class Annotation(models.Model):
     """
@@ -263,7 +440,7 @@ class Annotation(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
-    time_range = DateTimeRangeField()
+    time_range = DateTimeRangeField()  # Has a GiST index for overlap lookups, created in migration 0041.
 
     comment = models.TextField()
 
@@ -364,6 +541,18 @@ class Message(models.Model):
     def __str__(self):
         return "Message from {} at {}".format(self.goes_id, self.arrival_time)
 
+    class Meta:
+        unique_together = ("goes_id", "arrival_time", "goes_channel")
+
+        # The latest changes to messages, overall and for a station, are used to answer conditional requests. The admin
+        # and message lists (overall and for a station) are ordered and paged by arrival time.
+        indexes = [
+            models.Index(fields=["updated"], name="message_updated"),
+            models.Index(fields=["station", "updated"], name="message_station_updated"),
+            models.Index(fields=["arrival_time"], name="message_arrival_time"),
+            models.Index(fields=["station", "arrival_time"], name="message_station_arrival"),
+        ]
+
 
 class Setting(models.Model):
     """
@@ -0,0 +1,128 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import base64
+import binascii
+import dateutil.parser
+import json
+
+from collections import OrderedDict
+
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates a queryset by a (time, id) key, with an opaque cursor marking the last item of the previous page. Each
+    page is fetched with a range condition on the key, so no COUNT or OFFSET queries are ever run.
+
+    Messages, and the readings of a single station or sensor, are read in order from a b-tree index ending in their
+    time, so a page deep into the history costs about the same as the first one. Readings of every station only have a
+    BRIN index on read time, so each of their pages sorts the readings from its cursor to the end of the requested range
+    instead; pages get cheaper towards the end of a range, but large ranges are best requested in shorter ones.
+
+    Pagination is only used when the request has a cursor or page size parameter, so existing clients keep getting
+    plain lists.
+    """
+
+    time_field = None
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = 1000
+    max_page_size = 10000
+
+    invalid_cursor_message = "Invalid cursor."
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param, None)
+        if encoded is None:
+            return None
+
+        try:
+            time, pk = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8"))
+            return dateutil.parser.parse(time), int(pk)
+        except (binascii.Error, TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj):
+        key = [getattr(obj, self.time_field).isoformat(), obj.pk]
+        return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+    def is_requested(self, request):
+        return self.cursor_query_param in request.query_params or self.page_size_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(self.time_field, "pk")
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            time, pk = cursor
+
+            # The redundant lower bound lets the database use its (..., time) indexes for the range.
+            queryset = queryset.filter(**{self.time_field + "__gte": time}).filter(
+                Q(**{self.time_field + "__gt": time}) | Q(**{self.time_field: time, "pk__gt": pk})
+            )
+
+        # One extra item is fetched to tell whether there is a next page.
+        results = list(queryset[:page_size + 1])
+
+        self.next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_cursor = self.encode_cursor(results[-1])
+
+        return results
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("results", data),
+        ]))
+
+
+class ReadingPagination(KeysetPagination):
+    time_field = "read_time"
+
+
+class MessagePagination(KeysetPagination):
+    time_field = "arrival_time"
@@ -0,0 +1,85 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import pytz
+
+from django.db import connection, transaction
+
+from climate_data.models import Reading
+
+
+# Readings are stored in monthly range partitions on read time (UTC). Readings outside every monthly partition go to a
+# default partition, so ingest never fails because a partition has not been created in time.
+READING_TABLE = Reading._meta.db_table
+DEFAULT_PARTITION = "{}_default".format(READING_TABLE)
+
+
+def month_start(time):
+    return time.astimezone(pytz.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month):
+    return "{}_{:04d}_{:02d}".format(READING_TABLE, month.year, month.month)
+
+
+def create_partition(cursor, month):
+    """
+    Creates the partition holding readings from the month starting at the given time, unless it already exists. Any
+    readings for the month are moved out of the default partition first, since PostgreSQL will not attach a partition
+    whose range overlaps rows in the default partition. Returns whether a partition was created.
+    """
+
+    qn = connection.ops.quote_name
+    name = partition_name(month)
+
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+
+    bounds = [month, next_month(month)]
+
+    cursor.execute("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)".format(qn(name), qn(READING_TABLE)))
+    cursor.execute(
+        "WITH moved AS (DELETE FROM {} WHERE read_time >= %s AND read_time < %s RETURNING *) "
+        "INSERT INTO {} SELECT * FROM moved".format(qn(DEFAULT_PARTITION), qn(name)),
+        bounds
+    )
+    cursor.execute("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)".format(qn(READING_TABLE),
+                                                                                           qn(name)), bounds)
+
+    return True
+
+
+def create_partitions(start, end):
+    """
+    Creates any missing monthly reading partitions covering the given time range. Returns the names of the partitions
+    created.
+    """
+
+    created = []
+    month = month_start(start)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        while month <= end:
+            if create_partition(cursor, month):
+                created.append(partition_name(month))
+            month = next_month(month)
+
+    return created
@@ -0,0 +1,103 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.db import connection, transaction
+
+from climate_data.rollups import update_rollups
+
+
+# The read time range covered by the next batch of unprocessed readings, found through the partial index on them.
+PENDING_RANGE_SQL = """
+    SELECT min(read_time), max(read_time) FROM (
+        SELECT read_time FROM climate_data_reading WHERE NOT qc_processed ORDER BY read_time LIMIT %(batch_size)s
+    ) p
+"""
+
+# Checks every unprocessed reading in a read time range against its data type's bounds in one statement. The range is
+# passed as literals so that only the partitions covering it are touched. Readings already marked invalid stay invalid,
+# and readings without a value, link or bounds are only marked as processed. The latest readings and station
+# watermarks are brought in line in the same statement, and the links and read times of readings which became invalid
+# are returned so their rollups can be recomputed.
+CHECK_BOUNDS_SQL = """
+    WITH checked AS (
+        UPDATE climate_data_reading r
+        SET qc_processed = true, updated = now(),
+            invalid = r.invalid OR NOT coalesce(d.bounds @> (r.value::numeric / power(10::numeric, s.decimals)), true)
+        FROM climate_data_reading o
+        LEFT JOIN climate_data_sensor s ON s.id = o.sensor_id
+        LEFT JOIN climate_data_stationsensorlink l ON l.id = o.station_sensor_link_id
+        LEFT JOIN climate_data_datatype d ON d.id = l.data_type_id
+        WHERE r.id = o.id AND r.read_time = o.read_time
+          AND r.read_time >= %(start)s AND r.read_time <= %(end)s AND NOT r.qc_processed
+          AND o.read_time >= %(start)s AND o.read_time <= %(end)s AND NOT o.qc_processed
+        RETURNING r.id, r.station_sensor_link_id, r.read_time, r.updated, r.invalid,
+                  r.invalid AND NOT o.invalid AS flagged
+    ), latest AS (
+        UPDATE climate_data_latestreading l
+        SET qc_processed = true, invalid = c.invalid, updated = c.updated
+        FROM checked c
+        WHERE l.reading_id = c.id
+    ), stations AS (
+        UPDATE climate_data_station SET readings_updated = now()
+        WHERE id IN (SELECT station_id FROM climate_data_stationsensorlink
+                     WHERE id IN (SELECT station_sensor_link_id FROM checked))
+    )
+    SELECT count(*), count(*) FILTER (WHERE flagged),
+           coalesce(array_agg(station_sensor_link_id) FILTER (WHERE flagged), '{}'),
+           coalesce(array_agg(read_time) FILTER (WHERE flagged), '{}')
+    FROM checked
+"""
+
+
+def check_bounds_batch(batch_size=50000):
+    """
+    Runs bounds QC on (roughly) the oldest batch_size unprocessed readings, marking readings whose decimal value falls
+    outside their data type's bounds as invalid and all of them as QC processed. Returns the number of readings
+    processed and the number of them which were newly marked invalid.
+    """
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(PENDING_RANGE_SQL, {"batch_size": batch_size})
+        start, end = cursor.fetchone()
+
+        if start is None:
+            return 0, 0
+
+        cursor.execute(CHECK_BOUNDS_SQL, {"start": start, "end": end})
+        processed, flagged, link_ids, read_times = cursor.fetchone()
+
+        update_rollups(zip(link_ids, read_times))
+
+    return processed, flagged
+
+
+def check_bounds(batch_size=50000, max_batches=None):
+    """
+    Runs bounds QC on every unprocessed reading, one batch per transaction, so readings are checked incrementally as
+    they arrive. Returns the number of readings processed and the number newly marked invalid.
+    """
+
+    processed = flagged = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        batch_processed, batch_flagged = check_bounds_batch(batch_size)
+        if not batch_processed:
+            break
+
+        processed += batch_processed
+        flagged += batch_flagged
+        batches += 1
+
+    return processed, flagged
@@ -0,0 +1,191 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from itertools import islice
+
+from django.db import models
+
+from rest_framework import renderers
+
+from climate_data.models import *
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Arrow and Parquet output are optional.
+    pyarrow = None
+
+
+# IDs of stations and sensors are small, so they are stored in narrow columns.
+SMALL_ID_MODELS = (Station, Sensor)
+
+
+def arrow_type(field):
+    """
+    Returns the Arrow type used for a column holding the values of a model field (or annotation).
+    """
+
+    if isinstance(field, models.AutoField):
+        return pyarrow.int64()
+
+    if isinstance(field, models.ForeignKey):
+        return pyarrow.int16() if field.related_model in SMALL_ID_MODELS else pyarrow.int32()
+
+    if isinstance(field, models.DateTimeField):
+        return pyarrow.timestamp("us", tz="UTC")
+
+    if isinstance(field, models.BooleanField):
+        return pyarrow.bool_()
+
+    if isinstance(field, models.IntegerField):
+        return pyarrow.int32()
+
+    if isinstance(field, models.FloatField):
+        return pyarrow.float64()
+
+    return pyarrow.string()
+
+
+class ChunkSink(object):
+    """
+    A write-only file-like object which collects what is written to it until it is taken, so that a file can be sent
+    to the client in pieces as it is being written.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class TabularRenderer(renderers.BaseRenderer):
+    """
+    Base for renderers of typed, columnar binary formats. Lists of readings are not passed through serializers at all;
+    they are written in record batches straight from a database cursor (see climate_data.streaming). Anything else,
+    such as bucketed summaries or errors, is rendered from the serialized data as a single table.
+    """
+
+    charset = None
+    render_style = "binary"
+    batch_size = 65536
+
+    def open_writer(self, sink, schema):
+        raise NotImplementedError
+
+    def write_batch(self, writer, batch):
+        raise NotImplementedError
+
+    def schema(self, model_fields):
+        return pyarrow.schema([(f.name, arrow_type(f)) for f in model_fields])
+
+    def batches(self, rows, schema):
+        rows = iter(rows)
+
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                return
+
+            columns = zip(*chunk)
+            yield pyarrow.RecordBatch.from_arrays([pyarrow.array(column, type=f.type)
+                                                   for column, f in zip(columns, schema)], schema=schema)
+
+    def stream(self, rows, model_fields):
+        """
+        Writes rows of model field values, yielding the output one record batch at a time.
+        """
+
+        schema = self.schema(model_fields)
+        sink = ChunkSink()
+        writer = self.open_writer(sink, schema)
+
+        yield sink.take()
+
+        for batch in self.batches(rows, schema):
+            self.write_batch(writer, batch)
+            yield sink.take()
+
+        writer.close()
+        yield sink.take()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        if isinstance(data, dict):
+            data = [data]
+
+        table = pyarrow.Table.from_pylist(list(data))
+        sink = ChunkSink()
+        writer = self.open_writer(sink, table.schema)
+
+        for batch in table.to_batches():
+            self.write_batch(writer, batch)
+
+        writer.close()
+        return sink.take()
+
+
+class ArrowStreamRenderer(TabularRenderer):
+    """
+    Renders data in the Apache Arrow IPC streaming format, e.g. for pyarrow.ipc.open_stream.
+    """
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+
+    def open_writer(self, sink, schema):
+        return pyarrow.ipc.new_stream(sink, schema)
+
+    def write_batch(self, writer, batch):
+        writer.write_batch(batch)
+
+
+class ParquetRenderer(TabularRenderer):
+    """
+    Renders data as a Parquet file, with one row group per record batch.
+    """
+
+    media_type = "application/vnd.apache.parquet"
+    format = "parquet"
+
+    def open_writer(self, sink, schema):
+        return pyarrow.parquet.ParquetWriter(sink, schema)
+
+    def write_batch(self, writer, batch):
+        writer.write_table(pyarrow.Table.from_batches([batch]))
+
+
+TABULAR_RENDERERS = (ArrowStreamRenderer, ParquetRenderer) if pyarrow is not None else ()
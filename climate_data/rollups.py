@@ -0,0 +1,202 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from climate_data.conditional import mark_readings_written
+from climate_data.functions import floor_time
+from climate_data.latest import refresh_latest_readings
+from climate_data.models import *
+
+
+RESOLUTION_INTERVALS = {
+    ReadingRollup.HOURLY: datetime.timedelta(hours=1),
+    ReadingRollup.DAILY: datetime.timedelta(days=1),
+}
+
+ROLLUP_COLUMNS = ("updated, resolution, bucket_start, reading_count, value_sum, value_min, value_max, value_last, "
+                  "last_read_time, station_sensor_link_id, sensor_id, station_id")
+
+# Hourly rollups are computed from valid readings; daily rollups are computed from the hourly rollups.
+HOURLY_ROLLUP_SELECT = """
+    SELECT now(), 'h', b.bucket_start, count(*), sum(r.value), min(r.value), max(r.value),
+           (array_agg(r.value ORDER BY r.read_time DESC))[1], max(r.read_time), l.id, l.sensor_id, l.station_id
+    FROM {buckets} AS b (link_id, bucket_start)
+    JOIN climate_data_stationsensorlink l ON l.id = b.link_id
+    JOIN climate_data_reading r ON r.station_sensor_link_id = b.link_id
+                               AND r.read_time >= b.bucket_start AND r.read_time < b.bucket_start + interval '1 hour'
+    WHERE NOT r.invalid AND r.value IS NOT NULL
+    GROUP BY b.bucket_start, l.id, l.sensor_id, l.station_id
+"""
+
+DAILY_ROLLUP_SELECT = """
+    SELECT now(), 'd', b.bucket_start, sum(h.reading_count), sum(h.value_sum), min(h.value_min), max(h.value_max),
+           (array_agg(h.value_last ORDER BY h.last_read_time DESC))[1], max(h.last_read_time), l.id, l.sensor_id,
+           l.station_id
+    FROM {buckets} AS b (link_id, bucket_start)
+    JOIN climate_data_stationsensorlink l ON l.id = b.link_id
+    JOIN climate_data_readingrollup h ON h.station_sensor_link_id = b.link_id AND h.resolution = 'h'
+                                     AND h.bucket_start >= b.bucket_start
+                                     AND h.bucket_start < b.bucket_start + interval '1 day'
+    GROUP BY b.bucket_start, l.id, l.sensor_id, l.station_id
+"""
+
+# Rebuilds aggregate whole ranges of time at once rather than looking up individual buckets.
+HOURLY_REBUILD_SELECT = """
+    SELECT now(), 'h', to_timestamp(floor(extract(epoch FROM r.read_time) / 3600) * 3600) AS bucket_start, count(*),
+           sum(r.value), min(r.value), max(r.value), (array_agg(r.value ORDER BY r.read_time DESC))[1],
+           max(r.read_time), l.id, l.sensor_id, l.station_id
+    FROM climate_data_reading r
+    JOIN climate_data_stationsensorlink l ON l.id = r.station_sensor_link_id
+    WHERE r.read_time >= %(start)s AND r.read_time < %(end)s AND NOT r.invalid AND r.value IS NOT NULL {link_filter}
+    GROUP BY bucket_start, l.id, l.sensor_id, l.station_id
+"""
+
+DAILY_REBUILD_SELECT = """
+    SELECT now(), 'd', to_timestamp(floor(extract(epoch FROM h.bucket_start) / 86400) * 86400) AS day_start,
+           sum(h.reading_count), sum(h.value_sum), min(h.value_min), max(h.value_max), (array_agg(h.value_last ORDER BY h.last_read_time DESC))[1],
+           max(h.last_read_time), l.id, l.sensor_id, l.station_id
+    FROM climate_data_readingrollup h
+    JOIN climate_data_stationsensorlink l ON l.id = h.station_sensor_link_id
+    WHERE h.resolution = 'h' AND h.bucket_start >= %(start)s AND h.bucket_start < %(end)s {link_filter}
+    GROUP BY day_start, l.id, l.sensor_id, l.station_id
+"""
+
+
+# Serializes refreshes of the same links' rollups (and gaps) across transactions. Each refresh deletes rows and inserts
+# them again; without the lock, two transactions ingesting into the same bucket would each delete nothing the other
+# had not yet committed, and the second insert would fail. Once the lock is granted, later statements see everything
+# the other transaction committed, so the totals include both. NO KEY UPDATE does not conflict with the key share
+# locks taken by inserting readings which refer to the links.
+LOCK_LINKS_SQL = """
+    SELECT id FROM climate_data_stationsensorlink
+    WHERE %(link_ids)s::integer[] IS NULL OR id = ANY(%(link_ids)s)
+    ORDER BY id FOR NO KEY UPDATE
+"""
+
+
+def lock_links(cursor, link_ids=None):
+    """
+    Locks the given station-sensor links (or all of them) until the end of the transaction, in ID order so that
+    transactions locking overlapping sets of links cannot deadlock.
+    """
+
+    cursor.execute(LOCK_LINKS_SQL, {"link_ids": sorted(link_ids) if link_ids is not None else None})
+
+
+def _refresh_buckets(cursor, resolution, select, link_ids, bucket_starts):
+    buckets = "unnest(%s::integer[], %s::timestamptz[])"
+
+    cursor.execute(
+        "DELETE FROM climate_data_readingrollup WHERE resolution = %s "
+        "AND (station_sensor_link_id, bucket_start) IN (SELECT * FROM {})".format(buckets),
+        [resolution, link_ids, bucket_starts]
+    )
+    cursor.execute(
+        "INSERT INTO climate_data_readingrollup ({}) {}".format(ROLLUP_COLUMNS, select.format(buckets=buckets)),
+        [link_ids, bucket_starts]
+    )
+
+
+def update_rollups(keys):
+    """
+    Recomputes the hourly and daily rollups covering the given (station_sensor_link_id, read_time) pairs, and marks the
+    readings of the links' stations as updated. Should be called whenever readings are inserted, changed or deleted;
+    only the affected buckets are touched, so this is cheap enough to run as part of ingestion.
+    """
+
+    buckets = {resolution: set() for resolution in RESOLUTION_INTERVALS}
+
+    for link_id, read_time in keys:
+        if link_id is None:
+            continue
+
+        for resolution, interval in RESOLUTION_INTERVALS.items():
+            buckets[resolution].add((link_id, floor_time(read_time, interval)))
+
+    if not buckets[ReadingRollup.HOURLY]:
+        return
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        lock_links(cursor, {link_id for link_id, _ in buckets[ReadingRollup.HOURLY]})
+
+        for resolution, select in ((ReadingRollup.HOURLY, HOURLY_ROLLUP_SELECT),
+                                   (ReadingRollup.DAILY, DAILY_ROLLUP_SELECT)):
+            link_ids, bucket_starts = zip(*sorted(buckets[resolution]))
+            _refresh_buckets(cursor, resolution, select, list(link_ids), list(bucket_starts))
+
+        cursor.execute(
+            "UPDATE climate_data_station SET readings_updated = %s WHERE id IN "
+            "(SELECT station_id FROM climate_data_stationsensorlink WHERE id = ANY(%s))",
+            [timezone.now(), sorted({link_id for link_id, _ in buckets[ReadingRollup.HOURLY]})]
+        )
+
+
+def update_readings(queryset, **values):
+    """
+    Updates every reading in a queryset with the given field values, then recomputes the rollups and latest readings
+    covering them.
+    """
+
+    with transaction.atomic():
+        rows = list(queryset.values_list("station_sensor_link_id", "read_time", "station_id"))
+        keys = [row[:2] for row in rows]
+        queryset.update(updated=timezone.now(), **values)
+        update_rollups(keys)
+        refresh_latest_readings(keys)
+        mark_readings_written(row[2] for row in rows)
+
+
+def rebuild_rollups(start, end, link_ids=None, chunk=datetime.timedelta(days=7)):
+    """
+    Recomputes all rollups between two times (extended outwards to whole days) from the stored readings, one chunk of
+    time per transaction. Used to backfill rollups for existing data. Returns the number of rollup rows written.
+    """
+
+    day = RESOLUTION_INTERVALS[ReadingRollup.DAILY]
+    start = floor_time(start, day)
+    end = floor_time(end, day) + (day if floor_time(end, day) != end else datetime.timedelta(0))
+
+    link_filter = ""
+    if link_ids is not None:
+        link_filter = "AND l.id = ANY(%(link_ids)s)"
+        link_ids = list(link_ids)
+
+    written = 0
+
+    while start < end:
+        chunk_end = min(start + chunk, end)
+        params = {"start": start, "end": chunk_end, "link_ids": link_ids}
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            lock_links(cursor, link_ids)
+            cursor.execute(
+                "DELETE FROM climate_data_readingrollup "
+                "WHERE bucket_start >= %(start)s AND bucket_start < %(end)s {}".format(
+                    link_filter.replace("l.id", "station_sensor_link_id")),
+                params
+            )
+
+            for select in (HOURLY_REBUILD_SELECT, DAILY_REBUILD_SELECT):
+                cursor.execute("INSERT INTO climate_data_readingrollup ({}) {}".format(
+                    ROLLUP_COLUMNS, select.format(link_filter=link_filter)), params)
+                written += cursor.rowcount
+
+        start = chunk_end
+
+    return written
@@ -15,10 +15,22 @@
 
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from psycopg2.extras import DateTimeTZRange
 
 from climate_data.models import *
 
 
+class UniqueOnUpdateMixin(object):
+    """
+    Runs the unique together validators of a model serializer (with Meta.validators left empty) only for updates. When
+    creating, duplicates are skipped by the database instead (see climate_data.ingest); an update which would make a
+    stored row clash with another is refused with a validation error rather than failing in the database.
+    """
+
+    def get_validators(self):
+        return self.get_unique_together_validators() if self.instance is not None else []
+
+
 class FloatRangeField(serializers.Field):
     def to_representation(self, instance):
         return {
@@ -32,12 +44,49 @@ class FloatRangeField(serializers.Field):
         return NumericRange(lower=data["lower"], upper=data["upper"], bounds="[)")  # TODO: Proper bounds determination
 
 
+class DateTimeRangeField(serializers.Field):
+    """
+    Represents a range of times as an object with lower and upper times (null where unbounded) and whether each is
+    included. Ranges given without lower_inc or upper_inc include their lower time but not their upper one.
+    """
+
+    default_error_messages = {
+        "invalid": "Expected an object with lower and upper times.",
+        "order": "The lower time must not be after the upper time.",
+    }
+
+    def to_representation(self, instance):
+        times = serializers.DateTimeField()
+
+        return {
+            "lower": times.to_representation(instance.lower) if instance.lower is not None else None,
+            "upper": times.to_representation(instance.upper) if instance.upper is not None else None,
+            "lower_inc": instance.lower_inc,
+            "upper_inc": instance.upper_inc
+        }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, dict):
+            self.fail("invalid")
+
+        times = serializers.DateTimeField()
+        lower, upper = (times.to_internal_value(data[k]) if data.get(k) is not None else None
+                        for k in ("lower", "upper"))
+
+        if lower is not None and upper is not None and lower > upper:
+            self.fail("order")
+
+        bounds = ("[" if data.get("lower_inc", True) else "(") + ("]" if data.get("upper_inc", False) else ")")
+        return DateTimeTZRange(lower=lower, upper=upper, bounds=bounds)
+
+
 class DataTypeSerializer(serializers.ModelSerializer):
     bounds = FloatRangeField()
 
     class Meta:
         model = DataType
-        fields = ("id", "created", "updated", "name", "short_name", "unit", "bounds",)
+        fields = ("id", "created", "updated", "name", "short_name", "unit", "bounds", "spike_threshold",
+                  "rate_of_change_threshold", "flatline_duration", "network_threshold",)
 
 
 class SensorSerializer(serializers.ModelSerializer):
@@ -50,8 +99,8 @@ class StationSerializer(serializers.ModelSerializer):
     sensors = serializers.SerializerMethodField("get_sensor_list", )
 
     def get_sensor_list(self, instance):
-        return StationSensorLink.objects.filter(station=instance.id).order_by("station_order") \
-            .values_list("sensor_id", flat=True)
+        # Links are ordered by station order; views prefetch them so that listing stations takes a single query.
+        return [link.sensor_id for link in instance.stationsensorlink_set.all()]
 
     class Meta:
         model = Station
@@ -74,6 +123,10 @@ class DeepStationSensorLinkSerializer(serializers.ModelSerializer):
 
 
 class CompactReadingSerializer(serializers.ModelSerializer):
+    # Links are named after their station and sensor in browsable API forms, so those are fetched along with them.
+    station_sensor_link = serializers.PrimaryKeyRelatedField(
+        queryset=StationSensorLink.objects.select_related("station", "sensor"), allow_null=True, required=False)
+
     class Meta:
         model = Reading
         fields = ("id", "read_time", "value", "invalid", "sensor", "station", "station_sensor_link")
@@ -85,20 +138,79 @@ class StationCompactReadingSerializer(serializers.ModelSerializer):
         fields = ("id", "read_time", "value", "invalid", "sensor")
 
 
-class ReadingSerializer(serializers.ModelSerializer):
+class ReadingSerializer(UniqueOnUpdateMixin, serializers.ModelSerializer):
+    station_sensor_link = serializers.PrimaryKeyRelatedField(
+        queryset=StationSensorLink.objects.select_related("station", "sensor"), allow_null=True, required=False)
+
     class Meta:
         model = Reading
         fields = ("id", "created", "updated", "read_time", "data_source", "value", "qc_processed", "invalid", "sensor",
                   "station", "message", "station_sensor_link")
+        validators = []  # See UniqueOnUpdateMixin.
+
+
+class ScaledReadingFields(serializers.Serializer):
+    """
+    Fields giving a reading's value scaled by its sensor's number of decimals and the unit of its link's data type,
+    read from annotations computed by the database (see climate_data.views.scale_readings).
+    """
+
+    scaled_value = serializers.FloatField(read_only=True)
+    unit = serializers.CharField(read_only=True)
+
+
+class ScaledCompactReadingSerializer(ScaledReadingFields, CompactReadingSerializer):
+    class Meta(CompactReadingSerializer.Meta):
+        fields = CompactReadingSerializer.Meta.fields + ("scaled_value", "unit")
+
+
+class ScaledStationCompactReadingSerializer(ScaledReadingFields, StationCompactReadingSerializer):
+    class Meta(StationCompactReadingSerializer.Meta):
+        fields = StationCompactReadingSerializer.Meta.fields + ("scaled_value", "unit")
+
+
+class ScaledReadingSerializer(ScaledReadingFields, ReadingSerializer):
+    class Meta(ReadingSerializer.Meta):
+        fields = ReadingSerializer.Meta.fields + ("scaled_value", "unit")
+
+
+class ReadingBucketSerializer(serializers.Serializer):
+    """
+    A summary of the valid readings from a station-sensor link within a fixed-length time bucket.
+    """
+
+    bucket_start = serializers.DateTimeField(source="bucket")
+    sensor = serializers.IntegerField()
+    station = serializers.IntegerField()
+    station_sensor_link = serializers.IntegerField()
+    count = serializers.IntegerField()
+    avg = serializers.FloatField()
+    min = serializers.IntegerField()
+    max = serializers.IntegerField()
+
+
+class ReadingGapSerializer(serializers.ModelSerializer):
+    # Open gaps, up to the present or the end of a requested range, are worked out for each request and never stored.
+    open = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReadingGap
+        fields = ("id", "updated", "gap_start", "gap_end", "missing_count", "open", "station_sensor_link", "sensor",
+                  "station",)
+
+    def get_open(self, gap):
+        return gap.pk is None
 
 
 class AnnotationSerializer(serializers.ModelSerializer):
+    time_range = DateTimeRangeField()
+
     class Meta:
         model = Annotation
         fields = ("id", "created", "updated", "time_range", "comment", "sensor", "station",)
 
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(UniqueOnUpdateMixin, serializers.ModelSerializer):
     values = serializers.ListField(child=serializers.IntegerField(allow_null=True))
 
     class Meta:
@@ -106,6 +218,7 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = ("id", "created", "updated", "goes_id", "goes_channel", "goes_spacecraft",
                   "arrival_time", "failure_code", "signal_strength", "frequency_offset", "modulation_index",
                   "data_quality", "data_source", "recorded_message_length", "values", "message_text", "station",)
+        validators = []  # See UniqueOnUpdateMixin.
 
 
 class SettingSerializer(serializers.ModelSerializer):
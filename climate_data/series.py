@@ -0,0 +1,125 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from collections import OrderedDict
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import connection
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+SERIES_LAYOUT = "series"
+
+# Finds the annotations on the station and sensor of each series (or on the whole station, with no sensor) which
+# overlap the series' read times, for every series at once. Series are numbered by their position in the arrays.
+SERIES_ANNOTATIONS_SQL = """
+    SELECT s.n, array_agg(a.id ORDER BY lower(a.time_range), a.id)
+    FROM unnest(%s::integer[], %s::integer[], %s::timestamptz[], %s::timestamptz[])
+         WITH ORDINALITY AS s (station_id, sensor_id, first_read_time, last_read_time, n)
+    JOIN climate_data_annotation a ON a.station_id = s.station_id AND (a.sensor_id = s.sensor_id OR a.sensor_id IS NULL)
+                                  AND a.time_range && tstzrange(s.first_read_time, s.last_read_time, '[]')
+    GROUP BY s.n
+"""
+
+
+def reading_series(queryset):
+    """
+    Groups readings into one series per station-sensor link, each holding parallel lists of read times, values and
+    invalid flags in time order. Built directly from rows of values, without creating model instances. If the readings
+    were annotated with scaled values and units, each series also has its unit and a parallel list of scaled values.
+    """
+
+    scaled = "scaled_value" in queryset.query.annotations
+
+    columns = ("station_sensor_link", "station", "sensor", "read_time", "value", "invalid")
+    if scaled:
+        columns += ("unit", "scaled_value")
+
+    rows = queryset.order_by("station_sensor_link", "read_time").values_list(*columns)
+
+    series = []
+
+    for (link, station, sensor), link_rows in groupby(rows, key=itemgetter(0, 1, 2)):
+        link_columns = list(zip(*link_rows))
+
+        link_series = OrderedDict([
+            ("station_sensor_link", link),
+            ("station", station),
+            ("sensor", sensor),
+            ("read_times", link_columns[3]),
+            ("values", link_columns[4]),
+            ("invalid", link_columns[5]),
+        ])
+
+        if scaled:
+            link_series["unit"] = link_columns[6][0]
+            link_series["scaled_values"] = link_columns[7]
+
+        series.append(link_series)
+
+    return series
+
+
+def annotate_series(series):
+    """
+    Adds to each series (see reading_series) the IDs of the annotations on its station and sensor which overlap the
+    time span of its readings, looked up for all of the series in one query.
+    """
+
+    if not series:
+        return series
+
+    for link_series in series:
+        link_series["annotations"] = []
+
+    columns = ([s["station"] for s in series], [s["sensor"] for s in series], [s["read_times"][0] for s in series],
+               [s["read_times"][-1] for s in series])
+
+    with connection.cursor() as cursor:
+        cursor.execute(SERIES_ANNOTATIONS_SQL, columns)
+
+        for n, annotation_ids in cursor.fetchall():
+            series[n - 1]["annotations"] = annotation_ids
+
+    return series
+
+
+def annotations_requested(request):
+    return str(request.query_params.get("annotations", "false")).lower() == "true"
+
+
+class ReadingSeriesMixin(object):
+    """
+    Lets a reading list view return its readings as series (see reading_series) when the layout=series query parameter
+    is given. Charting clients can use the series as they are, and the keys of each reading are not repeated. With
+    annotations=true as well, each series also lists the annotations overlapping it (see annotate_series).
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("layout", None) == SERIES_LAYOUT:
+            queryset = self.filter_queryset(self.get_queryset())
+
+            # Bucketed summaries are already compact, so they are left as they are.
+            if issubclass(self.get_serializer_class(), serializers.ModelSerializer):
+                series = reading_series(queryset)
+                if annotations_requested(request):
+                    annotate_series(series)
+
+                return Response(series)
+
+        return super().list(request, *args, **kwargs)
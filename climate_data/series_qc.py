@@ -0,0 +1,327 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import multiprocessing
+import numpy as np
+import pytz
+
+from django.db import connection, connections, transaction
+
+from climate_data.functions import floor_time
+from climate_data.latest import refresh_latest_readings
+from climate_data.models import *
+from climate_data.rollups import update_rollups
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
+MICROSECONDS_PER_HOUR = 3600 * 10 ** 6
+
+# Scales a median absolute deviation to the standard deviation of normally distributed values.
+MAD_SCALE = 1.4826
+
+# Fewest stations which must have a reading at a time for it to be compared across the network.
+MIN_NETWORK_SIZE = 3
+
+# Only readings which have passed the bounds check (see climate_data.qc) make up the series, so values which are
+# already known to be bad do not show up as spikes or steps in their neighbours. Readings these checks flagged
+# themselves are kept, so that a rerun sees the same series as the first run did and flags the same readings.
+SERIES_SQL = """
+    SELECT station_sensor_link_id, id, (extract(epoch FROM read_time) * 1000000)::bigint, value
+    FROM climate_data_reading
+    WHERE station_sensor_link_id = ANY(%(link_ids)s) AND read_time >= %(start)s AND read_time < %(end)s
+      AND qc_processed AND (NOT invalid OR series_flagged) AND value IS NOT NULL
+    ORDER BY station_sensor_link_id, read_time, id
+"""
+
+# The read time range is given as well as the IDs so that only the partitions covering it are searched.
+FLAG_SQL = """
+    UPDATE climate_data_reading SET invalid = true, series_flagged = true, updated = now()
+    WHERE id = ANY(%(ids)s) AND read_time >= %(start)s AND read_time < %(end)s AND NOT invalid
+    RETURNING station_sensor_link_id, read_time
+"""
+
+
+def to_microseconds(time):
+    return (time - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def find_spikes(values, threshold):
+    """
+    Flags values which jump away from both of their neighbours by more than the threshold, i.e. which differ from the
+    mean of their neighbours by more than the threshold plus half the difference between the neighbours. The first
+    and last values have only one neighbour and are never flagged.
+    """
+
+    flags = np.zeros(len(values), dtype=bool)
+    if len(values) < 3:
+        return flags
+
+    before, value, after = values[:-2], values[1:-1], values[2:]
+    flags[1:-1] = np.abs(value - (before + after) / 2) - np.abs(after - before) / 2 > threshold
+
+    return flags
+
+
+def find_steps(values, hours, threshold):
+    """
+    Flags values which changed from the previous value faster than the threshold (per hour). Values read at the same
+    time as the previous one (from another data source) are compared with nothing.
+    """
+
+    flags = np.zeros(len(values), dtype=bool)
+    if len(values) < 2:
+        return flags
+
+    elapsed = np.diff(hours)
+    change = np.abs(np.diff(values))
+
+    flags[1:] = (elapsed > 0) & (change > threshold * elapsed)
+
+    return flags
+
+
+def find_flatlines(values, hours, duration):
+    """
+    Flags runs of identical consecutive values spanning at least the given number of hours.
+    """
+
+    if len(values) == 0:
+        return np.zeros(0, dtype=bool)
+
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    ends = np.concatenate((starts[1:], [len(values)])) - 1
+
+    return np.repeat(hours[ends] - hours[starts] >= duration, ends - starts + 1)
+
+
+def check_series(values, hours, data_type):
+    """
+    Runs the time series checks configured for a data type over one link's series of decimal values, read at the
+    given times (in hours, in order), and returns which values are flagged. Steps are looked for once spikes are taken
+    out, so the return from a spike is not flagged as well.
+    """
+
+    flags = np.zeros(len(values), dtype=bool)
+
+    if data_type.spike_threshold is not None:
+        flags |= find_spikes(values, data_type.spike_threshold)
+
+    if data_type.rate_of_change_threshold is not None:
+        kept = np.flatnonzero(~flags)
+        flags[kept[find_steps(values[kept], hours[kept], data_type.rate_of_change_threshold)]] = True
+
+    if data_type.flatline_duration is not None:
+        flags |= find_flatlines(values, hours, data_type.flatline_duration / datetime.timedelta(hours=1))
+
+    return flags
+
+
+def flag_readings(ids, start, end):
+    """
+    Marks the readings with the given IDs (read between two times) as invalid in one statement, then recomputes the
+    rollups and latest readings covering them. Returns the number of readings newly marked invalid.
+    """
+
+    if not ids:
+        return 0
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(FLAG_SQL, {"ids": ids, "start": start, "end": end})
+        keys = cursor.fetchall()
+
+        update_rollups(keys)
+        refresh_latest_readings(keys)
+
+    return len(keys)
+
+
+def check_chunk(links, start, end, margin):
+    """
+    Loads the series of the given links between two times (plus a margin on either side, so that checks near the
+    edges see the same neighbours and runs as they would in one pass) as arrays, checks them and flags the readings
+    which failed. Returns the number of readings checked and the number flagged.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(SERIES_SQL, {"link_ids": sorted(links), "start": start - margin, "end": end + margin})
+        rows = cursor.fetchall()
+
+    if not rows:
+        return 0, 0
+
+    link_ids, ids, times, values = (np.array(column) for column in zip(*rows))
+    inside = (times >= to_microseconds(start)) & (times < to_microseconds(end))
+
+    flagged = []
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(link_ids)) + 1, [len(rows)]))
+
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        link = links[link_ids[first]]
+
+        flags = check_series(values[first:last] / 10 ** link.sensor.decimals,
+                             times[first:last] / MICROSECONDS_PER_HOUR, link.data_type)
+        flagged.append(ids[first:last][flags & inside[first:last]])
+
+    return int(inside.sum()), flag_readings(np.concatenate(flagged).tolist(), start, end)
+
+
+def check_station(station_id, start, end, chunk=datetime.timedelta(days=30)):
+    """
+    Runs the time series checks over the readings of a station's links between two times, one chunk of time at a
+    time. Returns the number of readings checked and the number newly marked invalid.
+    """
+
+    links = {
+        link.id: link for link in StationSensorLink.objects.filter(station=station_id).select_related("sensor",
+                                                                                                      "data_type")
+        if link.data_type is not None and (link.data_type.spike_threshold is not None or
+                                           link.data_type.rate_of_change_threshold is not None or
+                                           link.data_type.flatline_duration is not None)
+    }
+
+    if not links:
+        return 0, 0
+
+    # Neighbouring readings are assumed to be less than a day apart.
+    margin = max([link.data_type.flatline_duration or datetime.timedelta(0) for link in links.values()] +
+                 [datetime.timedelta(days=1)])
+
+    checked = flagged = 0
+
+    while start < end:
+        chunk_end = min(start + chunk, end)
+
+        chunk_checked, chunk_flagged = check_chunk(links, start, chunk_end, margin)
+        checked += chunk_checked
+        flagged += chunk_flagged
+
+        start = chunk_end
+
+    return checked, flagged
+
+
+def check_stations(start, end, station_ids=None, processes=None):
+    """
+    Runs the time series checks over the readings of the given stations (or of every station) between two times,
+    spread over a pool of processes (as many as there are CPUs by default) one station at a time. Returns the number
+    of readings checked and the number newly marked invalid.
+    """
+
+    if station_ids is None:
+        station_ids = Station.objects.values_list("id", flat=True)
+
+    tasks = [(station_id, start, end) for station_id in sorted(station_ids)]
+
+    if processes == 1:
+        results = [check_station(*task) for task in tasks]
+    else:
+        # Worker processes are forked, and must each open their own database connection.
+        connections.close_all()
+
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(check_station, tasks)
+
+    return sum(checked for checked, _ in results), sum(flagged for _, flagged in results)
+
+
+def find_network_outliers(matrix, threshold, min_deviation=0):
+    """
+    Given a matrix of values with a row per link and a column per time (NaN where a link has no value), flags values
+    further from their column's median than the threshold times the column's scaled median absolute deviation (which
+    is taken to be at least min_deviation). Columns with values from fewer than MIN_NETWORK_SIZE links are skipped.
+    """
+
+    flags = np.zeros(matrix.shape, dtype=bool)
+
+    columns = np.flatnonzero(np.count_nonzero(~np.isnan(matrix), axis=0) >= MIN_NETWORK_SIZE)
+    if len(columns) == 0:
+        return flags
+
+    values = matrix[:, columns]
+    deviations = np.abs(values - np.nanmedian(values, axis=0))
+    scale = np.maximum(MAD_SCALE * np.nanmedian(deviations, axis=0), min_deviation)
+
+    with np.errstate(invalid="ignore"):  # Missing values are compared as NaN, and never flagged.
+        flags[:, columns] = deviations > threshold * scale
+
+    return flags
+
+
+def check_network_chunk(links, start, end, grid, threshold):
+    """
+    Loads the readings of the given links (which share a data type) between two times onto a grid with a row per link
+    and a column per grid interval, taking the last reading of a link in each interval, and flags readings which are
+    outliers compared with the other links at the same time. Returns the number of readings checked (those placed on
+    the grid; earlier readings of a link in the same interval are not compared) and the number flagged.
+    """
+
+    link_ids = sorted(links)
+
+    with connection.cursor() as cursor:
+        cursor.execute(SERIES_SQL, {"link_ids": link_ids, "start": start, "end": end})
+        rows = cursor.fetchall()
+
+    if not rows:
+        return 0, 0
+
+    row_links, ids, times, values = (np.array(column) for column in zip(*rows))
+
+    link_rows = np.searchsorted(link_ids, row_links)
+    columns = (times - to_microseconds(start)) // (grid // datetime.timedelta(microseconds=1))
+    decimals = np.array([links[link_id].sensor.decimals for link_id in link_ids])
+
+    # Rows are in link and read time order, so the last reading of a link in a grid interval is the last row of its
+    # run of rows in that cell. Repeated cells are dropped before filling the grid, since which of several values
+    # assigned to the same cell is kept is not defined.
+    last = np.flatnonzero(np.concatenate(((link_rows[1:] != link_rows[:-1]) | (columns[1:] != columns[:-1]), [True])))
+    link_rows, columns, ids, values = link_rows[last], columns[last], ids[last], values[last]
+
+    shape = (len(link_ids), int(columns.max()) + 1)
+    matrix = np.full(shape, np.nan)
+    matrix[link_rows, columns] = values / 10.0 ** decimals[link_rows]
+    reading_ids = np.zeros(shape, dtype=ids.dtype)
+    reading_ids[link_rows, columns] = ids
+
+    # Differences smaller than the finest sensor's precision are never outliers.
+    flags = find_network_outliers(matrix, threshold, min_deviation=10.0 ** -decimals.max())
+
+    return len(ids), flag_readings(reading_ids[flags].tolist(), start, end)
+
+
+def check_network(data_type, start, end, grid=datetime.timedelta(minutes=15), chunk=datetime.timedelta(days=30)):
+    """
+    Compares the readings of every link with a data type between two times against each other, one chunk of time at a
+    time, flagging readings which disagree sharply with the other stations at the same time (to the nearest grid
+    interval). Returns the number of readings checked and the number newly marked invalid.
+    """
+
+    links = {link.id: link for link in StationSensorLink.objects.filter(data_type=data_type).select_related("sensor")}
+    if data_type.network_threshold is None or len(links) < MIN_NETWORK_SIZE:
+        return 0, 0
+
+    start = floor_time(start, grid)
+    checked = flagged = 0
+
+    while start < end:
+        chunk_end = min(start + chunk, end)
+
+        chunk_checked, chunk_flagged = check_network_chunk(links, start, chunk_end, grid, data_type.network_threshold)
+        checked += chunk_checked
+        flagged += chunk_flagged
+
+        start = chunk_end
+
+    return checked, flagged
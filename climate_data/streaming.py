@@ -0,0 +1,138 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+
+from rest_framework import renderers
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+
+from climate_data.encoders import RowEncoder, resolve_fields
+from climate_data.renderers import TABULAR_RENDERERS, TabularRenderer
+
+
+STREAM_CHUNK_SIZE = 1000  # Rows encoded per chunk sent to the client.
+
+
+def iterate_rows(queryset):
+    """
+    Iterates over a queryset through a server-side cursor inside a transaction. Outside of a transaction, Django holds
+    the cursor open past the end of its implicit transaction, which makes PostgreSQL compute the whole result before
+    returning the first row.
+    """
+
+    with transaction.atomic():
+        yield from queryset.iterator()
+
+
+def stream_json_rows(rows, encoder):
+    """
+    Encodes rows of values as a JSON list with a row encoder, yielding one chunk of text at a time.
+    """
+
+    separator = ""
+    chunk = []
+
+    yield "["
+
+    for row in rows:
+        chunk.append(encoder.encode(row))
+
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield separator + ",".join(chunk)
+            separator = ","
+            chunk = []
+
+    if chunk:
+        yield separator + ",".join(chunk)
+
+    yield "]"
+
+
+def stream_queryset(queryset, fields):
+    """
+    Returns a response streaming the given fields of every object in a queryset as JSON. Rows are fetched from the
+    database through a server-side cursor as they are sent, so memory use does not grow with the size of the queryset.
+    """
+
+    encoder = RowEncoder(queryset.model, fields, queryset.query.annotations)
+    rows = iterate_rows(queryset.values_list(*encoder.columns))
+
+    return StreamingHttpResponse(stream_json_rows(rows, encoder), content_type="application/json")
+
+
+def render_queryset(queryset, fields):
+    """
+    Returns a response holding the given fields of every object in a queryset as JSON, encoded directly from rows of
+    values. The content is the same as that of a model serializer with these fields rendered as compact JSON.
+    """
+
+    encoder = RowEncoder(queryset.model, fields, queryset.query.annotations)
+    return HttpResponse(encoder.encode_list(queryset.values_list(*encoder.columns)), content_type="application/json")
+
+
+def stream_tabular_queryset(queryset, fields, renderer, filename):
+    """
+    Returns a response streaming the given fields of every object in a queryset in a tabular format, written in record
+    batches straight from a server-side cursor.
+    """
+
+    model_fields = resolve_fields(queryset.model, fields, queryset.query.annotations)
+    rows = iterate_rows(queryset.values_list(*(f.attname for f in model_fields)))
+
+    response = StreamingHttpResponse(renderer.stream(rows, model_fields), content_type=renderer.media_type)
+    response["Content-Disposition"] = 'attachment; filename="{}.{}"'.format(filename, renderer.format)
+
+    return response
+
+
+class StreamingListMixin(object):
+    """
+    Lets a list view skip its serializer when listing plain model fields, encoding rows of values directly instead.
+    Results are streamed when the stream=true query parameter is given or when a tabular format (Arrow or Parquet) is
+    requested, so that the whole list is never held in memory; compact JSON lists are encoded in one go, and anything
+    else (such as paginated, indented or XML output) is listed as usual. Streamed lists cannot be paginated, so asking
+    for both is an error rather than silently returning the whole list.
+    """
+
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + TABULAR_RENDERERS
+
+    unpaginated_message = "Streamed, Arrow and Parquet lists cannot be paginated; leave out page_size and cursor."
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer_class = self.get_serializer_class()
+
+        if issubclass(serializer_class, serializers.ModelSerializer):
+            renderer = request.accepted_renderer
+            stream = str(request.query_params.get("stream", "false")).lower()
+            paginated = self.paginator is not None and self.paginator.is_requested(request)
+
+            if isinstance(renderer, TabularRenderer) or stream == "true" or stream == "1":
+                if paginated:
+                    raise ParseError(self.unpaginated_message)
+
+                if isinstance(renderer, TabularRenderer):
+                    return stream_tabular_queryset(queryset, serializer_class.Meta.fields, renderer, "readings")
+
+                return stream_queryset(queryset, serializer_class.Meta.fields)
+
+            if isinstance(renderer, renderers.JSONRenderer) and renderer.compact and not renderer.ensure_ascii \
+                    and renderer.get_indent(request.accepted_media_type, {}) is None and not paginated:
+                return render_queryset(queryset, serializer_class.Meta.fields)
+
+        return super().list(request, *args, **kwargs)
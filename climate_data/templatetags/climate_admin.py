@@ -0,0 +1,114 @@
+# Copyright 2016 the Queen's University Biological Station
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+
+from django import template
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import ugettext as _
+
+from climate_data.changelists import days_with_rows, months_with_rows, years_with_rows
+
+
+register = template.Library()
+
+
+@register.inclusion_tag("admin/date_hierarchy.html")
+def probed_date_hierarchy(cl):
+    """
+    Displays the same date drill-down as the admin's date_hierarchy tag, but finds the years, months and days which
+    have rows by checking each one with a range query, rather than truncating the time of every row in the list.
+    """
+
+    if not cl.date_hierarchy:
+        return None
+
+    field_name = cl.date_hierarchy
+    year_field = "{}__year".format(field_name)
+    month_field = "{}__month".format(field_name)
+    day_field = "{}__day".format(field_name)
+
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+
+    def link(filters):
+        return cl.get_query_string(filters, [field_name + "__"])
+
+    years = None
+    months = None
+
+    if not (year_lookup or month_lookup or day_lookup):
+        # As in the admin, start further down if everything is from a single year or month.
+        years = years_with_rows(cl.queryset, field_name)
+        if len(years) == 1:
+            year_lookup = years[0]
+            months = months_with_rows(cl.queryset, field_name, year_lookup)
+            if len(months) == 1:
+                month_lookup = months[0]
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+        return {
+            "show": True,
+            "back": {
+                "link": link({year_field: year_lookup, month_field: month_lookup}),
+                "title": capfirst(formats.date_format(day, "YEAR_MONTH_FORMAT"))
+            },
+            "choices": [{"title": capfirst(formats.date_format(day, "MONTH_DAY_FORMAT"))}]
+        }
+
+    if year_lookup and month_lookup:
+        year, month = int(year_lookup), int(month_lookup)
+        return {
+            "show": True,
+            "back": {
+                "link": link({year_field: year_lookup}),
+                "title": str(year_lookup)
+            },
+            "choices": [{
+                "link": link({year_field: year_lookup, month_field: month_lookup, day_field: day}),
+                "title": capfirst(formats.date_format(datetime.date(year, month, day), "MONTH_DAY_FORMAT"))
+            } for day in days_with_rows(cl.queryset, field_name, year, month)]
+        }
+
+    if year_lookup:
+        year = int(year_lookup)
+        if months is None:
+            months = months_with_rows(cl.queryset, field_name, year)
+
+        return {
+            "show": True,
+            "back": {
+                "link": link({}),
+                "title": _("All dates")
+            },
+            "choices": [{
+                "link": link({year_field: year_lookup, month_field: month}),
+                "title": capfirst(formats.date_format(datetime.date(year, month, 1), "YEAR_MONTH_FORMAT"))
+            } for month in months]
+        }
+
+    if years is None:
+        years = years_with_rows(cl.queryset, field_name)
+
+    return {
+        "show": True,
+        "choices": [{
+            "link": link({year_field: str(year)}),
+            "title": str(year),
+        } for year in years]
+    }
@@ -13,6 +13,1201 @@
 # limitations under the License.
 
 
+import datetime
+import dateutil.parser
+import io
+import json
+import numpy as np
+import pytz
+
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.renderers import JSONRenderer
+
+from climate_data.dcp import DCPFormatError, import_messages, iter_messages, parse_header
+from climate_data.encoders import RowEncoder
+from climate_data.gaps import rebuild_gaps
+from climate_data.ingest import build_readings
+from climate_data.latest import rebuild_latest_readings
+from climate_data.models import *
+from climate_data.partitions import DEFAULT_PARTITION, create_partitions
+from climate_data.qc import check_bounds
+from climate_data.renderers import TABULAR_RENDERERS, pyarrow
+from climate_data.rollups import rebuild_rollups
+from climate_data.series_qc import (check_network, check_stations, find_flatlines, find_network_outliers, find_spikes,
+                                    find_steps)
+from climate_data.serializers import *
+from climate_data.views import bucket_range, bucket_readings, scale_readings
+
+
+class ReadingTestCase(TestCase):
+    """
+    Sets up two stations with a sensor each and a few readings, including ones with missing values and links.
+    """
+
+    start = datetime.datetime(2017, 2, 26, 21, 30, tzinfo=pytz.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        data_type = DataType.objects.create(name="Air Temperature", short_name="air_temp", unit="C")
+        sensor = Sensor.objects.create(name="Temperature", data_id="temp", decimals=2)
+
+        cls.stations = []
+        for offset, (name, goes_id) in enumerate((("Elbow Lake", "C7A0337E"), ("Hill Island", "C7A02008"))):
+            station = Station.objects.create(name=name, goes_id=goes_id)
+            link = StationSensorLink.objects.create(station=station, sensor=sensor, data_type=data_type,
+                                                    station_order=1)
+
+            for i, value in enumerate((2861, -40, None, 2884)):
+                Reading.objects.create(read_time=cls.start + datetime.timedelta(hours=offset, minutes=15 * i),
+                                       value=value, invalid=(i == 1), sensor=sensor, station=station,
+                                       station_sensor_link=link)
+
+            cls.stations.append(station)
+
+        # A reading from before station-sensor links existed.
+        Reading.objects.create(read_time=cls.start - datetime.timedelta(minutes=15), value=1,
+                               data_source=Reading.FROM_DEVICE_LOG, sensor=sensor, station=cls.stations[0])
+
+    def readings_url(self, *params):
+        return "/api/climate/readings/?" + "&".join(("start=2017-02-26T00:00Z", "end=2017-02-27T00:00Z") + params)
+
+
+class RowEncoderTestCase(ReadingTestCase):
+    def assertEncodesLikeSerializer(self, serializer_class, queryset):
+        encoder = RowEncoder(Reading, serializer_class.Meta.fields)
+
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        actual = encoder.encode_list(queryset.values_list(*encoder.columns)).encode("utf-8")
+
+        self.assertEqual(actual, expected)
+
+    def test_matches_reading_serializers(self):
+        for serializer_class in (ReadingSerializer, CompactReadingSerializer, StationCompactReadingSerializer):
+            with self.subTest(serializer=serializer_class.__name__):
+                self.assertEncodesLikeSerializer(serializer_class, Reading.objects.order_by("id"))
+
+    def test_matches_microsecond_times(self):
+        Reading.objects.filter(value=2861).update(updated=datetime.datetime(2017, 3, 1, 12, 0, 0, 123456, pytz.utc))
+        self.assertEncodesLikeSerializer(ReadingSerializer, Reading.objects.order_by("id"))
+
+    def test_empty(self):
+        self.assertEncodesLikeSerializer(ReadingSerializer, Reading.objects.none())
+
+
+class ReadingListEncodingTestCase(ReadingTestCase):
+    def assertRendersLikeSerializer(self, url, serializer_class, queryset):
+        response = self.client.get(url, HTTP_ACCEPT="application/json")
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, JSONRenderer().render(serializer_class(queryset, many=True).data))
+
+    def test_reading_list(self):
+        self.assertRendersLikeSerializer(self.readings_url(), ReadingSerializer, Reading.objects.order_by("read_time"))
+
+    def test_compact_reading_list(self):
+        self.assertRendersLikeSerializer(self.readings_url("compact=true"), CompactReadingSerializer,
+                                         Reading.objects.order_by("read_time"))
+
+    def test_streamed_reading_list(self):
+        self.assertRendersLikeSerializer(self.readings_url("stream=true"), ReadingSerializer,
+                                         Reading.objects.order_by("read_time"))
+
+    def test_station_data(self):
+        station = self.stations[0]
+        self.assertRendersLikeSerializer(
+            "/api/climate/stations/{}/data/?start=2017-02-26T00:00Z&end=2017-02-27T00:00Z&compact=true".format(
+                station.id),
+            StationCompactReadingSerializer,
+            Reading.objects.filter(station=station).order_by("read_time")
+        )
+
+    def test_scaled_reading_list(self):
+        queryset = scale_readings(Reading.objects.order_by("read_time"))
+
+        for params in (("compact=true", "scaled=true"), ("compact=true", "scaled=true", "stream=true")):
+            with self.subTest(params=params):
+                self.assertRendersLikeSerializer(self.readings_url(*params), ScaledCompactReadingSerializer, queryset)
+
+    def test_unpaginated_streams(self):
+        # Streamed lists are never paginated, so asking for a page of one is an error rather than ignored.
+        params = [("stream=true", "page_size=2"), ("stream=true", "cursor=x")]
+        if TABULAR_RENDERERS:
+            params += [("format=arrow", "page_size=2"), ("format=parquet", "page_size=2")]
+
+        for p in params:
+            with self.subTest(params=p):
+                self.assertEqual(self.client.get(self.readings_url(*p)).status_code, 400)
+
+    def test_scaled_values(self):
+        response = self.client.get(self.readings_url("scaled=true"), HTTP_ACCEPT="application/json")
+
+        for data in json.loads(response.content.decode("utf-8")):
+            reading = Reading.objects.get(pk=data["id"])
+            self.assertEqual(data["scaled_value"], reading.decimal_value())
+            self.assertEqual(data["unit"], "C" if reading.station_sensor_link_id is not None else None)
+
+
+class PaginationTestCase(TestCase):
+    """
+    Sets up readings and messages from several stations, many of them sharing the same time and inserted newest first.
+    """
+
+    start = datetime.datetime(2017, 2, 26, 21, 0, tzinfo=pytz.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        sensors = [Sensor.objects.create(name="Sensor {}".format(i), data_id="s{}".format(i), decimals=0)
+                   for i in range(2)]
+        cls.stations = [Station.objects.create(name="Station {}".format(i), goes_id="C7A0000{}".format(i))
+                        for i in range(3)]
+
+        links = [StationSensorLink.objects.create(station=station, sensor=sensor, station_order=order)
+                 for station in cls.stations for order, sensor in enumerate(sensors, start=1)]
+
+        for minutes in (30, 15, 0):
+            for link in links:
+                Reading.objects.create(read_time=cls.start + datetime.timedelta(minutes=minutes), value=minutes,
+                                       sensor=link.sensor, station=link.station, station_sensor_link=link)
+
+            for i, station in enumerate(cls.stations * 2):
+                Message.objects.create(goes_id="C7A0000{}".format(i), goes_channel=82, failure_code="G",
+                                       arrival_time=cls.start + datetime.timedelta(minutes=minutes), station=station,
+                                       signal_strength=44, frequency_offset="+0", data_source="UP",
+                                       recorded_message_length=8, values=[], message_text="C7A0000{}".format(i))
+
+    def walk(self, url, page_size):
+        ids = []
+        url = "{}&page_size={}".format(url, page_size)
+
+        while url is not None:
+            data = json.loads(self.client.get(url, HTTP_ACCEPT="application/json").content.decode("utf-8"))
+            self.assertLessEqual(len(data["results"]), page_size)
+
+            ids.extend(item["id"] for item in data["results"])
+            url = data["next"]
+
+        return ids
+
+    def test_walks_identical_times(self):
+        station = self.stations[1]
+        window = "start=2017-02-26T00:00Z&end=2017-02-27T00:00Z"
+
+        lists = (
+            ("/api/climate/readings/?" + window, Reading.objects.order_by("read_time", "id")),
+            ("/api/climate/readings/?compact=true&" + window, Reading.objects.order_by("read_time", "id")),
+            ("/api/climate/stations/{}/data/?{}".format(station.id, window),
+             Reading.objects.filter(station=station).order_by("read_time", "id")),
+            ("/api/climate/messages/?" + window, Message.objects.order_by("arrival_time", "id")),
+            ("/api/climate/stations/{}/messages/?{}".format(station.id, window),
+             Message.objects.filter(station=station).order_by("arrival_time", "id")),
+        )
+
+        # Every item is listed once, in order, whether pages end within a run of identical times or between them.
+        for url, queryset in lists:
+            expected = list(queryset.values_list("id", flat=True))
+
+            for page_size in (1, 4, 6, 7, 100):
+                with self.subTest(url=url, page_size=page_size):
+                    self.assertEqual(self.walk(url, page_size), expected)
+
+
+@skipUnless(TABULAR_RENDERERS, "pyarrow is not installed")
+class TabularRendererTestCase(ReadingTestCase):
+    def read_table(self, url, format):
+        response = self.client.get("{}&format={}".format(url, format))
+        self.assertEqual(response.status_code, 200)
+
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        if format == "arrow":
+            return pyarrow.ipc.open_stream(content).read_all()
+
+        return pyarrow.parquet.read_table(pyarrow.BufferReader(content))
+
+    def test_reading_list(self):
+        for params, serializer_class in (((), ReadingSerializer), (("compact=true",), CompactReadingSerializer)):
+            expected = json.loads(self.client.get(self.readings_url(*params), HTTP_ACCEPT="application/json")
+                                  .content.decode("utf-8"))
+            for row in expected:
+                row.update({f: dateutil.parser.parse(row[f]) for f in ("read_time", "created", "updated") if f in row})
+
+            for format in ("arrow", "parquet"):
+                with self.subTest(params=params, format=format):
+                    table = self.read_table(self.readings_url(*params), format)
+
+                    # The same rows as the JSON list, with typed columns.
+                    self.assertEqual(table.column_names, list(serializer_class.Meta.fields))
+                    self.assertEqual(table.to_pylist(), expected)
+                    self.assertEqual(table.schema.field("value").type, pyarrow.int32())
+                    self.assertEqual(table.schema.field("station").type, pyarrow.int16())
+
+    def test_buckets(self):
+        # Anything other than a plain list of readings is rendered from the serialized data.
+        expected = json.loads(self.client.get(self.readings_url("bucket=1h"), HTTP_ACCEPT="application/json")
+                              .content.decode("utf-8"))
+
+        for format in ("arrow", "parquet"):
+            with self.subTest(format=format):
+                self.assertEqual(self.read_table(self.readings_url("bucket=1h"), format).to_pylist(), expected)
+
+
+class NaturalKeyTestCase(ReadingTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+
+    def test_update_clashing_reading(self):
+        first, second = Reading.objects.filter(station_sensor_link__station=self.stations[0]).order_by("read_time")[:2]
+        url = "/api/climate/readings/{}/".format(second.id)
+
+        response = self.client.patch(url, json.dumps({"read_time": "2017-02-26T21:30:00Z"}),
+                                     content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+        data = json.loads(self.client.get(url, HTTP_ACCEPT="application/json").content.decode("utf-8"))
+        data["read_time"] = "2017-02-26T21:30:00Z"
+        self.assertEqual(self.client.put(url, json.dumps(data), content_type="application/json").status_code, 400)
+
+        # Updates which keep a reading's own natural key are fine.
+        response = self.client.patch(url, json.dumps({"value": -41}), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Reading.objects.get(pk=second.pk).value, -41)
+
+    def test_update_clashing_message(self):
+        messages = [
+            Message.objects.create(goes_id="C7A0337E", goes_channel=82, arrival_time=arrival_time, failure_code="G",
+                                   signal_strength=44, frequency_offset="+0", data_source="UP",
+                                   recorded_message_length=8, values=[2861], message_text="C7A0337E")
+            for arrival_time in (self.start, self.start + datetime.timedelta(hours=1))
+        ]
+
+        response = self.client.patch("/api/climate/messages/{}/".format(messages[1].id), json.dumps({
+            "arrival_time": "2017-02-26T21:30:00Z"
+        }), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+        # Re-sending a stored message is still answered with the stored copy.
+        data = json.loads(self.client.get("/api/climate/messages/{}/".format(messages[0].id),
+                                          HTTP_ACCEPT="application/json").content.decode("utf-8"))
+        response = self.client.post("/api/climate/messages/", json.dumps(data), content_type="application/json")
+        self.assertEqual((response.status_code, json.loads(response.content.decode("utf-8"))["id"]),
+                         (200, messages[0].id))
+
+
+class ConditionalGetTestCase(ReadingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        cls.messages = [
+            Message.objects.create(goes_id=station.goes_id, goes_channel=82, arrival_time=cls.start, failure_code="G",
+                                   signal_strength=44, frequency_offset="+0", data_source="UP",
+                                   recorded_message_length=8, values=[2861], message_text=station.goes_id,
+                                   station=station)
+            for station in cls.stations
+        ]
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+
+    def assertRevalidates(self, url, status_code, **headers):
+        response = self.client.get(url, HTTP_ACCEPT="application/json", **headers)
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def test_readings(self):
+        response = self.assertRevalidates(self.readings_url(), 200)
+        self.assertIn("public", response["Cache-Control"])  # The window ended in the past.
+
+        self.assertRevalidates(self.readings_url(), 304, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertRevalidates(self.readings_url(), 304, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertRevalidates(self.readings_url("compact=true"), 200, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        reading = Reading.objects.filter(station_sensor_link__isnull=False).first()
+        self.client.patch("/api/climate/readings/{}/".format(reading.id), json.dumps({"value": 1}),
+                          content_type="application/json")
+        self.assertRevalidates(self.readings_url(), 200, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unlinked_readings(self):
+        station = self.stations[0]
+        urls = [self.readings_url(), "/api/climate/stations/{}/data/?start=2017-02-26T00:00Z&end=2017-02-27T00:00Z"
+                .format(station.id)]
+
+        def assertChanged(write):
+            etags = [self.assertRevalidates(url, 200)["ETag"] for url in urls]
+            response = write()
+            self.assertLess(response.status_code, 300)
+
+            for url, etag in zip(urls, etags):
+                self.assertRevalidates(url, 200, HTTP_IF_NONE_MATCH=etag)
+
+            return response
+
+        # Readings with a station but no link, and then with neither (which marks every station), are listed as soon
+        # as they are written.
+        for data in ({"station": station.id}, {}):
+            with self.subTest(data=data):
+                response = assertChanged(lambda: self.client.post("/api/climate/readings/", json.dumps(dict(
+                    data, read_time="2017-02-26T23:50:00Z", value=7, sensor=Sensor.objects.get().id
+                )), content_type="application/json"))
+
+                url = "/api/climate/readings/{}/".format(json.loads(response.content.decode("utf-8"))["id"])
+                assertChanged(lambda: self.client.patch(url, json.dumps({"value": 8}), content_type="application/json"))
+                assertChanged(lambda: self.client.delete(url))
+
+    def test_messages(self):
+        urls = ["/api/climate/messages/?start=2017-02-26T00:00Z&end=2017-02-27T00:00Z",
+                "/api/climate/stations/{}/messages/?start=2017-02-26T00:00Z".format(self.stations[1].id)]
+        etags = [self.assertRevalidates(url, 200)["ETag"] for url in urls]
+
+        for url, etag in zip(urls, etags):
+            self.assertRevalidates(url, 304, HTTP_IF_NONE_MATCH=etag)
+
+        # Deleting a message other than the newest changes neither the newest update time nor the other station's.
+        Message.objects.filter(pk=self.messages[1].pk).update(updated=self.start)
+        etags = [self.assertRevalidates(url, 200)["ETag"] for url in urls]
+
+        response = self.client.delete("/api/climate/messages/{}/".format(self.messages[1].id))
+        self.assertEqual(response.status_code, 204)
+
+        response = self.assertRevalidates(urls[0], 200, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual([m["id"] for m in json.loads(response.content.decode("utf-8"))],
+                         [self.messages[0].id])
+        self.assertRevalidates(urls[1], 200, HTTP_IF_NONE_MATCH=etags[1])
+
+
+class CSVExportTestCase(ReadingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        # A link with no data type, whose column is named after its sensor instead.
+        station = cls.stations[0]
+        sensor = Sensor.objects.create(name="Humidity", data_id="rh", decimals=1)
+        link = StationSensorLink.objects.create(station=station, sensor=sensor, station_order=2)
+        Reading.objects.create(read_time=cls.start, value=555, sensor=sensor, station=station,
+                               station_sensor_link=link)
+
+    def csv_rows(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+        return b"".join(response.streaming_content).decode("utf-8").splitlines()
+
+    def test_long_layout(self):
+        self.assertEqual(self.csv_rows("/api/climate/readings/csv/?start=2017-02-26T21:00Z&end=2017-02-26T22:30Z"), [
+            "read_time,station,data_type,value,invalid",
+            "2017-02-26T21:30:00Z,Elbow Lake,air_temp,28.61,false",
+            "2017-02-26T21:30:00Z,Elbow Lake,rh,55.5,false",
+            "2017-02-26T21:45:00Z,Elbow Lake,air_temp,-0.40,true",
+            "2017-02-26T22:00:00Z,Elbow Lake,air_temp,,false",
+            "2017-02-26T22:15:00Z,Elbow Lake,air_temp,28.84,false",
+            "2017-02-26T22:30:00Z,Hill Island,air_temp,28.61,false",
+        ])
+
+    def test_wide_layout(self):
+        url = "/api/climate/stations/{}/data/csv/?layout=wide&start=2017-02-26T21:00Z&end=2017-02-26T22:30Z"
+        self.assertEqual(self.csv_rows(url.format(self.stations[0].id)), [
+            "read_time,station,air_temp,rh",
+            "2017-02-26T21:30:00Z,Elbow Lake,28.61,55.5",
+            "2017-02-26T21:45:00Z,Elbow Lake,,",
+            "2017-02-26T22:00:00Z,Elbow Lake,,",
+            "2017-02-26T22:15:00Z,Elbow Lake,28.84,",
+        ])
+
+
+class LatestReadingTestCase(ReadingTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        rebuild_rollups(self.start - datetime.timedelta(days=1), self.start + datetime.timedelta(days=1))
+        rebuild_latest_readings()
+        rebuild_gaps()
+
+    def test_reading_without_sensor_or_station(self):
+        link = StationSensorLink.objects.get(station=self.stations[0])
+
+        response = self.client.post("/api/climate/readings/", json.dumps({
+            "read_time": "2017-02-26T22:30:00Z", "value": 2890, "station_sensor_link": link.id
+        }), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+        latest = LatestReading.objects.get(station_sensor_link=link)
+        self.assertEqual((latest.reading_id, latest.sensor_id, latest.station_id),
+                         (json.loads(response.content.decode("utf-8"))["id"], None, None))
+
+        rebuild_latest_readings()
+        self.assertEqual(LatestReading.objects.get(station_sensor_link=link).reading_id, latest.reading_id)
+
+    def test_admin_delete_selected(self):
+        link = StationSensorLink.objects.get(station=self.stations[0])
+        deleted = list(Reading.objects.filter(station_sensor_link=link, read_time__gte=self.start +
+                                              datetime.timedelta(minutes=15)).exclude(value=None))
+        data = {"action": "delete_selected", "_selected_action": [r.id for r in deleted]}
+
+        # Nothing is deleted until the confirmation page is submitted.
+        self.assertEqual(self.client.post("/admin/climate_data/reading/", data).status_code, 200)
+        self.assertEqual(Reading.objects.filter(pk__in=[r.id for r in deleted]).count(), 2)
+
+        self.assertEqual(self.client.post("/admin/climate_data/reading/", dict(data, post="yes")).status_code, 302)
+        self.assertFalse(Reading.objects.filter(pk__in=[r.id for r in deleted]).exists())
+
+        self.assertEqual(LatestReading.objects.get(station_sensor_link=link).read_time,
+                         self.start + datetime.timedelta(minutes=30))
+        self.assertEqual(list(ReadingGap.objects.filter(station_sensor_link=link)
+                              .values_list("gap_start", "gap_end", "missing_count")),
+                         [(self.start, self.start + datetime.timedelta(minutes=30), 1)])
+
+        rollups = ReadingRollup.objects.order_by("station_sensor_link_id", "resolution", "bucket_start")
+        counts = list(rollups.values_list("reading_count", flat=True))
+        rebuild_rollups(self.start - datetime.timedelta(days=1), self.start + datetime.timedelta(days=1))
+        self.assertEqual(list(rollups.values_list("reading_count", flat=True)), counts)
+
+
+class BoundsQualityControlTestCase(ReadingTestCase):
+    def rollups(self):
+        return list(ReadingRollup.objects.order_by("station_sensor_link", "resolution", "bucket_start")
+                    .values_list("station_sensor_link", "resolution", "bucket_start", "reading_count", "value_sum"))
+
+    def test_check_bounds(self):
+        rebuild_rollups(self.start - datetime.timedelta(days=1), self.start + datetime.timedelta(days=1))
+        rebuild_latest_readings()
+        DataType.objects.update(bounds=(0, 28.7))
+
+        self.assertEqual(check_bounds(batch_size=3), (9, 2))
+        self.assertFalse(Reading.objects.filter(qc_processed=False).exists())
+
+        for reading in Reading.objects.select_related("sensor", "station_sensor_link__data_type"):
+            with self.subTest(value=reading.value):
+                # Readings without a link have no bounds; the one marked invalid beforehand stays invalid.
+                expected = reading.value == -40 or (reading.station_sensor_link_id is not None and
+                                                    not reading.in_bounds())
+                self.assertEqual(reading.invalid, expected)
+
+        for latest in LatestReading.objects.all():
+            reading = Reading.objects.get(pk=latest.reading_id)
+            self.assertEqual((latest.qc_processed, latest.invalid), (reading.qc_processed, reading.invalid))
+
+        checked = self.rollups()
+        rebuild_rollups(self.start - datetime.timedelta(days=1), self.start + datetime.timedelta(days=1))
+        self.assertEqual(checked, self.rollups())
+
+        self.assertEqual(check_bounds(), (0, 0))
+
+
+class AnnotationTestCase(ReadingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        station = cls.stations[0]
+        sensor = Sensor.objects.get()
+        cls.annotations = [
+            Annotation.objects.create(station=station, sensor=sensor, comment="Sensor cleaned",
+                                      time_range=(cls.start + datetime.timedelta(minutes=10),
+                                                  cls.start + datetime.timedelta(minutes=20))),
+            Annotation.objects.create(station=station, sensor=sensor, comment="Before the readings",
+                                      time_range=(cls.start - datetime.timedelta(days=2),
+                                                  cls.start - datetime.timedelta(days=1))),
+            Annotation.objects.create(station=cls.stations[1], sensor=sensor, comment="Still open",
+                                      time_range=(cls.start, None)),
+            Annotation.objects.create(station=station, comment="Battery replaced",
+                                      time_range=(cls.start - datetime.timedelta(hours=1),
+                                                  cls.start + datetime.timedelta(minutes=1))),
+        ]
+
+    def annotation_ids(self, url):
+        response = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+
+        return [a["id"] for a in json.loads(response.content.decode("utf-8"))]
+
+    def test_annotation_list(self):
+        first, before, still_open, station_wide = (a.id for a in self.annotations)
+
+        self.assertEqual(self.annotation_ids("/api/climate/annotations/"), [before, station_wide, still_open, first])
+        self.assertEqual(self.annotation_ids("/api/climate/annotations/?start=2017-02-26T21:35Z&end=2017-02-26T22:00Z"),
+                         [still_open, first])
+        self.assertEqual(self.annotation_ids("/api/climate/annotations/?start=2017-02-26T21:55Z"), [still_open])
+        self.assertEqual(self.annotation_ids("/api/climate/annotations/?end=2017-02-25T00:00Z"), [before])
+        self.assertEqual(self.annotation_ids("/api/climate/annotations/?station={}&end=nonsense".format(
+            self.stations[1].id)), [still_open])
+
+    def test_series_annotations(self):
+        response = self.client.get(self.readings_url("layout=series", "annotations=true"),
+                                   HTTP_ACCEPT="application/json")
+        series = {s["station"]: s for s in json.loads(response.content.decode("utf-8")) if s["station_sensor_link"]}
+
+        # Annotations on a whole station (with no sensor) apply to every series from it.
+        self.assertEqual(series[self.stations[0].id]["annotations"], [self.annotations[3].id, self.annotations[0].id])
+        self.assertEqual(series[self.stations[1].id]["annotations"], [self.annotations[2].id])
+
+    def test_create_annotation(self):
+        station = self.stations[0]
+        watermark = Station.objects.get(pk=station.pk).readings_updated
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        response = self.client.post("/api/climate/annotations/", json.dumps({
+            "time_range": {"lower": "2017-02-26T21:00:00Z", "upper": "2017-02-26T22:00:00Z"},
+            "comment": "Battery replaced",
+            "station": station.id,
+            "sensor": None,
+        }), content_type="application/json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content.decode("utf-8"))["time_range"], {
+            "lower": "2017-02-26T21:00:00Z", "upper": "2017-02-26T22:00:00Z", "lower_inc": True, "upper_inc": False
+        })
+        self.assertGreater(Station.objects.get(pk=station.pk).readings_updated, watermark)
+
+
+class BucketTestCase(TestCase):
+    """
+    Sets up two days of readings every 15 minutes from two stations, some invalid or missing, along with hourly readings
+    without a station-sensor link, and builds their rollups.
+    """
+
+    start = datetime.datetime(2017, 2, 25, 0, 0, tzinfo=pytz.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        sensor = Sensor.objects.create(name="Temperature", data_id="temp", decimals=2)
+
+        for s in range(2):
+            station = Station.objects.create(name="Station {}".format(s), goes_id="C7A0000{}".format(s))
+            link = StationSensorLink.objects.create(station=station, sensor=sensor, station_order=1)
+
+            Reading.objects.bulk_create(
+                Reading(read_time=cls.start + datetime.timedelta(minutes=15 * i), value=(None if i % 13 == 0 else
+                                                                                         (i * 7 + s) % 23 - 5),
+                        invalid=(i % 11 == 0), sensor=sensor, station=station, station_sensor_link=link)
+                for i in range(4 * 48)
+            )
+
+        Reading.objects.bulk_create(
+            Reading(read_time=cls.start + datetime.timedelta(hours=h, minutes=5), value=h, sensor=sensor,
+                    station=station, data_source=Reading.FROM_DEVICE_LOG)
+            for h in range(48)
+        )
+
+        rebuild_rollups(cls.start, cls.start + datetime.timedelta(days=2))
+
+    def time(self, day, hour, minute):
+        return datetime.datetime(2017, 2, day, hour, minute, tzinfo=pytz.utc)
+
+    def test_matches_readings(self):
+        ranges = (
+            (self.time(25, 0, 0), self.time(27, 0, 0)),
+            (self.time(25, 3, 40), self.time(26, 22, 5)),
+            (self.time(25, 21, 40), self.time(25, 22, 5)),
+            (self.time(25, 22, 0), self.time(26, 1, 0)),
+            (self.time(24, 23, 59), self.time(26, 0, 0)),
+        )
+
+        for interval in (datetime.timedelta(minutes=30), datetime.timedelta(hours=1), datetime.timedelta(hours=2),
+                         datetime.timedelta(days=1)):
+            for start, end in ranges:
+                for start_exclusive in (False, True):
+                    with self.subTest(interval=interval, start=start, end=end, start_exclusive=start_exclusive):
+                        readings = Reading.objects.filter(read_time__lte=end, **{
+                            "read_time__gt" if start_exclusive else "read_time__gte": start})
+
+                        self.assertEqual(
+                            list(bucket_range(readings, ReadingRollup.objects.all(), interval, start, end,
+                                              start_exclusive)),
+                            list(bucket_readings(readings, interval))
+                        )
+
+    def test_unaligned_range(self):
+        response = self.client.get("/api/climate/readings/?start=2017-02-26T21:40Z&end=2017-02-26T22:05Z&bucket=1h",
+                                   HTTP_ACCEPT="application/json")
+
+        # Only readings from 21:45 to 22:05 are counted, not every reading from the hours which the range touches.
+        links = list(StationSensorLink.objects.order_by("id").values_list("id", flat=True))
+        self.assertEqual(
+            [(b["bucket_start"], b["station_sensor_link"], b["count"]) for b in json.loads(response.content.decode())],
+            [("2017-02-26T21:00:00Z", links[0], 1), ("2017-02-26T21:00:00Z", links[1], 1),
+             ("2017-02-26T22:00:00Z", links[0], 1), ("2017-02-26T22:00:00Z", links[1], 1),
+             ("2017-02-26T22:00:00Z", None, 1)]
+        )
+
+
+class PartitionTestCase(TestCase):
+    def partition_of(self, reading):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM climate_data_reading WHERE id = %s", [reading.id])
+            return cursor.fetchone()[0]
+
+    def test_create_partitions(self):
+        station = Station.objects.create(name="Elbow Lake", goes_id="C7A0337E")
+        read_time = datetime.datetime(2031, 5, 10, 12, 0, tzinfo=pytz.utc)
+
+        # A reading from a month without a partition of its own is kept in the default partition...
+        reading = Reading.objects.create(read_time=read_time, value=1, station=station)
+        self.assertEqual(self.partition_of(reading), DEFAULT_PARTITION)
+
+        # ...until the month's partition is created, which moves it there.
+        self.assertEqual(create_partitions(datetime.datetime(2031, 4, 15, tzinfo=pytz.utc), read_time), [
+            "climate_data_reading_2031_04", "climate_data_reading_2031_05"
+        ])
+        self.assertEqual(self.partition_of(reading), "climate_data_reading_2031_05")
+
+        # Creating partitions for the same range again changes nothing.
+        self.assertEqual(create_partitions(datetime.datetime(2031, 4, 15, tzinfo=pytz.utc), read_time), [])
+        self.assertEqual(list(Reading.objects.values_list("id", "read_time")), [(reading.id, read_time)])
+
+        # Readings are stored in the new partitions from then on.
+        reading = Reading.objects.create(read_time=read_time - datetime.timedelta(days=30), value=2, station=station)
+        self.assertEqual(self.partition_of(reading), "climate_data_reading_2031_04")
+
+    def test_command(self):
+        output = [io.StringIO() for _ in range(2)]
+        for stdout in output:
+            call_command("create_reading_partitions", months=14, stdout=stdout)
+
+        self.assertIn("partitions created.", output[0].getvalue())
+        self.assertEqual(output[1].getvalue(), "0 partitions created.\n")
+
+
+class DCPTestCase(TestCase):
+    header = b"C7A0337E17057221500G44+0NN082EUP00008"
+
+    def test_parse_header(self):
+        self.assertEqual(parse_header(self.header), {
+            "goes_id": "C7A0337E",
+            "arrival_time": datetime.datetime(2017, 2, 26, 22, 15, tzinfo=pytz.utc),
+            "failure_code": "G",
+            "signal_strength": 44,
+            "frequency_offset": "+0",
+            "modulation_index": "N",
+            "data_quality": "N",
+            "goes_channel": 82,
+            "goes_spacecraft": "E",
+            "data_source": "UP",
+            "recorded_message_length": 8,
+        })
+
+    def test_invalid_header(self):
+        # Short, with a non-numeric length or time, and not ASCII.
+        for header in (self.header[:-1], self.header[:-5] + b"000x8",
+                       self.header[:8] + b"1705722MM00" + self.header[19:], b"\xc7" + self.header[1:]):
+            with self.subTest(header=header):
+                self.assertRaises(DCPFormatError, parse_header, header)
+
+    def test_iter_messages(self):
+        second = b"C7A0200817057231500G38-1NN082EUP00004"
+        stream = io.BytesIO(b"\r\n" + self.header + b"@@@@ABCD\n  " + second + b"EFGH\n")
+
+        messages = [(fields["goes_id"], fields["arrival_time"], text) for fields, text in iter_messages(stream)]
+        self.assertEqual(messages, [
+            ("C7A0337E", datetime.datetime(2017, 2, 26, 22, 15, tzinfo=pytz.utc), self.header.decode() + "@@@@ABCD"),
+            ("C7A02008", datetime.datetime(2017, 2, 26, 23, 15, tzinfo=pytz.utc), second.decode() + "EFGH"),
+        ])
+
+        self.assertEqual(list(iter_messages(io.BytesIO(b""))), [])
+        self.assertEqual(list(iter_messages(io.BytesIO(b"\n\n"))), [])
+        self.assertEqual(list(iter_messages(io.BytesIO(b" " * 100))), [])
+
+    def test_long_whitespace(self):
+        # Runs of whitespace longer than a header between messages are skipped like short ones.
+        for whitespace in (b" " * 37, b" " * 40, b"\r\n" * 50):
+            with self.subTest(whitespace=whitespace):
+                stream = io.BytesIO(whitespace + self.header + b"@@@@ABCD" + whitespace + self.header.replace(
+                    b"221500", b"231500") + b"@@@@EFGH" + whitespace)
+                self.assertEqual([text[-4:] for _, text in iter_messages(stream)], ["ABCD", "EFGH"])
+
+    def test_truncated_messages(self):
+        for data in (self.header[:20], self.header[:36], b"\n" + self.header + b"@@@@ABCD\n" + self.header[:20],
+                     self.header + b"@@@@", self.header[:-5] + b"000x8@@@@ABCD"):
+            with self.subTest(data=data):
+                with self.assertRaises(DCPFormatError):
+                    list(iter_messages(io.BytesIO(data)))
+
+    def test_import_messages(self):
+        station = Station.objects.create(name="Elbow Lake", goes_id="C7A0337E")
+        texts = [self.header.decode() + "@@@@ABCD", "C7A0200817057231500G38-1NN082EUP00004EFGH"]
+        data = "\n".join(texts).encode("ascii")
+
+        self.assertEqual(import_messages(io.BytesIO(data)), 2)
+        self.assertEqual(list(Message.objects.order_by("arrival_time").values_list("station", "message_text")),
+                         [(station.id, texts[0]), (None, texts[1])])
+
+        # Importing the same dump again skips every message.
+        self.assertEqual(import_messages(io.BytesIO(data)), 0)
+
+
+class IngestTestCase(TestCase):
+    """
+    Sets up a station with sensors read at different frequencies, including one which is not sent in messages at all.
+    """
+
+    arrival_time = datetime.datetime(2017, 2, 26, 22, 7, 43, tzinfo=pytz.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.station = Station.objects.create(name="Elbow Lake", goes_id="C7A0337E")
+
+        cls.links = [
+            StationSensorLink.objects.create(station=cls.station, station_order=order, read_frequency=read_frequency,
+                                             sensor=Sensor.objects.create(name=name, data_id=name.lower(), decimals=2))
+            for order, (name, read_frequency) in enumerate((("Temperature", 4), ("Humidity", 0), ("Pressure", 1),
+                                                            ("Wind", 2)), start=1)
+        ]
+
+    def message(self, values, arrival_time=None):
+        return Message(goes_id=self.station.goes_id, goes_channel=82, arrival_time=arrival_time or self.arrival_time,
+                       failure_code="G", signal_strength=44, frequency_offset="+0", data_source="UP",
+                       recorded_message_length=8 * len(values), values=values, message_text="C7A0337E",
+                       station=self.station)
+
+    def time(self, hour, minute):
+        return datetime.datetime(2017, 2, 26, hour, minute, tzinfo=pytz.utc)
+
+    def test_build_readings(self):
+        temperature, _, pressure, wind = self.links
+        readings = build_readings(self.message([2861, 2870, None, 2884, 10132, 12, 15]), self.links)
+
+        self.assertEqual([(r.station_sensor_link, r.read_time, r.value) for r in readings], [
+            (temperature, self.time(21, 15), 2861),
+            (temperature, self.time(21, 30), 2870),
+            (temperature, self.time(21, 45), None),
+            (temperature, self.time(22, 0), 2884),
+            (pressure, self.time(22, 0), 10132),
+            (wind, self.time(21, 30), 12),
+            (wind, self.time(22, 0), 15),
+        ])
+
+        for reading in readings:
+            self.assertEqual((reading.data_source, reading.sensor_id, reading.station_id),
+                             (Reading.FROM_GOES, reading.station_sensor_link.sensor_id, self.station.id))
+
+    def test_read_times(self):
+        # The newest value of each link is read at the last multiple of its own read interval before arrival.
+        for (hour, minute, second), expected in (((22, 0, 0), ((22, 0), (22, 0), (22, 0))),
+                                                 ((22, 14, 59), ((22, 0), (22, 0), (22, 0))),
+                                                 ((22, 15, 0), ((22, 15), (22, 0), (22, 0))),
+                                                 ((22, 59, 59), ((22, 45), (22, 0), (22, 30)))):
+            arrival_time = datetime.datetime(2017, 2, 26, hour, minute, second, tzinfo=pytz.utc)
+
+            with self.subTest(arrival_time=arrival_time):
+                readings = build_readings(self.message(list(range(7)), arrival_time), self.links)
+                self.assertEqual([readings[i].read_time for i in (3, 4, 6)], [self.time(*t) for t in expected])
+
+    def test_truncated_message(self):
+        # Values are attributed to every link which was sent in full, and none after the first which was cut short.
+        readings = build_readings(self.message([2861, 2870, 2877, 2884, 10132, 12]), self.links)
+        self.assertEqual([r.value for r in readings], [2861, 2870, 2877, 2884, 10132])
+
+        self.assertEqual(build_readings(self.message([2861, 2870]), self.links), [])
+
+    def test_ingest_message(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+
+        data = {"goes_id": self.station.goes_id, "goes_channel": 82, "goes_spacecraft": "E", "failure_code": "G",
+                "arrival_time": "2017-02-26T22:07:43Z", "signal_strength": 44, "frequency_offset": "+0",
+                "modulation_index": "N", "data_quality": "N", "data_source": "UP", "recorded_message_length": 56,
+                "values": [2861, 2870, None, 2884, 10132, 12, 15], "message_text": "C7A0337E"}
+
+        # Blank values are not missing ones; they are rejected along with the whole message.
+        response = self.client.post("/api/climate/messages/", json.dumps(dict(data, values=[2861, "", 2884])),
+                                    content_type="application/json")
+        self.assertEqual((response.status_code, Message.objects.count(), Reading.objects.count()), (400, 0, 0))
+
+        response = self.client.post("/api/climate/messages/", json.dumps(data), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+        message = Message.objects.get()
+        self.assertEqual(message.station, self.station)
+        self.assertEqual(
+            list(Reading.objects.order_by("station_sensor_link__station_order", "read_time").values_list(
+                "station_sensor_link", "read_time", "value", "message")),
+            [(r.station_sensor_link.id, r.read_time, r.value, message.id)
+             for r in build_readings(self.message(data["values"]), self.links)]
+        )
+
+        # Re-sending the message decodes nothing further.
+        response = self.client.post("/api/climate/messages/", json.dumps(data), content_type="application/json")
+        self.assertEqual((response.status_code, Reading.objects.count()), (200, 7))
+
+    def test_ingest_batch(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+
+        message = {"goes_id": self.station.goes_id, "goes_channel": 82, "goes_spacecraft": "E", "failure_code": "G",
+                   "arrival_time": "2017-02-26T22:07:43Z", "signal_strength": 44, "frequency_offset": "+0",
+                   "modulation_index": "N", "data_quality": "N", "data_source": "UP", "recorded_message_length": 56,
+                   "values": [2861, 2870, None, 2884, 10132, 12, 15], "message_text": "C7A0337E"}
+        later = dict(message, arrival_time="2017-02-26T23:07:43Z")
+        invalid = dict(message, goes_channel="x")
+
+        def post(batch):
+            response = self.client.post("/api/climate/messages/batch/", json.dumps(batch),
+                                        content_type="application/json")
+            return response.status_code, [(r["status"], r.get("readings", None))
+                                          for r in json.loads(response.content.decode("utf-8"))]
+
+        # A message sent twice in the same batch is only created once.
+        self.assertEqual(post([message, message]), (201, [("created", 7), ("duplicate", 0)]))
+        self.assertEqual(Message.objects.count(), 1)
+
+        self.assertEqual(post([invalid, later, message]), (207, [("invalid", None), ("created", 7), ("duplicate", 0)]))
+        self.assertEqual(post([invalid, invalid]), (400, [("invalid", None), ("invalid", None)]))
+
+        self.assertEqual((Message.objects.count(), Reading.objects.count()), (2, 14))
+
+
+class ReadingGapTestCase(TestCase):
+    start = datetime.datetime(2017, 2, 26, 0, 0, tzinfo=pytz.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "password")
+
+        sensor = Sensor.objects.create(name="Temperature", data_id="temp", decimals=2)
+        cls.station = Station.objects.create(name="Elbow Lake", goes_id="C7A0337E")
+        cls.link = StationSensorLink.objects.create(station=cls.station, sensor=sensor, station_order=1,
+                                                    read_frequency=4)
+
+        # Readings every 15 minutes, with the hour from 00:30 to 01:30 missing.
+        Reading.objects.bulk_create(
+            Reading(read_time=cls.start + datetime.timedelta(minutes=m), value=m, sensor=sensor, station=cls.station,
+                    station_sensor_link=cls.link)
+            for m in (0, 15, 30, 90, 105, 120)
+        )
+        rebuild_latest_readings()
+
+    def gaps(self, params="?end=2017-02-26T02:00Z"):  # Up to the last reading, leaving out the open gap after it.
+        response = self.client.get("/api/climate/stations/{}/gaps/{}".format(self.station.id, params),
+                                   HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+
+        gaps = json.loads(response.content.decode("utf-8"))
+        return [(g["gap_start"], g["gap_end"], g["missing_count"], g["open"]) for g in gaps]
+
+    def test_rebuild_gaps(self):
+        watermark = Station.objects.get(pk=self.station.pk).readings_updated
+
+        self.assertEqual(rebuild_gaps(), 1)
+        self.assertGreater(Station.objects.get(pk=self.station.pk).readings_updated, watermark)
+
+        self.assertEqual(self.gaps(), [("2017-02-26T00:30:00Z", "2017-02-26T01:30:00Z", 3, False)])
+        self.assertEqual(self.gaps("?start=2017-02-26T01:30Z&end=2017-02-26T02:00Z"), [])
+        self.assertEqual(self.gaps("?end=2017-02-26T00:45Z&start=nonsense"), [("2017-02-26T00:30:00Z",
+                                                                                "2017-02-26T01:30:00Z", 3, False)])
+
+    def test_open_gaps(self):
+        rebuild_gaps()
+
+        # A link which has never reported is missing everything since it was added.
+        sensor = Sensor.objects.create(name="Humidity", data_id="rh", decimals=1)
+        link = StationSensorLink.objects.create(station=self.station, sensor=sensor, station_order=2, read_frequency=1)
+        StationSensorLink.objects.filter(pk=link.pk).update(created=self.start + datetime.timedelta(hours=3))
+
+        self.assertEqual(self.gaps("?start=2017-02-26T01:00Z&end=2017-02-26T06:00Z"), [
+            ("2017-02-26T00:30:00Z", "2017-02-26T01:30:00Z", 3, False),
+            ("2017-02-26T02:00:00Z", "2017-02-26T06:00:00Z", 16, True),
+            ("2017-02-26T03:00:00Z", "2017-02-26T06:00:00Z", 3, True),
+        ])
+        self.assertEqual(self.gaps("?start=2017-02-26T01:00Z&end=2017-02-26T02:20Z"), [
+            ("2017-02-26T00:30:00Z", "2017-02-26T01:30:00Z", 3, False),
+        ])
+        self.assertEqual(self.gaps("?start=2017-02-26T02:10Z&end=2017-02-26T02:30Z"), [
+            ("2017-02-26T02:00:00Z", "2017-02-26T02:30:00Z", 2, True),
+        ])
+
+        # Without an end, open gaps reach up to the readings which should have arrived by now.
+        gaps = self.gaps("")
+        self.assertEqual([gap[0] for gap in gaps if gap[3]], ["2017-02-26T02:00:00Z", "2017-02-26T03:00:00Z"])
+
+    def test_gaps_follow_readings(self):
+        rebuild_gaps()
+        self.client.force_login(self.user)
+
+        response = self.client.post("/api/climate/readings/", json.dumps({
+            "read_time": "2017-02-26T01:00:00Z", "value": 60, "sensor": self.link.sensor_id,
+            "station": self.station.id, "station_sensor_link": self.link.id
+        }), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.gaps(), [("2017-02-26T00:30:00Z", "2017-02-26T01:00:00Z", 1, False),
+                                       ("2017-02-26T01:00:00Z", "2017-02-26T01:30:00Z", 1, False)])
+
+        for minutes in (15, 105):
+            reading = Reading.objects.get(read_time=self.start + datetime.timedelta(minutes=minutes))
+            self.assertEqual(self.client.delete("/api/climate/readings/{}/".format(reading.id)).status_code, 204)
+
+        self.assertEqual(self.gaps(), [("2017-02-26T00:00:00Z", "2017-02-26T00:30:00Z", 1, False),
+                                       ("2017-02-26T00:30:00Z", "2017-02-26T01:00:00Z", 1, False),
+                                       ("2017-02-26T01:00:00Z", "2017-02-26T01:30:00Z", 1, False),
+                                       ("2017-02-26T01:30:00Z", "2017-02-26T02:00:00Z", 1, False)])
+
+        # Gaps are kept in step with the readings, so rebuilding them changes nothing.
+        gaps = self.gaps()
+        rebuild_gaps()
+        self.assertEqual(self.gaps(), gaps)
+
+
+class SeriesQualityControlTestCase(TestCase):
+    start = datetime.datetime(2017, 2, 26, 0, 0, tzinfo=pytz.utc)
+
+    def test_detectors(self):
+        values = np.array([1.0, 1.2, 9.0, 1.1, 1.0, 5.0, 5.0, 5.0, 5.0, 5.2])
+        hours = np.arange(len(values), dtype=float)
+
+        self.assertEqual(np.flatnonzero(find_spikes(values, 3)).tolist(), [2])
+        self.assertEqual(np.flatnonzero(find_steps(values, hours, 3)).tolist(), [2, 3, 5])
+        self.assertEqual(np.flatnonzero(find_steps(values, hours * 2, 3)).tolist(), [2, 3])
+        self.assertEqual(np.flatnonzero(find_flatlines(values, hours, 3)).tolist(), [5, 6, 7, 8])
+        self.assertEqual(np.flatnonzero(find_flatlines(values, hours, 4)).tolist(), [])
+
+    def test_check_stations(self):
+        data_type = DataType.objects.create(name="Wind Speed", short_name="wind", unit="m/s", spike_threshold=10,
+                                            rate_of_change_threshold=20, flatline_duration=datetime.timedelta(hours=3))
+        sensor = Sensor.objects.create(name="Anemometer", data_id="wind", decimals=1)
+        station = Station.objects.create(name="Elbow Lake", goes_id="C7A0337E")
+        link = StationSensorLink.objects.create(station=station, sensor=sensor, data_type=data_type, station_order=1)
+
+        values = [30, 42, 35, 900, 38, 31, 29, 280, 285, 290] + [75] * 13 + [80, 76]
+        Reading.objects.bulk_create(
+            Reading(read_time=self.start + datetime.timedelta(minutes=15 * i), value=value, qc_processed=True,
+                    sensor=sensor, station=station, station_sensor_link=link)
+            for i, value in enumerate(values)
+        )
+        rebuild_rollups(self.start, self.start + datetime.timedelta(days=1))
+
+        self.assertEqual(check_stations(self.start, self.start + datetime.timedelta(days=1), processes=1), (25, 15))
+
+        # The spike, the step up, the step down and the three hour flatline are flagged, but not the return from the
+        # spike.
+        flagged = Reading.objects.filter(invalid=True).order_by("read_time").values_list("value", flat=True)
+        self.assertEqual(list(flagged), [900, 280] + [75] * 13)
+        self.assertEqual(ReadingRollup.objects.filter(resolution=ReadingRollup.DAILY).get().reading_count, 10)
+
+        # Rerunning over the same readings, as overlapping daily runs do, flags nothing more.
+        for start in (self.start, self.start + datetime.timedelta(hours=1)):
+            self.assertEqual(check_stations(start, self.start + datetime.timedelta(days=1), processes=1)[1], 0)
+        self.assertEqual(list(flagged), [900, 280] + [75] * 13)
+
+    def test_network_outliers(self):
+        nan = np.nan
+        matrix = np.array([[10.0, 10.0, 10.0, nan],
+                           [10.2, 10.1, 10.0, 30.0],
+                           [30.0, 10.3, 10.0, 10.0],
+                           [10.1, nan, 10.1, nan]])
+
+        flags = find_network_outliers(matrix, 5, min_deviation=0.01)
+        self.assertEqual(np.argwhere(flags).tolist(), [[2, 0], [3, 2]])
+
+    def test_check_network(self):
+        data_type = DataType.objects.create(name="Air Temperature", short_name="air_temp", unit="C",
+                                            network_threshold=5)
+        sensor = Sensor.objects.create(name="Temperature", data_id="temp", decimals=1)
+
+        # Four stations read at slightly different times, which line up on a 15 minute grid.
+        for i, offset in enumerate((0, 1, 2, 3)):
+            station = Station.objects.create(name="Station {}".format(i), goes_id="C7A0{:04X}".format(i))
+            link = StationSensorLink.objects.create(station=station, sensor=sensor, data_type=data_type,
+                                                    station_order=1)
+            Reading.objects.bulk_create(
+                Reading(read_time=self.start + datetime.timedelta(minutes=15 * h + offset), qc_processed=True,
+                        value=400 if (i, h) == (2, 5) else 100 + h + i, sensor=sensor, station=station,
+                        station_sensor_link=link)
+                for h in range(8)
+            )
+
+        # A fifth station reads twice in each grid interval; only the last of the two is compared (and counted).
+        station = Station.objects.create(name="Station 4", goes_id="C7A00004")
+        link = StationSensorLink.objects.create(station=station, sensor=sensor, data_type=data_type, station_order=1)
+        Reading.objects.bulk_create(
+            Reading(read_time=self.start + datetime.timedelta(minutes=15 * h + offset), qc_processed=True, value=value,
+                    sensor=sensor, station=station, station_sensor_link=link)
+            for h in range(8) for offset, value in ((1, 900), (4, 104 + h))
+        )
+
+        self.assertEqual(check_network(data_type, self.start, self.start + datetime.timedelta(hours=2)), (40, 1))
+        self.assertEqual(list(Reading.objects.filter(invalid=True).values_list("value", flat=True)), [400])
+        self.assertEqual(check_network(data_type, self.start, self.start + datetime.timedelta(hours=2)), (40, 0))
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Requests every endpoint with enough stations, sensors, readings and messages that a query per object would go over
+    the endpoint's fixed query budget.
+    """
+
+    start = datetime.datetime(2017, 2, 26, 0, 0, tzinfo=pytz.utc)
+    window = "start=2017-02-26T00:00Z&end=2017-02-27T00:00Z"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "password")
+
+        data_types = [DataType.objects.create(name="Air Temperature", short_name="air_temp", unit="C"),
+                      DataType.objects.create(name="Relative Humidity", short_name="rh", unit="%")]
+        cls.sensors = [Sensor.objects.create(name="Sensor {}".format(i), data_id="s{}".format(i), decimals=i % 3)
+                       for i in range(4)]
+
+        cls.stations = []
+        for i in range(6):
+            station = Station.objects.create(name="Station {}".format(i), goes_id="C7A0{:04X}".format(i))
+            cls.stations.append(station)
+
+            for order, sensor in enumerate(cls.sensors, start=1):
+                link = StationSensorLink.objects.create(station=station, sensor=sensor, station_order=order,
+                                                        data_type=data_types[order % 2], read_frequency=1)
+                Reading.objects.bulk_create(
+                    Reading(read_time=cls.start + datetime.timedelta(hours=h), value=h * 10, sensor=sensor,
+                            station=station, station_sensor_link=link)
+                    for h in range(8)
+                )
+
+            for h in range(3):
+                Message.objects.create(goes_id=station.goes_id, goes_channel=19, failure_code="G",
+                                       arrival_time=cls.start + datetime.timedelta(hours=h, minutes=20),
+                                       signal_strength=38, frequency_offset="+0", data_source="UP",
+                                       recorded_message_length=20, values=[1, 2, 3, 4], message_text="",
+                                       station=station)
+
+            for h in range(0, 8, 2):
+                Annotation.objects.create(station=station, sensor=cls.sensors[h % 4], comment="Maintenance",
+                                          time_range=(cls.start + datetime.timedelta(hours=h),
+                                                      cls.start + datetime.timedelta(hours=h + 1)))
+
+        rebuild_rollups(cls.start, cls.start + datetime.timedelta(days=1))
+        rebuild_latest_readings()
+
+        Setting.objects.create(name="example", value="1")
+
+    def assertQueryBudget(self, budget, url, method="get", **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+            if response.streaming:
+                b"".join(response.streaming_content)
+
+        self.assertLess(response.status_code, 400, url)
+        self.assertLessEqual(len(queries), budget, "{} {} ran {} queries:\n{}".format(
+            method.upper(), url, len(queries), "\n".join(q["sql"] for q in queries)))
+
+    def test_climate_endpoints(self):
+        station, sensor = self.stations[0], self.sensors[0]
+        link = StationSensorLink.objects.filter(station=station).first()
+
+        budgets = (
+            ("/api/climate/", 0),
+            ("/api/climate/data-types/", 1),
+            ("/api/climate/data-types/{}/".format(link.data_type_id), 1),
+            ("/api/climate/sensors/", 1),
+            ("/api/climate/sensors/{}/".format(sensor.id), 1),
+            ("/api/climate/sensors/{}/data/".format(sensor.id), 2),
+            ("/api/climate/sensors/{}/stations/".format(sensor.id), 2),
+            ("/api/climate/stations/", 2),
+            ("/api/climate/stations/{}/".format(station.id), 2),
+            ("/api/climate/stations/{}/data/?{}".format(station.id, self.window), 2),
+            ("/api/climate/stations/{}/data/?{}&compact=true".format(station.id, self.window), 2),
+            ("/api/climate/stations/{}/data/?{}&page_size=10".format(station.id, self.window), 2),
+            ("/api/climate/stations/{}/data/?{}&bucket=1h".format(station.id, self.window), 3),
+            ("/api/climate/stations/{}/data/?{}&layout=series".format(station.id, self.window), 2),
+            ("/api/climate/stations/{}/data/?{}&layout=series&annotations=true".format(station.id, self.window), 3),
+            ("/api/climate/stations/{}/data/csv/?{}".format(station.id, self.window), 5),
+            ("/api/climate/stations/{}/data/latest/".format(station.id), 2),
+            ("/api/climate/stations/{}/data/latest/?scaled=true".format(station.id), 2),
+            ("/api/climate/stations/{}/gaps/?{}".format(station.id, self.window), 3),
+            ("/api/climate/stations/{}/sensors/".format(station.id), 1),
+            ("/api/climate/stations/{}/sensor-links/".format(station.id), 1),
+            ("/api/climate/stations/{}/sensor-links/?deep=true".format(station.id), 2),
+            ("/api/climate/stations/{}/messages/".format(station.id), 3),
+            ("/api/climate/stations/{}/messages/latest/".format(station.id), 3),
+            ("/api/climate/station-sensor-links/", 1),
+            ("/api/climate/station-sensor-links/?deep=true", 2),
+            ("/api/climate/station-sensor-links/{}/?deep=true".format(link.id), 2),
+            ("/api/climate/readings/?{}".format(self.window), 2),
+            ("/api/climate/readings/?{}&compact=true".format(self.window), 2),
+            ("/api/climate/readings/?{}&compact=true&scaled=true".format(self.window), 2),
+            ("/api/climate/readings/?{}&page_size=10".format(self.window), 2),
+            ("/api/climate/readings/?{}&compact=true&page_size=10".format(self.window), 2),
+            ("/api/climate/readings/?{}&stream=true".format(self.window), 4),
+            ("/api/climate/readings/?{}&interval=4".format(self.window), 2),
+            ("/api/climate/readings/?{}&bucket=1d".format(self.window), 3),
+            ("/api/climate/readings/?{}&layout=series".format(self.window), 2),
+            ("/api/climate/readings/?{}&format=xml".format(self.window), 2),
+            ("/api/climate/readings/?{}&format=api".format(self.window), 2),
+            ("/api/climate/readings/csv/?{}&layout=wide".format(self.window), 5),
+            ("/api/climate/readings/latest/", 2),
+            ("/api/climate/readings/latest/?scaled=true", 2),
+            ("/api/climate/readings/{}/".format(Reading.objects.first().id), 1),
+            ("/api/climate/annotations/", 1),
+            ("/api/climate/annotations/?station={}&sensor={}&{}".format(station.id, sensor.id, self.window), 1),
+            ("/api/climate/annotations/{}/".format(Annotation.objects.first().id), 1),
+            ("/api/climate/messages/?{}".format(self.window), 3),
+            ("/api/climate/messages/latest/", 4),
+            ("/api/climate/messages/{}/".format(Message.objects.first().id), 1),
+            ("/api/climate/settings/", 1),
+            ("/api/climate/settings/{}/".format(Setting.objects.first().id), 1),
+            ("/api/climate/settings/example/", 1),
+        )
+
+        for url, budget in budgets:
+            with self.subTest(url=url):
+                self.assertQueryBudget(budget, url)
+
+    def test_browsable_api(self):
+        # Forms for creating objects are shown to signed-in users, with a choice for each related object.
+        self.client.force_login(self.user)
+
+        budgets = (
+            ("/api/climate/stations/?format=api", 4),
+            ("/api/climate/station-sensor-links/?format=api", 6),
+            ("/api/climate/readings/?{}&format=api".format(self.window), 8),
+            ("/api/climate/readings/?{}&compact=true&format=api".format(self.window), 7),
+        )
+
+        for url, budget in budgets:
+            with self.subTest(url=url):
+                self.assertQueryBudget(budget, url)
+
+    def test_create_endpoints(self):
+        self.client.force_login(self.user)
+        station = self.stations[1]
+        link = StationSensorLink.objects.filter(station=station).first()
+
+        message = {"goes_id": station.goes_id, "goes_channel": 19, "goes_spacecraft": "E", "failure_code": "G",
+                   "arrival_time": "2017-02-26T10:20:00Z", "signal_strength": 38, "frequency_offset": "+0",
+                   "modulation_index": "N", "data_quality": "N", "data_source": "UP", "recorded_message_length": 20,
+                   "values": [1, 2, 3, 4], "message_text": "x"}
+        batch = [dict(message, arrival_time="2017-02-26T{}:20:00Z".format(h)) for h in range(11, 17)]
+        reading = {"read_time": "2017-02-26T20:00:00Z", "value": 5, "sensor": link.sensor_id, "station": station.id,
+                   "station_sensor_link": link.id}
+
+        budgets = (
+            ("/api/climate/messages/", message, 23),
+            ("/api/climate/messages/batch/", batch, 23),
+            ("/api/climate/readings/", reading, 22),
+        )
+
+        for url, data, budget in budgets:
+            with self.subTest(url=url):
+                self.assertQueryBudget(budget, url, "post", data=json.dumps(data), content_type="application/json")
+
+    def test_admin(self):
+        self.client.force_login(self.user)
+
+        # The date hierarchy checks each year, month or day it lists with a query of its own, however many rows there
+        # are; all of the fixtures are from a single day, so the change lists list every day of its month.
+        budgets = (
+            ("/admin/climate_data/reading/", 50),
+            ("/admin/climate_data/reading/?read_time__year=2017&read_time__month=2", 35),
+            ("/admin/climate_data/reading/?read_time__year=2017&read_time__month=2&read_time__day=26", 7),
+            ("/admin/climate_data/reading/?station__id__exact={}".format(self.stations[0].id), 50),
+            ("/admin/climate_data/reading/{}/change/".format(Reading.objects.first().id), 11),
+            ("/admin/climate_data/message/", 50),
+            ("/admin/climate_data/message/?goes_id={}".format(self.stations[0].goes_id), 49),
+            ("/admin/climate_data/stationsensorlink/", 17),
+        )
 
-# Create your tests here.
+        for url, budget in budgets:
+            with self.subTest(url=url):
+                self.assertQueryBudget(budget, url)
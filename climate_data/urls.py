@@ -37,7 +37,9 @@ urlpatterns = [
     url(r'^stations/$', views.StationList.as_view(), name='station-list'),
     url(r'^stations/(?P<pk>[0-9]+)/$', views.StationDetail.as_view(), name='station-detail'),
     url(r'^stations/(?P<pk>[0-9]+)/data/$', views.StationData.as_view(), name='station-data'),
+    url(r'^stations/(?P<pk>[0-9]+)/data/csv/$', views.StationDataCSV.as_view(), name='station-data-csv'),
     url(r'^stations/(?P<pk>[0-9]+)/data/latest/$', views.StationLatestData.as_view(), name='station-latest-data'),
+    url(r'^stations/(?P<pk>[0-9]+)/gaps/$', views.StationGaps.as_view(), name='station-gaps'),
     url(r'^stations/(?P<pk>[0-9]+)/sensors/$', views.StationSensors.as_view(), name='station-sensors'),
     url(r'^stations/(?P<pk>[0-9]+)/sensor-links/$', views.StationSensorLinks.as_view(), name='station-sensor-links'),
     url(r'^stations/(?P<pk>[0-9]+)/messages/$', views.StationMessages.as_view(), name='station-messages'),
@@ -51,11 +53,16 @@ urlpatterns = [
         name='station-sensor-link-detail'),
 
     url(r'^readings/$', views.ReadingList.as_view(), name='reading-list'),
+    url(r'^readings/csv/$', views.ReadingCSV.as_view(), name='reading-csv'),
     url(r'^readings/latest/$', views.ReadingLatest.as_view(), name='reading-latest'),
     url(r'^readings/(?P<pk>[0-9]+)/$', views.ReadingDetail.as_view(), name='reading-detail'),
 
+    url(r'^annotations/$', views.AnnotationList.as_view(), name='annotation-list'),
+    url(r'^annotations/(?P<pk>[0-9]+)/$', views.AnnotationDetail.as_view(), name='annotation-detail'),
+
     url(r'^messages/$', views.MessageList.as_view(), name='message-list'),
     url(r'^messages/latest/$', views.MessageLatest.as_view(), name='message-latest'),
+    url(r'^messages/batch/$', views.MessageBatch.as_view(), name='message-batch'),
     url(r'^messages/(?P<pk>[0-9]+)/$', views.MessageDetail.as_view(), name='message-detail'),
 
     url(r'^settings/$', views.SettingList.as_view(), name='setting-list'),
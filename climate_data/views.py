@@ -15,23 +15,128 @@
 
 import datetime
 import dateutil.parser
+import heapq
 import pytz
 
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 
-from django.db.models import Q
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Max, Min, Q, Sum
+from django.db.models.functions import Cast
+from psycopg2.extras import DateTimeTZRange
 
 from rest_framework import generics
 from rest_framework import permissions
+from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
+from climate_data.conditional import (ConditionalGetMixin, mark_messages_removed, mark_readings_updated,
+                                      mark_readings_written, messages_watermark, readings_watermark)
+from climate_data.exports import LAYOUTS, LONG_LAYOUT, csv_response
+from climate_data.functions import DecimalValue, TimeBucket, floor_time, parse_bucket
+from climate_data.gaps import open_gaps, update_gaps
+from climate_data.ingest import READING_NATURAL_KEY, ingest_messages, insert_ignoring_conflicts
+from climate_data.latest import record_latest_readings, refresh_latest_readings
+from climate_data.pagination import MessagePagination, ReadingPagination
+from climate_data.rollups import RESOLUTION_INTERVALS, update_rollups
 from climate_data.serializers import *
+from climate_data.series import ReadingSeriesMixin
+from climate_data.streaming import StreamingListMixin
 
 
-compact_reading_columns = ("id", "read_time", "value", "invalid", "sensor", "station")
+compact_reading_columns = ("id", "read_time", "value", "invalid", "sensor", "station", "station_sensor_link")
 station_compact_reading_columns = ("id", "read_time", "value", "invalid", "sensor")
+scaled_reading_annotations = ("scaled_value", "unit")
+
+
+def bucket_readings(queryset, interval):
+    """
+    Summarizes the valid readings in a queryset into fixed-length time buckets for each station-sensor link. The
+    aggregation is done by the database, over the same indexed read time range as the queryset.
+    """
+
+    return queryset.filter(invalid=False) \
+        .annotate(bucket=TimeBucket("read_time", interval)) \
+        .values("bucket", "sensor", "station", "station_sensor_link") \
+        .annotate(count=Count("value"), avg=Avg("value"), min=Min("value"), max=Max("value")) \
+        .order_by("bucket", "station_sensor_link_id")
+
+
+def rollup_resolution(interval):
+    """
+    Returns the coarsest rollup resolution which evenly divides a bucket size, or None if no rollups can be used.
+    """
+
+    for resolution in (ReadingRollup.DAILY, ReadingRollup.HOURLY):
+        if interval % RESOLUTION_INTERVALS[resolution] == datetime.timedelta(0):
+            return resolution
+
+    return None
+
+
+def bucket_rollups(queryset, interval):
+    """
+    Summarizes rollups into fixed-length time buckets, in the same form as bucket_readings. Only buckets lying entirely
+    within the queryset's range summarize the same readings; see bucket_range.
+    """
+
+    return queryset.filter(resolution=rollup_resolution(interval)) \
+        .annotate(bucket=TimeBucket("bucket_start", interval)) \
+        .values("bucket", "sensor", "station", "station_sensor_link") \
+        .annotate(count=Sum("reading_count"),
+                  avg=ExpressionWrapper(Sum("value_sum") / Sum("reading_count"), output_field=FloatField()),
+                  min=Min("value_min"), max=Max("value_max")) \
+        .order_by("bucket", "station_sensor_link_id")
+
+
+def bucket_range(queryset, rollups, interval, start, end, start_exclusive=False):
+    """
+    Summarizes the valid readings in a queryset between two times into fixed-length time buckets, giving the same
+    output as bucket_readings. Buckets lying entirely within the range are summed from rollups (filtered like the
+    readings) when the bucket size allows it. Partial buckets at either end of the range, and readings without a
+    station-sensor link (which have no rollups), are summarized from the readings themselves.
+    """
+
+    first = floor_time(start, interval)
+    if first < start or start_exclusive:
+        first += interval
+
+    last = floor_time(end, interval)  # The end of the range is inclusive, so the bucket starting there is partial.
+
+    if rollup_resolution(interval) is None or first >= last:
+        return bucket_readings(queryset, interval)
+
+    whole = bucket_rollups(rollups.filter(bucket_start__gte=first, bucket_start__lt=last), interval)
+    partial = bucket_readings(
+        queryset.filter(Q(read_time__lt=first) | Q(read_time__gte=last) | Q(station_sensor_link=None)), interval)
+
+    # Both are ordered by bucket and then link, with readings without a link last (as PostgreSQL sorts nulls). They
+    # are merged lazily, so neither query runs until the buckets are listed.
+    return heapq.merge(whole, partial, key=lambda b: (b["bucket"], b["station_sensor_link"] is None,
+                                                      b["station_sensor_link"] or 0))
+
+
+def deep_links(queryset):
+    """
+    Fetches the related objects nested by DeepStationSensorLinkSerializer along with station-sensor links.
+    """
+
+    return queryset.select_related("station", "sensor", "data_type").prefetch_related("station__sensors")
+
+
+def scale_requested(request):
+    return str(request.query_params.get("scaled", "false")).lower() == "true"
+
+
+def scale_readings(queryset):
+    """
+    Annotates readings (or latest readings) with their values scaled by their sensors' numbers of decimals and the
+    units of their links' data types, both found by the database in the same query.
+    """
+
+    return queryset.annotate(scaled_value=Cast(DecimalValue(), FloatField()),
+                             unit=F("station_sensor_link__data_type__unit"))
 
 
 # API Root View
@@ -45,6 +150,7 @@ def climate_api_root(request, format=None):
         ("station-sensor-links", reverse("station-sensor-link-list", request=request, format=format)),
         ("readings", reverse("reading-list", request=request, format=format)),
         ("latest-readings", reverse("reading-latest", request=request, format=format)),
+        ("annotations", reverse("annotation-list", request=request, format=format)),
         ("messages", reverse("message-list", request=request, format=format)),
         ("latest-messages", reverse("message-latest", request=request, format=format)),
         ("settings", reverse("setting-list", request=request, format=format)),
@@ -111,7 +217,7 @@ class SensorDetail(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
 
-class SensorData(generics.ListAPIView):
+class SensorData(ConditionalGetMixin, ReadingSeriesMixin, StreamingListMixin, generics.ListAPIView):
     """
     get:
     Return readings associated with a particular sensor.
@@ -119,10 +225,20 @@ class SensorData(generics.ListAPIView):
 
     serializer_class = ReadingSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    pagination_class = ReadingPagination
+
+    def get_watermark(self):
+        return readings_watermark()
 
     def get_queryset(self):
         pk = self.kwargs["pk"]
-        return Reading.objects.filter(sensor=pk)
+        queryset = Reading.objects.filter(sensor=pk)
+
+        if scale_requested(self.request):
+            self.serializer_class = ScaledReadingSerializer
+            queryset = scale_readings(queryset)
+
+        return queryset
 
 
 class SensorStations(generics.ListAPIView):
@@ -138,7 +254,7 @@ class SensorStations(generics.ListAPIView):
 
         return Station.objects.filter(
             sensors__id=pk
-        )
+        ).prefetch_related("stationsensorlink_set")
 
 
 # Station Views
@@ -156,7 +272,7 @@ class StationList(generics.ListCreateAPIView):
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
     def get_queryset(self):
-        queryset = Station.objects.all()
+        queryset = Station.objects.prefetch_related("stationsensorlink_set")
 
         goes_id = self.request.query_params.get("goes_id", None)
         if goes_id is not None:
@@ -170,18 +286,22 @@ class StationDetail(generics.RetrieveUpdateDestroyAPIView):
     Return information about a given station.
     """
 
-    queryset = Station.objects.all()
+    queryset = Station.objects.prefetch_related("stationsensorlink_set")
     serializer_class = StationSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
 
-class StationData(generics.ListAPIView):
+class StationData(ConditionalGetMixin, ReadingSeriesMixin, StreamingListMixin, generics.ListAPIView):
     """
     Return a list of readings associated with a given station.
     """
 
     serializer_class = ReadingSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    pagination_class = ReadingPagination
+
+    def get_watermark(self):
+        return readings_watermark(self.kwargs["pk"])
 
     def get_queryset(self):
         pk = self.kwargs["pk"]
@@ -197,45 +317,148 @@ class StationData(generics.ListAPIView):
             end_date_object = dateutil.parser.parse(end_date)
 
         return_compact = self.request.query_params.get("compact", False)
+        bucket = parse_bucket(self.request.query_params.get("bucket", None))
 
         queryset = Reading.objects.filter(
             station=pk,
             read_time__gte=start_date_object,
             read_time__lte=end_date_object
-        )
+        ).order_by("read_time")
+
+        if bucket is not None:
+            self.serializer_class = ReadingBucketSerializer
+            self.pagination_class = None  # Buckets are few, and not ordered by read time.
+
+            return bucket_range(queryset, ReadingRollup.objects.filter(station=pk), bucket, start_date_object,
+                                end_date_object)
 
         if return_compact == "true":
             self.serializer_class = StationCompactReadingSerializer
             queryset = queryset.only(*station_compact_reading_columns)
 
+        if scale_requested(self.request):
+            self.serializer_class = ScaledStationCompactReadingSerializer if return_compact == "true" \
+                else ScaledReadingSerializer
+            queryset = scale_readings(queryset)
+
         return queryset
 
 
-class StationLatestData(generics.ListAPIView):
+class StationDataCSV(ConditionalGetMixin, generics.GenericAPIView):
     """
-    Return a list of the latest readings (taken in the past hour) associated with a given station.
+    Download the readings associated with a given station as CSV, with decimal values and data type short names.
     """
 
-    serializer_class = ReadingSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
-    def get_queryset(self):
+    def get_watermark(self):
+        return readings_watermark(self.kwargs["pk"])
+
+    def get(self, request, *args, **kwargs):
         pk = self.kwargs["pk"]
-        latest_message = Message.objects.filter(station=pk).latest("arrival_time")
-        start_date_object = latest_message.arrival_time - datetime.timedelta(hours=1)
 
-        return_compact = self.request.query_params.get("compact", False)
+        start_date = self.request.query_params.get("start", None)
+        start_date_object = datetime.datetime.now(pytz.utc) - datetime.timedelta(days=7)  # Default to a week's worth
+        if start_date is not None:
+            start_date_object = dateutil.parser.parse(start_date)
 
-        queryset = Reading.objects.filter(
+        end_date = self.request.query_params.get("end", None)
+        end_date_object = datetime.datetime.now(pytz.utc)
+        if end_date is not None:
+            end_date_object = dateutil.parser.parse(end_date)
+
+        layout = self.request.query_params.get("layout", LONG_LAYOUT)
+        if layout not in LAYOUTS:
+            layout = LONG_LAYOUT
+
+        readings = Reading.objects.filter(
             station=pk,
             read_time__gte=start_date_object,
+            read_time__lte=end_date_object
         )
 
+        return csv_response(readings, StationSensorLink.objects.filter(station=pk), layout,
+                            "station-{}-{}.csv".format(pk, layout))
+
+
+class StationLatestData(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Return the latest reading from each sensor of a given station.
+    """
+
+    serializer_class = ReadingSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+
+    def get_watermark(self):
+        return readings_watermark(self.kwargs["pk"])
+
+    def get_queryset(self):
+        pk = self.kwargs["pk"]
+
+        return_compact = self.request.query_params.get("compact", False)
         if return_compact == "true":
             self.serializer_class = StationCompactReadingSerializer
-            queryset = queryset.only(*station_compact_reading_columns)
 
-        return queryset
+        latest = LatestReading.objects.filter(station=pk).order_by("station_sensor_link__station_order")
+
+        if scale_requested(self.request):
+            self.serializer_class = ScaledStationCompactReadingSerializer if return_compact == "true" \
+                else ScaledReadingSerializer
+            return [reading.as_reading(scaled_reading_annotations) for reading in scale_readings(latest)]
+
+        return [reading.as_reading() for reading in latest]
+
+
+class StationGaps(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Return a list of the gaps in a given station's readings, i.e. stretches of time in which readings from one of its
+    station-sensor links are missing, optionally only those overlapping the time range from start to end. Links which
+    have stopped reporting have an open gap from their latest reading up to the end of the range.
+    """
+
+    serializer_class = ReadingGapSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+
+    def get_now(self):
+        # Taken to the minute, so that responses reaching up to the present (and their watermarks) change at most once
+        # a minute as open gaps grow.
+        if not hasattr(self, "now"):
+            self.now = floor_time(datetime.datetime.now(pytz.utc), datetime.timedelta(minutes=1))
+
+        return self.now
+
+    def get_open_gaps_end(self):
+        # Readings from the last message interval may not have been sent yet.
+        end = self.get_now() - MESSAGE_INTERVAL
+        window_end = self.get_window_end()
+
+        return end if window_end is None else min(window_end, end)
+
+    def get_watermark(self):
+        watermark = readings_watermark(self.kwargs["pk"])
+
+        # Open gaps reaching up to the present grow as time passes, without any readings changing.
+        window_end = self.get_window_end()
+        if watermark is not None and (window_end is None or window_end > self.get_open_gaps_end()):
+            watermark = max(watermark, self.get_now())
+
+        return watermark
+
+    def get_queryset(self):
+        pk = self.kwargs["pk"]
+        start = self.get_time_param("start")
+        end = self.get_time_param("end")
+
+        queryset = ReadingGap.objects.filter(station=pk)
+        if start is not None:
+            queryset = queryset.filter(gap_end__gt=start)
+        if end is not None:
+            queryset = queryset.filter(gap_start__lt=end)
+
+        links = StationSensorLink.objects.filter(station=pk).select_related("latestreading")
+        gaps = [gap for gap in open_gaps(links, self.get_open_gaps_end()) if start is None or gap.gap_end > start]
+
+        return sorted(list(queryset) + gaps, key=lambda gap: (gap.gap_start, gap.station_sensor_link_id))
 
 
 class StationSensors(generics.ListAPIView):
@@ -270,27 +493,37 @@ class StationSensorLinks(generics.ListAPIView):
         pk = self.kwargs["pk"]
         queryset = StationSensorLink.objects.filter(station_id=pk).order_by("station_order")
 
+        if self.get_serializer_class() is DeepStationSensorLinkSerializer:
+            queryset = deep_links(queryset)
+
         return queryset
 
 
-class StationMessages(generics.ListAPIView):
+class StationMessages(ConditionalGetMixin, generics.ListAPIView):
     """
     Return a list of messages associated with a given station.
     """
 
     serializer_class = MessageSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    pagination_class = MessagePagination
+
+    def get_watermark(self):
+        return messages_watermark(self.kwargs["pk"])
 
     def get_queryset(self):
         pk = self.kwargs["pk"]
         return Message.objects.filter(station=pk).order_by("arrival_time")
 
 
-class StationLatestMessage(generics.RetrieveAPIView):
+class StationLatestMessage(ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
+    def get_watermark(self):
+        return messages_watermark(self.kwargs["pk"])
+
     def get_object(self):
         pk = self.kwargs["pk"]
         return self.queryset.filter(station_id=pk).latest("arrival_time")
@@ -331,6 +564,9 @@ class StationSensorLinkList(generics.ListCreateAPIView):
             else:
                 queryset = queryset.filter(sensor=sensor)
 
+        if self.get_serializer_class() is DeepStationSensorLinkSerializer:
+            queryset = deep_links(queryset)
+
         return queryset
 
 
@@ -346,23 +582,56 @@ class StationSensorLinkDetail(generics.RetrieveUpdateDestroyAPIView):
 
         return DeepStationSensorLinkSerializer
 
+    def get_queryset(self):
+        if self.get_serializer_class() is DeepStationSensorLinkSerializer:
+            return deep_links(self.queryset)
+
+        return self.queryset
+
 
 # Reading Views
 
-class ReadingList(generics.ListCreateAPIView):
+class ReadingList(ConditionalGetMixin, ReadingSeriesMixin, StreamingListMixin, generics.ListCreateAPIView):
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    pagination_class = ReadingPagination
+
+    def get_watermark(self):
+        return readings_watermark()
 
     def get_serializer_class(self):
         compact = str(self.request.query_params.get("compact", "false")).lower()
 
+        if self.request.method == "GET" and parse_bucket(self.request.query_params.get("bucket", None)) is not None:
+            return ReadingBucketSerializer
+
         if compact == "false" or compact == "0":
-            return ReadingSerializer
+            return ScaledReadingSerializer if scale_requested(self.request) else ReadingSerializer
 
-        return CompactReadingSerializer
+        return ScaledCompactReadingSerializer if scale_requested(self.request) else CompactReadingSerializer
 
-    def get_queryset(self):
-        global compact_reading_columns
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # A re-sent reading is not stored twice; the stored copy is returned instead.
+        reading = Reading(**serializer.validated_data)
+        if not insert_ignoring_conflicts(Reading, [reading], READING_NATURAL_KEY):
+            serializer.instance = Reading.objects.get(**{
+                field: serializer.validated_data.get(field, Reading._meta.get_field(field).get_default())
+                for field in READING_NATURAL_KEY
+            })
+            return Response(serializer.data, status=status.HTTP_200_OK)
 
+        update_rollups([(reading.station_sensor_link_id, reading.read_time)])
+        record_latest_readings([reading])
+        update_gaps([(reading.station_sensor_link_id, reading.read_time)])
+        mark_readings_written([reading.station_id])
+
+        serializer.instance = reading
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def get_queryset(self):
         start_date = self.request.query_params.get("start", None)
         start_date_object = datetime.datetime.now(pytz.utc) - datetime.timedelta(days=7)  # Default to a week's worth
         if start_date is not None:
@@ -373,7 +642,8 @@ class ReadingList(generics.ListCreateAPIView):
         if end_date is not None:
             end_date_object = dateutil.parser.parse(end_date)
 
-        sample_interval = self.request.query_params.get("interval", "1")  # TODO: Make this more elegant.
+        bucket = parse_bucket(self.request.query_params.get("bucket", None))
+        sample_interval = self.request.query_params.get("interval", "1")  # Superseded by bucket.
 
         try:
             sample_interval = int(sample_interval)
@@ -394,20 +664,39 @@ class ReadingList(generics.ListCreateAPIView):
                 'read_time__lte': end_date_object
             }
 
-        queryset = Reading.objects.only(*compact_reading_columns).filter(**queryset_filter)
+        queryset = Reading.objects.filter(**queryset_filter)
+        if issubclass(self.get_serializer_class(), CompactReadingSerializer):
+            queryset = queryset.only(*compact_reading_columns)
 
+        # Samples are picked by their time fields rather than by matching text, which would cast every read time.
         if sample_interval == 2:
-            queryset = queryset.filter(Q(read_time__contains=":00:") | Q(read_time__contains=":30:"))
+            queryset = queryset.filter(read_time__minute__in=(0, 30))
 
         if sample_interval == 4:
-            queryset = queryset.filter(read_time__contains=":00:")
+            queryset = queryset.filter(read_time__minute=0)
 
-        if sample_interval == 96:  # TODO: This should probably retrieve an average from a cache - more robust.
-            queryset = queryset.filter(read_time__contains="00:00:")
+        if sample_interval == 96:
+            queryset = queryset.filter(read_time__hour=0, read_time__minute=0)
 
         if sensors:
             queryset = queryset.filter(sensor__in=sensors)
 
+        if bucket is not None:
+            self.pagination_class = None  # Buckets are few, and not ordered by read time.
+
+            if sample_interval != 1:
+                return bucket_readings(queryset, bucket)
+
+            rollups = ReadingRollup.objects.all()
+            if sensors:
+                rollups = rollups.filter(sensor__in=sensors)
+
+            return bucket_range(queryset, rollups, bucket, start_date_object, end_date_object,
+                                start_exclusive=(start_exclusive == "true"))
+
+        if scale_requested(self.request):
+            queryset = scale_readings(queryset)
+
         queryset = queryset.order_by("read_time")
         return queryset
 
@@ -417,37 +706,167 @@ class ReadingDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ReadingSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
+    def perform_update(self, serializer):
+        old_key = (serializer.instance.station_sensor_link_id, serializer.instance.read_time)
+        old_station = serializer.instance.station_id
+        reading = serializer.save()
+        keys = [old_key, (reading.station_sensor_link_id, reading.read_time)]
+        update_rollups(keys)
+        refresh_latest_readings(keys)
+        update_gaps(keys)
+        mark_readings_written([old_station, reading.station_id])
+
+    def perform_destroy(self, instance):
+        key = (instance.station_sensor_link_id, instance.read_time)
+        instance.delete()
+        update_rollups([key])
+        refresh_latest_readings([key])
+        update_gaps([key])
+        mark_readings_written([instance.station_id])
+
+
+class ReadingCSV(ConditionalGetMixin, generics.GenericAPIView):
+    """
+    Download readings from all stations as CSV, with decimal values and data type short names.
+    """
 
-class ReadingLatest(generics.ListAPIView):
-    serializer_class = CompactReadingSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
-    def get_queryset(self):
-        stations = Station.objects.all()
-        station_ids = []
-        for s in stations:
-            station_ids.append(s.id)
+    def get_watermark(self):
+        return readings_watermark()
 
-        latest_message = Message.objects.latest("arrival_time")
-        start_date_object = latest_message.arrival_time - datetime.timedelta(hours=1)
+    def get(self, request, *args, **kwargs):
+        start_date = self.request.query_params.get("start", None)
+        start_date_object = datetime.datetime.now(pytz.utc) - datetime.timedelta(days=7)  # Default to a week's worth
+        if start_date is not None:
+            start_date_object = dateutil.parser.parse(start_date)
+
+        end_date = self.request.query_params.get("end", None)
+        end_date_object = datetime.datetime.now(pytz.utc)
+        if end_date is not None:
+            end_date_object = dateutil.parser.parse(end_date)
+
+        sensors = self.request.query_params.getlist("sensors[]")
+
+        layout = self.request.query_params.get("layout", LONG_LAYOUT)
+        if layout not in LAYOUTS:
+            layout = LONG_LAYOUT
 
-        return Reading.objects.filter(
-            station__in=station_ids,
+        readings = Reading.objects.filter(
             read_time__gte=start_date_object,
+            read_time__lte=end_date_object
         )
 
+        links = StationSensorLink.objects.all()
+        if sensors:
+            links = links.filter(sensor__in=sensors)
+
+        return csv_response(readings, links, layout, "readings-{}.csv".format(layout))
+
+
+class ReadingLatest(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Return the latest reading from each sensor of every station.
+    """
+
+    serializer_class = CompactReadingSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+
+    def get_watermark(self):
+        return readings_watermark()
+
+    def get_queryset(self):
+        latest = LatestReading.objects.order_by("station", "station_sensor_link__station_order")
+
+        if scale_requested(self.request):
+            self.serializer_class = ScaledCompactReadingSerializer
+            return [reading.as_reading(scaled_reading_annotations) for reading in scale_readings(latest)]
+
+        return [reading.as_reading() for reading in latest]
+
+
+# Annotation Views
+
+class AnnotationList(generics.ListCreateAPIView):
+    """
+    get:
+    Return a list of annotations, optionally only those on a station or sensor, or those overlapping the time range
+    from start to end.
+
+    post:
+    Create a new annotation.
+    """
+
+    serializer_class = AnnotationSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+
+    def get_queryset(self):
+        queryset = Annotation.objects.order_by("time_range", "id")
+
+        for param in ("station", "sensor"):
+            try:
+                queryset = queryset.filter(**{param: int(self.request.query_params[param])})
+            except (KeyError, ValueError):
+                pass
+
+        times = []
+        for param in ("start", "end"):
+            try:
+                times.append(dateutil.parser.parse(self.request.query_params[param]))
+            except (KeyError, ValueError, OverflowError):
+                times.append(None)
+
+        if times != [None, None]:
+            queryset = queryset.filter(time_range__overlap=DateTimeTZRange(*times, bounds="[]"))
+
+        return queryset
+
+    def perform_create(self, serializer):
+        annotation = serializer.save()
+        mark_readings_updated([annotation.station_id])
+
+
+class AnnotationDetail(generics.RetrieveUpdateDestroyAPIView):
+    queryset = Annotation.objects.all()
+    serializer_class = AnnotationSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+
+    def perform_update(self, serializer):
+        station_id = serializer.instance.station_id
+        annotation = serializer.save()
+        mark_readings_updated([station_id, annotation.station_id])
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        mark_readings_updated([instance.station_id])
+
 
 # Message Views
 
-class MessageList(generics.ListCreateAPIView):
+class MessageList(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = MessageSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    pagination_class = MessagePagination
 
-    def perform_create(self, serializer):
-        print("--- CREATING MESSAGE ---")
-        print(self.request.data)
-        print("------------------------")
-        serializer.save()
+    def get_watermark(self):
+        return messages_watermark()
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # Readings are decoded from the message's values in the same transaction, so a message is never stored without
+        # them. A re-sent message is not stored twice; the stored copy is returned instead.
+        message = Message(**serializer.validated_data)
+        new_messages, readings = ingest_messages([message])
+
+        if not new_messages:
+            serializer.instance = Message.objects.get(pk=message.pk)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        serializer.instance = message
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     def get_queryset(self):
         start_date = self.request.query_params.get("start", None)
@@ -482,16 +901,79 @@ class MessageList(generics.ListCreateAPIView):
         return queryset
 
 
+class MessageBatch(generics.GenericAPIView):
+    """
+    post:
+    Create many messages, and the readings decoded from them, in a single request. Valid messages are written in one
+    transaction; the response lists a result for each submitted message, in order.
+    """
+
+    serializer_class = MessageSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+
+        if serializer.is_valid():
+            errors = {}
+            items = list(enumerate(serializer.validated_data))
+        elif isinstance(serializer.errors, list):
+            # Only messages which passed validation are re-validated, so one bad message does not hold back the rest.
+            errors = {i: e for i, e in enumerate(serializer.errors) if e}
+            items = [(i, serializer.child.run_validation(data)) for i, data in enumerate(request.data)
+                     if i not in errors]
+        else:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)  # Not a list of messages at all.
+
+        messages = [Message(**data) for i, data in items]
+        new_messages, readings = ingest_messages(messages)
+
+        # New messages are told apart by identity rather than by ID, since a message sent twice in the same batch is
+        # given the ID of its first copy.
+        new_message_objects = {id(m) for m in new_messages}
+        reading_counts = Counter(r.message_id for r in readings)
+
+        results = [None] * len(request.data)
+        for i, e in errors.items():
+            results[i] = OrderedDict([("status", "invalid"), ("errors", e)])
+        for (i, data), message in zip(items, messages):
+            created = id(message) in new_message_objects
+            results[i] = OrderedDict([("status", "created" if created else "duplicate"), ("id", message.id),
+                                      ("readings", reading_counts[message.id] if created else 0)])
+
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif not items:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+
+        return Response(results, status=response_status)
+
+
 class MessageDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
+    def perform_update(self, serializer):
+        station_id = serializer.instance.station_id
+        message = serializer.save()
+        if message.station_id != station_id:
+            mark_messages_removed([station_id])
 
-class MessageLatest(generics.ListAPIView):
+    def perform_destroy(self, instance):
+        instance.delete()
+        mark_messages_removed([instance.station_id])
+
+
+class MessageLatest(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = MessageSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
 
+    def get_watermark(self):
+        return messages_watermark()
+
     def get_queryset(self):
         latest_message = Message.objects.latest("arrival_time")
         start_date_object = latest_message.arrival_time - datetime.timedelta(hours=1)
@@ -1,3 +1,38 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from herbarium_data.models import *
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Requests every endpoint with enough specimens that a query per specimen would go over the endpoint's fixed query
+    budget.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Specimen.objects.bulk_create(
+            Specimen(dataset="Fowler", genus="Acer", species="saccharum", accession=str(i), year_collected=1990 + i)
+            for i in range(20)
+        )
+
+    def assertQueryBudget(self, budget, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertLess(response.status_code, 400, url)
+        self.assertLessEqual(len(queries), budget, "GET {} ran {} queries:\n{}".format(
+            url, len(queries), "\n".join(q["sql"] for q in queries)))
+
+    def test_herbarium_endpoints(self):
+        budgets = (
+            ("/api/herbarium/", 0),
+            ("/api/herbarium/specimens/", 1),
+            ("/api/herbarium/specimens/{}/".format(Specimen.objects.first().id), 1),
+        )
+
+        for url, budget in budgets:
+            with self.subTest(url=url):
+                self.assertQueryBudget(budget, url)